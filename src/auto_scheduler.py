@@ -0,0 +1,269 @@
+# src/auto_scheduler.py
+"""新しい予定をまとめて空き時間に配置する自動スケジューラ（Qtに依存しない）
+
+登録済みの予定と勤務時間外を除いた空き時間を、開始順に並べた重ならない区間のリストとして持ち、
+bisect で候補の区間を探します。配置は優先度の高い順・配置できる幅の狭い順に貪欲に決め、
+置けない予定が残った場合だけ、探索回数の上限つきのバックトラックで配置し直します
+（要求が MAX_SEARCH_REQUESTS 件を超える場合は貪欲法だけ）。
+計画は DataManager.save_planned_schedules で1つのトランザクションとして保存します。
+"""
+
+import bisect
+import json
+import logging
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from src.metrics import timed
+from src.notification_engine import START_TASK
+
+logger = logging.getLogger(__name__)
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+END_TASK = "スケジュールの終了"
+EPOCH = datetime(1970, 1, 1)  # 日時はこの日時からの分で扱う
+# バックトラックは要求1件ごとに再帰するため、これより件数が多い場合は再帰しない貪欲法だけで配置する
+MAX_SEARCH_REQUESTS = 500
+
+# 配置したい予定1件分の条件（earliest から latest までの間に duration_minutes 分の空きを探す）
+SlotRequest = namedtuple(
+    "SlotRequest",
+    ["title", "duration_minutes", "category", "earliest", "latest",
+     "priority", "location", "description", "tasks", "notification_minutes"],
+    defaults=(0, "", "", (), None),
+)
+# 配置結果（start/end は datetime）
+Placement = namedtuple("Placement", ["request", "start", "end"])
+# 計画全体（placements は開始順、unplaced は置けなかった要求を入力順に、search_steps はバックトラックの回数）
+Plan = namedtuple("Plan", ["placements", "unplaced", "search_steps"])
+
+
+def _to_minutes(value):
+    return int((value - EPOCH).total_seconds()) // 60
+
+
+def _from_minutes(minutes):
+    return EPOCH + timedelta(minutes=minutes)
+
+
+def request_from_dict(data):
+    """JSONの辞書から SlotRequest を作ります（日時は "YYYY-MM-DD HH:MM" 形式の文字列）。"""
+    return SlotRequest(
+        title=data["title"],
+        duration_minutes=int(data["duration"]),
+        category=data.get("category", "その他"),
+        earliest=datetime.fromisoformat(data["earliest"]),
+        latest=datetime.fromisoformat(data["latest"]),
+        priority=int(data.get("priority", 0)),
+        location=data.get("location", ""),
+        description=data.get("description", ""),
+        tasks=tuple(data.get("tasks", ())),
+        notification_minutes=data.get("notification_minutes"),
+    )
+
+
+def load_requests(path):
+    """要求のJSONファイル（オブジェクトの配列）を読み込みます。"""
+    with open(path, encoding="utf-8") as f:
+        return [request_from_dict(data) for data in json.load(f)]
+
+
+class FreeIntervals:
+    """重ならない空き区間 [start, end)（分）を開始順に保持するクラス"""
+    def __init__(self, start, end, busy):
+        self.starts = []
+        self.ends = []
+        cursor = start
+        for busy_start, busy_end in sorted(busy):
+            if busy_end <= cursor:
+                continue
+            if busy_start >= end:
+                break
+            if busy_start > cursor:
+                self.starts.append(cursor)
+                self.ends.append(busy_start)
+            cursor = busy_end
+        if cursor < end:
+            self.starts.append(cursor)
+            self.ends.append(end)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def find(self, duration, earliest, latest, granularity=1, limit=1):
+        """earliest 以降 latest までに duration 分が収まる開始時刻を、空き区間ごとに1つずつ最大 limit 個返します。"""
+        found = []
+        # 終了が earliest より後の最初の区間から調べる（区間は重ならないので終了も開始順に並ぶ）
+        index = bisect.bisect_right(self.ends, earliest)
+        while index < len(self.starts) and len(found) < limit:
+            start = max(self.starts[index], earliest)
+            start = -(-start // granularity) * granularity  # 区切りのよい時刻に切り上げる
+            if start + duration > latest:
+                break
+            if start + duration <= self.ends[index]:
+                found.append(start)
+            index += 1
+        return found
+
+    def reserve(self, start, end):
+        """空き区間から [start, end) を取り除き、release で元に戻すための値を返します。"""
+        index = bisect.bisect_right(self.starts, start) - 1
+        free_start, free_end = self.starts[index], self.ends[index]
+        pieces = [(s, e) for s, e in ((free_start, start), (end, free_end)) if s < e]
+        self.starts[index:index + 1] = [s for s, _ in pieces]
+        self.ends[index:index + 1] = [e for _, e in pieces]
+        return index, free_start, free_end, len(pieces)
+
+    def release(self, token):
+        index, free_start, free_end, count = token
+        self.starts[index:index + count] = [free_start]
+        self.ends[index:index + count] = [free_end]
+
+
+class AutoScheduler:
+    """SlotRequest のリストを登録済みの予定と重ならない時間に配置するクラス"""
+    def __init__(self, data_manager, day_start_hour=9, day_end_hour=18, granularity_minutes=15,
+                 candidates_per_request=3, search_budget=5000, time_limit=0.5):
+        self.data_manager = data_manager
+        self.day_start_hour = day_start_hour  # 予定を置いてよい時間帯（時）
+        self.day_end_hour = day_end_hour
+        self.granularity_minutes = granularity_minutes  # 開始時刻をこの分単位に揃える
+        self.candidates_per_request = candidates_per_request  # バックトラックで試す配置候補の数
+        self.search_budget = search_budget  # バックトラックで別の候補を試す回数の上限
+        self.time_limit = time_limit  # バックトラックを続ける時間の上限（秒）。超えたらそれまでの最良の配置を使う
+
+    @timed("auto_scheduler.plan")
+    def plan(self, requests):
+        """要求を配置した Plan を返します（DBには保存しません）。"""
+        requests = list(requests)
+        feasible = [
+            r for r in requests
+            if r.duration_minutes > 0 and r.latest - r.earliest >= timedelta(minutes=r.duration_minutes)
+        ]
+        if not feasible:
+            return Plan([], requests, 0)
+
+        horizon_start = min(r.earliest for r in feasible)
+        horizon_end = max(r.latest for r in feasible)
+        free = FreeIntervals(
+            _to_minutes(horizon_start), _to_minutes(horizon_end), self._busy_intervals(horizon_start, horizon_end)
+        )
+        # 優先度の高い順、置ける幅（余裕）の狭い順に決めると、貪欲法だけで全件置けることが多い
+        order = sorted(feasible, key=lambda r: (
+            -r.priority, (r.latest - r.earliest).total_seconds() / 60 - r.duration_minutes, r.earliest
+        ))
+        chosen, steps = self._search(order, free)
+
+        placements = sorted(
+            (Placement(r, _from_minutes(start), _from_minutes(start + r.duration_minutes))
+             for r, start in zip(order, chosen) if start is not None),
+            key=lambda p: p.start,
+        )
+        placed = {id(p.request) for p in placements}
+        unplaced = [r for r in requests if id(r) not in placed]
+        logger.info("自動スケジュール: %s件中%s件を配置しました（バックトラック %s回）。",
+                    len(requests), len(placements), steps)
+        return Plan(placements, unplaced, steps)
+
+    def _busy_intervals(self, horizon_start, horizon_end):
+        """登録済みの予定と、予定を置かない時間帯（day_end_hour から翌日の day_start_hour まで）を分の区間で返します。"""
+        busy = []
+        for schedule in self.data_manager.get_schedules_in_range(
+            horizon_start.strftime(DATETIME_FORMAT), horizon_end.strftime(DATETIME_FORMAT)
+        ):
+            start = datetime.fromisoformat(schedule[2])
+            end = datetime.fromisoformat(schedule[3])
+            busy.append((_to_minutes(start), -(-int((end - EPOCH).total_seconds()) // 60)))
+
+        if self.day_start_hour > 0 or self.day_end_hour < 24:
+            day = datetime.combine(horizon_start.date() - timedelta(days=1), datetime.min.time())
+            while day <= horizon_end:
+                night_start = day + timedelta(hours=self.day_end_hour)
+                night_end = day + timedelta(days=1, hours=self.day_start_hour)
+                busy.append((_to_minutes(night_start), _to_minutes(night_end)))
+                day += timedelta(days=1)
+        return busy
+
+    def _search(self, order, free):
+        """配置を決めます。最初の探索は貪欲法と同じで、置けない要求があるときだけ別の候補を試します。
+
+        目的は配置できた要求の (1 + 優先度) の合計の最大化で、残りを全部置けても今の最良を超えない枝は打ち切ります。
+        order と同じ並びで開始時刻（分、置けない場合は None）のリストと、別の候補を試した回数を返します。
+        """
+        count = len(order)
+        if count > MAX_SEARCH_REQUESTS:
+            return self._greedy(order, free), 0
+        weights = [1 + max(0, r.priority) for r in order]
+        remaining = [0] * (count + 1)  # i 番目以降をすべて置けた場合の重みの合計
+        for i in range(count - 1, -1, -1):
+            remaining[i] = remaining[i + 1] + weights[i]
+
+        chosen = [None] * count
+        state = {"best_score": -1, "best": list(chosen), "budget": self.search_budget, "steps": 0}
+        deadline = time.perf_counter() + self.time_limit
+
+        def visit(i, score):
+            if state["best_score"] == remaining[0] or score + remaining[i] <= state["best_score"]:
+                return
+            if i == count:
+                state["best_score"] = score
+                state["best"] = list(chosen)
+                return
+            request = order[i]
+            options = free.find(
+                request.duration_minutes, _to_minutes(request.earliest), _to_minutes(request.latest),
+                self.granularity_minutes, self.candidates_per_request,
+            )
+            for k, start in enumerate(options + [None]):
+                if k > 0:
+                    if state["budget"] <= 0 or state["best_score"] == remaining[0] or time.perf_counter() > deadline:
+                        return
+                    state["budget"] -= 1
+                    state["steps"] += 1
+                if start is None:
+                    chosen[i] = None
+                    visit(i + 1, score)
+                else:
+                    token = free.reserve(start, start + request.duration_minutes)
+                    chosen[i] = start
+                    visit(i + 1, score + weights[i])
+                    free.release(token)
+            chosen[i] = None
+
+        visit(0, 0)
+        return state["best"], state["steps"]
+
+    def _greedy(self, order, free):
+        """order の順に、それぞれ最初に見つかった空き時間へ置きます（再帰しないので件数によらず使える）。"""
+        chosen = []
+        for request in order:
+            options = free.find(
+                request.duration_minutes, _to_minutes(request.earliest), _to_minutes(request.latest),
+                self.granularity_minutes,
+            )
+            if options:
+                free.reserve(options[0], options[0] + request.duration_minutes)
+            chosen.append(options[0] if options else None)
+        return chosen
+
+    def commit(self, plan):
+        """計画した予定を開始・終了タスクつきで1つのトランザクションで保存し、予定IDのリストを返します。
+
+        計画後に他のインスタンスが重なる予定を登録していた場合は何も保存せずに None を返します。
+        """
+        entries = [
+            {
+                "title": p.request.title,
+                "start_dt": p.start.strftime(DATETIME_FORMAT),
+                "end_dt": p.end.strftime(DATETIME_FORMAT),
+                "category": p.request.category,
+                "location": p.request.location,
+                "description": p.request.description,
+                "notification_minutes": p.request.notification_minutes,
+                "tasks": [START_TASK, *p.request.tasks, END_TASK],
+            }
+            for p in plan.placements
+        ]
+        return self.data_manager.save_planned_schedules(entries)
+
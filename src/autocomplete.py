@@ -0,0 +1,182 @@
+# src/autocomplete.py
+"""入力補完用の接頭辞インデックス（Qtに依存しない）
+
+過去に入力したタイトル・場所・タスクを、大文字小文字を区別しないキーでソートした配列に保持し、
+bisect で接頭辞に一致する範囲を求めて、入力された回数の多い順に候補を返します。
+一致する範囲が広い短い接頭辞は上位の候補をキャッシュし、追加時はキャッシュを作り直さずに更新するため、
+数十万件の履歴があっても1文字目から1ミリ秒未満で候補を返せます。
+"""
+
+import bisect
+import heapq
+import logging
+import threading
+
+from src.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+CACHE_MIN_RANGE = 512  # 一致する件数がこれ以上の接頭辞は上位の候補をキャッシュする
+WARM_PREFIX_LENGTH = 3  # インデックスの作成時に上位の候補を求めておく接頭辞の長さ
+MAX_KEY = "\U0010ffff"  # 接頭辞に続けて範囲の上限を作るための最大の文字
+
+# 補完の対象（フィールド名: 説明）
+FIELDS = {
+    "title": "タイトル",
+    "location": "場所",
+    "task": "タスク",
+}
+
+
+class PrefixIndex:
+    """文字列と入力された回数を保持し、接頭辞に一致する候補を回数の多い順に返すクラス"""
+    def __init__(self, limit=10):
+        self.limit = limit  # 返す候補の最大数
+        self._entries = []  # (大文字小文字を区別しないキー, 文字列) のソート済みリスト
+        self._counts = {}  # 文字列: 入力された回数
+        self._top_cache = {}  # 接頭辞のキー: 上位 limit 件の文字列
+
+    def __len__(self):
+        return len(self._entries)
+
+    @timed("autocomplete.build")
+    def build(self, frequencies):
+        """(文字列, 回数) の組からインデックスを作り直します。"""
+        counts = {}
+        for text, count in frequencies:
+            text = (text or "").strip()
+            if text:
+                counts[text] = counts.get(text, 0) + count
+        self._counts = counts
+        self._entries = sorted((text.casefold(), text) for text in counts)
+        self._top_cache = self._warm_cache()
+
+    def _warm_cache(self):
+        """短い接頭辞の上位の候補を、回数の多い順に全件を1回走査するだけで求めます。
+
+        一致する範囲が広い接頭辞ほど最初の入力で範囲全体を調べることになるため、作成時に済ませておきます。
+        一致する件数が CACHE_MIN_RANGE 未満の接頭辞は入力時に求めても速いので残しません。
+        """
+        counts = self._counts
+        cache = {}
+        sizes = {}
+        ranked = sorted(self._entries, key=lambda entry: -counts[entry[1]])  # 同じ回数ならキーの順のまま
+        for key, text in ranked:
+            for length in range(1, min(WARM_PREFIX_LENGTH, len(key)) + 1):
+                prefix = key[:length]
+                sizes[prefix] = sizes.get(prefix, 0) + 1
+                top = cache.get(prefix)
+                if top is None:
+                    cache[prefix] = [text]
+                elif len(top) < self.limit:
+                    top.append(text)
+        return {prefix: top for prefix, top in cache.items() if sizes[prefix] >= CACHE_MIN_RANGE}
+
+    def add(self, text, count=1):
+        """文字列を1件（count 回分）追加します。キャッシュ済みの候補もその場で更新します。"""
+        text = (text or "").strip()
+        if not text:
+            return
+        key = text.casefold()
+        if text in self._counts:
+            self._counts[text] += count
+        else:
+            bisect.insort(self._entries, (key, text))
+            self._counts[text] = count
+
+        # 回数は増えるだけなので、キャッシュ済みの上位候補には入れ替えだけで反映できる
+        frequency = self._counts[text]
+        for length in range(1, len(key) + 1):
+            cached = self._top_cache.get(key[:length])
+            if cached is None:
+                continue
+            if text in cached:
+                cached.remove(text)
+            elif len(cached) >= self.limit:
+                if frequency <= self._counts[cached[-1]]:
+                    continue
+                cached.pop()
+            # 同じ回数の中ではキーの順に並べる（_top と同じ順序）
+            position = 0
+            while position < len(cached) and (
+                self._counts[cached[position]] > frequency
+                or (self._counts[cached[position]] == frequency and cached[position].casefold() < key)
+            ):
+                position += 1
+            cached.insert(position, text)
+
+    def complete(self, prefix, limit=None):
+        """prefix で始まる文字列を入力された回数の多い順に最大 limit 件返します。"""
+        key = (prefix or "").strip().casefold()
+        if not key:
+            return []
+        limit = min(limit or self.limit, self.limit)
+        cached = self._top_cache.get(key)
+        if cached is not None:
+            return cached[:limit]
+
+        low = bisect.bisect_left(self._entries, (key,))
+        high = bisect.bisect_left(self._entries, (key + MAX_KEY,), low)
+        top = self._top(low, high, self.limit)
+        if high - low >= CACHE_MIN_RANGE:
+            self._top_cache[key] = top
+        return top[:limit]
+
+    def _top(self, low, high, limit):
+        counts = self._counts
+        # nlargest は同じ回数の要素を元の順（キーの順）に残す
+        return heapq.nlargest(limit, (text for _, text in self._entries[low:high]), key=counts.__getitem__)
+
+
+class AutocompleteIndex:
+    """タイトル・場所・タスクそれぞれの PrefixIndex をまとめたクラス"""
+    def __init__(self, limit=10):
+        self.limit = limit
+        self.indexes = {field: PrefixIndex(limit) for field in FIELDS}
+        self._lock = threading.Lock()
+        self._loading = 0  # 実行中の load() の数
+        self._pending = []  # load() の実行中に record() された内容（差し替え時に反映し直す）
+
+    def __getitem__(self, field):
+        return self.indexes[field]
+
+    def load(self, data_manager):
+        """DBに登録済みの予定とタスクから全インデックスを作り直します。
+
+        新しいインデックスを作ってから一度に差し替えるため、別スレッドで実行している間も補完は古い候補で動きます。
+        作り直している間に record() された内容は、差し替える前に新しいインデックスへ反映し直します。
+        """
+        with self._lock:
+            self._loading += 1
+        try:
+            frequencies = data_manager.get_completion_frequencies()
+            indexes = {}
+            for field in FIELDS:
+                indexes[field] = PrefixIndex(self.limit)
+                indexes[field].build(frequencies.get(field, ()))
+            with self._lock:
+                for title, location, tasks in self._pending:
+                    self._add(indexes, title, location, tasks)
+                self.indexes = indexes
+        finally:
+            with self._lock:
+                self._loading -= 1
+                if not self._loading:
+                    self._pending = []
+        logger.info("入力補完の候補を読み込みました: %s",
+                    ", ".join(f"{FIELDS[field]} {len(index)}件" for field, index in indexes.items()))
+
+    def record(self, title=None, location=None, tasks=()):
+        """保存した予定の内容を候補に追加します。"""
+        tasks = tuple(tasks)
+        with self._lock:
+            self._add(self.indexes, title, location, tasks)
+            if self._loading:
+                self._pending.append((title, location, tasks))
+
+    @staticmethod
+    def _add(indexes, title, location, tasks):
+        indexes["title"].add(title)
+        indexes["location"].add(location)
+        for task in tasks:
+            indexes["task"].add(task)
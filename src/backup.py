@@ -0,0 +1,189 @@
+# src/backup.py
+"""DBのオンラインバックアップと復元（Qtに依存しない）
+
+SQLiteのオンラインバックアップAPIで、アプリがDBを使っている間も一定のページ数ずつコピーします。
+コピー中はバックアップ元の接続で読み取りトランザクションを開いたままにするため、WALモードでは
+途中で他の接続が書き込んでもコピーが最初からやり直しにならず、開始時点の内容がそのまま保存されます。
+バックアップは data/backups に日時付きのファイル名で保存し、古いものから削除して keep 件に保ちます。
+"""
+
+import gzip
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from src.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+STEP_PAGES = 1024  # 1回のステップでコピーするページ数（既定のページサイズで4MB）
+STEP_SLEEP = 0.005  # ステップの間に待つ時間（秒）。この間は他の接続が書き込みロックを取得できる
+KEEP_BACKUPS = 7  # 残すバックアップの数
+TIMESTAMP_FORMAT = "%Y%m%d-%H%M%S-%f"  # 続けて作成しても重ならないようマイクロ秒まで含める
+COPY_CHUNK_SIZE = 1024 * 1024  # 圧縮・展開で一度に読み書きするバイト数
+COMPRESS_LEVEL = 6  # gzip の圧縮レベル（9 は時間がかかる割に小さくならない）
+
+# 作成したバックアップ（size は保存したファイルのバイト数、copy_seconds はバックアップAPIでのコピー、
+# seconds は圧縮を含む全体にかかった時間）
+BackupResult = namedtuple("BackupResult", ["path", "pages", "db_bytes", "size", "copy_seconds", "seconds"])
+
+
+def backup_dir_for(db_path):
+    """バックアップの保存先ディレクトリを返します（DBファイルと同じ場所の backups）。"""
+    return os.path.join(os.path.dirname(db_path), "backups")
+
+
+def _backup_pattern(db_path):
+    stem = re.escape(os.path.splitext(os.path.basename(db_path))[0])
+    return re.compile(rf"^{stem}-(\d{{8}}-\d{{6}}-\d{{6}})\.db(\.gz)?$")
+
+
+def list_backups(db_path, backup_dir=None):
+    """バックアップの (作成日時, パス) のリストを新しい順に返します。"""
+    backup_dir = backup_dir or backup_dir_for(db_path)
+    pattern = _backup_pattern(db_path)
+    backups = []
+    try:
+        names = os.listdir(backup_dir)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            backups.append((datetime.strptime(match.group(1), TIMESTAMP_FORMAT), os.path.join(backup_dir, name)))
+    backups.sort(reverse=True)
+    return backups
+
+
+def find_backup(db_path, at=None, backup_dir=None):
+    """at（datetime、省略時は現在）以前に作成された最新のバックアップのパスを返します。なければ None を返します。"""
+    for created_at, path in list_backups(db_path, backup_dir):
+        if at is None or created_at <= at:
+            return path
+    return None
+
+
+def rotate_backups(db_path, keep=KEEP_BACKUPS, backup_dir=None):
+    """新しい keep 件を残して古いバックアップを削除し、削除したパスのリストを返します。"""
+    removed = []
+    for _, path in list_backups(db_path, backup_dir)[keep:]:
+        try:
+            os.remove(path)
+            removed.append(path)
+        except OSError as e:
+            logger.warning("古いバックアップを削除できませんでした: %s (%s)", path, e)
+    return removed
+
+
+def copy_pages(source, dest, pages=STEP_PAGES, sleep=STEP_SLEEP, progress=None):
+    """source の接続のDBを pages ページずつ dest の接続のDBにコピーし、全ページ数を返します。
+
+    progress を指定すると、ステップごとに (コピー済みのページ数, 全ページ数) で呼び出します。
+    """
+    total = [0]
+
+    def on_progress(status, remaining, page_count):
+        total[0] = page_count
+        if progress:
+            progress(page_count - remaining, page_count)
+        if remaining and sleep:
+            time.sleep(sleep)  # ステップの間はロックを持たないので、他の接続の処理を先に進めさせる
+
+    # ステップの実行中はGILを解放するため、別スレッドで実行すればGUIのスレッドは止まらない
+    source.backup(dest, pages=pages, progress=on_progress)
+    return total[0]
+
+
+@timed("backup.create")
+def create_backup(db_path, backup_dir=None, compress=False, keep=KEEP_BACKUPS,
+                  pages=STEP_PAGES, sleep=STEP_SLEEP, progress=None):
+    """db_path のバックアップを作成し、BackupResult を返します。失敗した場合は None を返します。
+
+    progress は copy_pages と同じです。compress=True なら gzip で圧縮して保存します。keep が None ならローテーションしません。
+    """
+    backup_dir = backup_dir or backup_dir_for(db_path)
+    os.makedirs(backup_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    path = os.path.join(backup_dir, f"{stem}-{datetime.now():{TIMESTAMP_FORMAT}}.db")
+    final_path = path + ".gz" if compress else path
+    partial_path = path + ".partial"
+
+    start = time.perf_counter()
+    source = dest = None
+    try:
+        source = sqlite3.connect(db_path)
+        source.execute("PRAGMA query_only=ON")
+        # 読み取りトランザクションを開いたままコピーし、書き込みがあっても開始時点の内容で最後まで進める
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        dest = sqlite3.connect(partial_path)
+        page_count = copy_pages(source, dest, pages, sleep, progress)
+        # WALモードの設定もコピーされるため、1ファイルで完結するように戻す
+        dest.execute("PRAGMA journal_mode=DELETE")
+        dest.close()
+        dest = None
+        copy_seconds = time.perf_counter() - start
+        db_bytes = os.path.getsize(partial_path)
+        if compress:
+            with open(partial_path, "rb") as src_file, gzip.open(final_path + ".partial", "wb", COMPRESS_LEVEL) as gz_file:
+                shutil.copyfileobj(src_file, gz_file, COPY_CHUNK_SIZE)
+            os.replace(final_path + ".partial", final_path)
+            os.remove(partial_path)
+        else:
+            os.replace(partial_path, final_path)
+    except (sqlite3.Error, OSError) as e:
+        logger.error("バックアップエラー: %s", e)
+        for leftover in (partial_path, final_path + ".partial"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        return None
+    finally:
+        for conn in (dest, source):
+            if conn is not None:
+                conn.close()
+
+    seconds = time.perf_counter() - start
+    result = BackupResult(final_path, page_count, db_bytes, os.path.getsize(final_path), copy_seconds, seconds)
+    logger.info("バックアップを作成しました: %s（%sページ, %.1f MB/s）", final_path, page_count, throughput_mb_s(result))
+    if keep is not None:
+        for removed in rotate_backups(db_path, keep, backup_dir):
+            logger.info("古いバックアップを削除しました: %s", removed)
+    return result
+
+
+def throughput_mb_s(result, include_compression=False):
+    """バックアップしたDBの大きさをコピーにかかった時間（include_compression=True なら全体の時間）で割った値（MB/秒）を返します。"""
+    seconds = result.seconds if include_compression else result.copy_seconds
+    return result.db_bytes / (1024 * 1024) / seconds if seconds else 0.0
+
+
+def restore_backup(data_manager, backup_path, safety_backup=True, pages=STEP_PAGES, progress=None):
+    """バックアップの内容で data_manager のDBを置き換えます。成功した場合は True を返します。
+
+    safety_backup=True なら、置き換える前に現在のDBのバックアップを作成します（作成時にはローテーションしません）。
+    圧縮したバックアップは一時ファイルに展開してから復元します。
+    """
+    if not os.path.exists(backup_path):
+        logger.error("バックアップが見つかりません: %s", backup_path)
+        return False
+    if safety_backup and create_backup(data_manager.db_path, keep=None, pages=pages) is None:
+        logger.error("現在のDBをバックアップできなかったため、復元を中止しました。")
+        return False
+
+    if not backup_path.endswith(".gz"):
+        return data_manager.restore_from_file(backup_path, pages, progress)
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            expanded_path = os.path.join(tmp_dir, "restore.db")
+            with gzip.open(backup_path, "rb") as gz_file, open(expanded_path, "wb") as dest_file:
+                shutil.copyfileobj(gz_file, dest_file, COPY_CHUNK_SIZE)
+            return data_manager.restore_from_file(expanded_path, pages, progress)
+    except (OSError, EOFError) as e:
+        logger.error("バックアップの展開エラー: %s", e)
+        return False
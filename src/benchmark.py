@@ -0,0 +1,341 @@
+# src/benchmark.py
+"""DataManager とGUIのホットパスのベンチマーク
+
+使い方（リポジトリのルートで実行）:
+    python -m src.benchmark --schedules 10000 --output bench.json
+    python -m src.benchmark --schedules 10000 --compare bench.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from src.auto_scheduler import AutoScheduler, SlotRequest
+from src.backup import create_backup, throughput_mb_s
+from src.data_manager import DataManager
+from src.notification_engine import NotificationEngine, RecordingSink
+
+logger = logging.getLogger(__name__)
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+CATEGORIES = ["プライベート", "仕事", "学習", "その他"]
+
+
+def generate_database(db_path, num_schedules=1000, tasks_per_schedule=5, locked_ratio=0.1,
+                      completed_ratio=0.3, past_ratio=0.5, seed=0):
+    """ベンチマーク用の合成データベースを作成します。
+
+    開始日時は現在を中心に過去/未来へ分散させ、past_ratio の割合が終了済みの予定になります。
+    生成自体は計測対象ではないため、DataManager を介さず executemany で一括挿入します。
+    """
+    rng = random.Random(seed)
+    dm = DataManager(db_path)
+    now = datetime.now().replace(second=0, microsecond=0)
+
+    schedule_rows = []
+    for i in range(num_schedules):
+        if rng.random() < past_ratio:
+            start = now - timedelta(minutes=rng.randint(120, 365 * 24 * 60))
+        else:
+            start = now + timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+        end = start + timedelta(minutes=rng.choice([30, 60, 90, 120]))
+        is_completed = 1 if rng.random() < completed_ratio else 0
+        schedule_rows.append((
+            f"予定{i}",
+            start.strftime(DATETIME_FORMAT),
+            end.strftime(DATETIME_FORMAT),
+            rng.choice(CATEGORIES),
+            f"場所{rng.randint(0, 50)}",
+            "詳細" * rng.randint(0, 20),
+            now.isoformat(),
+            1 if rng.random() < locked_ratio else 0,
+            rng.choice([None, 5, 10, 30]),
+            is_completed,
+            now.isoformat() if is_completed else None,
+            rng.choice([None, 15]),
+        ))
+    dm.cursor.executemany('''
+        INSERT INTO schedules (title, start_datatime, end_datatime, category, location, description, created_at,
+                               is_locked, notification_minutes, is_completed, completed_at, task_notification_minutes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', schedule_rows)
+
+    dm.cursor.execute("SELECT id FROM schedules")
+    task_rows = []
+    for (schedule_id,) in dm.cursor.fetchall():
+        descriptions = ["スケジュールの開始"] + [f"タスク{j}" for j in range(tasks_per_schedule)] + ["スケジュールの終了"]
+        for desc in descriptions:
+            task_rows.append((schedule_id, desc, 1 if rng.random() < completed_ratio else 0))
+    dm.cursor.executemany(
+        "INSERT INTO tasks (schedule_id, task_description, is_completed) VALUES (?, ?, ?)", task_rows
+    )
+    dm.conn.commit()
+    # 文字列で挿入した区分・場所を、DataManager で保存した場合と同じく参照テーブルのIDに置き換える
+    dm.normalize_lookup_values()
+    # 予定の行に挿入した詳細内容も、DataManager で保存した場合と同じく schedule_texts に移す
+    dm.move_descriptions()
+    return dm
+
+
+def measure(func, repeat=5, warmup=1):
+    """func を繰り返し実行し、1回あたりの処理時間の統計（ミリ秒）を返します。"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "runs": len(samples),
+        "min_ms": samples[0],
+        "median_ms": statistics.median(samples),
+        "mean_ms": statistics.fmean(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "max_ms": samples[-1],
+    }
+
+
+def bench_data_manager(dm, repeat):
+    """DataManager の主要メソッドを計測します。"""
+    results = {}
+    start = datetime.now() + timedelta(days=1)
+    start_str = start.strftime(DATETIME_FORMAT)
+    end_str = (start + timedelta(hours=1)).strftime(DATETIME_FORMAT)
+    created_ids = []
+
+    def save_schedule():
+        created_ids.append(dm.save_schedule("ベンチマーク", start_str, end_str, "仕事", "会議室", "説明"))
+
+    results["save_schedule"] = measure(save_schedule, repeat)
+
+    tasks = ["スケジュールの開始"] + [f"タスク{i}" for i in range(10)] + ["スケジュールの終了"]
+    results["save_tasks"] = measure(lambda: dm.save_tasks(created_ids[0], tasks), repeat)
+    results["get_current_schedules"] = measure(dm.get_current_schedules, repeat)
+    results["get_past_schedules"] = measure(dm.get_past_schedules, repeat)
+    results["get_past_schedules_page"] = measure(dm.get_past_schedules_page, repeat)
+    results["get_schedule_description"] = measure(lambda: dm.get_schedule_description(created_ids[0]), repeat)
+    results["get_tasks_for_schedule"] = measure(lambda: dm.get_tasks_for_schedule(created_ids[0]), repeat)
+    month_start = (start - timedelta(days=30)).strftime(DATETIME_FORMAT)
+    results["get_schedules_by_category"] = measure(
+        lambda: dm.get_schedules_by_category("仕事", month_start, end_str), repeat
+    )
+    results["get_category_summary"] = measure(lambda: dm.get_category_summary(month_start, end_str), repeat)
+    # 追加のカレンダーがない場合の、カレンダーをまとめた読み込みのオーバーヘッド
+    results["get_schedules_in_range"] = measure(lambda: dm.get_schedules_in_range(month_start, end_str), repeat)
+    results["get_federated_schedules_in_range"] = measure(
+        lambda: dm.get_federated_schedules_in_range(month_start, end_str), repeat
+    )
+
+    # 計測で追加した予定は後続の計測に影響しないよう削除する
+    for schedule_id in created_ids:
+        dm.delete_schedule(schedule_id)
+    return results
+
+
+def bench_concurrent_reads(dm, repeat, threads=4):
+    """複数スレッドから同時に get_current_schedules を実行したときの処理時間を計測します。"""
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        def read_in_parallel():
+            list(executor.map(lambda _: dm.get_current_schedules(), range(threads)))
+        result = measure(read_in_parallel, repeat)
+    result["threads"] = threads
+    return {"concurrent_get_current_schedules": result}
+
+
+def bench_notification_engine(dm, repeat):
+    """Qtを使わずに通知判定（1回のチェック）を計測します。"""
+    sink = RecordingSink()
+    engine = NotificationEngine(dm, sink)
+    result = measure(engine.check_notifications, repeat)
+    result["notifications_fired"] = len(sink.notifications)
+    return {"notification_engine_tick": result}
+
+
+def bench_auto_scheduler(dm, repeat, num_requests=200, seed=0):
+    """今後8週間に num_requests 件の予定を自動配置する計画（保存はしない）を計測します。"""
+    rng = random.Random(seed)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    requests = []
+    for i in range(num_requests):
+        earliest = today + timedelta(days=rng.randint(1, 56), hours=9)
+        requests.append(SlotRequest(
+            f"自動配置{i}", rng.choice([30, 60, 90]), rng.choice(CATEGORIES),
+            earliest, earliest + timedelta(days=rng.randint(1, 7)), rng.randint(0, 3),
+        ))
+    scheduler = AutoScheduler(dm)
+    result = measure(lambda: scheduler.plan(requests), repeat)
+    plan = scheduler.plan(requests)
+    result["placed"] = len(plan.placements)
+    result["unplaced"] = len(plan.unplaced)
+    return {"auto_scheduler_plan": result}
+
+
+def bench_backup(dm, repeat):
+    """オンラインバックアップ（圧縮なし）の処理時間と、コピーの速度（MB/秒の中央値）を計測します。"""
+    with tempfile.TemporaryDirectory() as backup_dir:
+        backups = []
+        result = measure(lambda: backups.append(create_backup(dm.db_path, backup_dir, keep=1)), repeat)
+    result["db_bytes"] = backups[-1].db_bytes
+    result["throughput_mb_s"] = statistics.median(throughput_mb_s(backup) for backup in backups)
+    return {"online_backup": result}
+
+
+def bench_gui(dm, repeat):
+    """Qt の offscreen プラットフォーム上でGUIのホットパスを計測します。"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PySide6.QtWidgets import QApplication
+        from src.gui import ScheduleApp
+    except ImportError as e:
+        logger.warning("PySide6 を読み込めないためGUIのベンチマークを省略します: %s", e)
+        return {}
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    window = ScheduleApp(data_manager=dm)
+    notification_manager = window.notification_manager
+    notification_manager.timer.stop()
+    # モーダルダイアログで処理が止まらないよう、通知の表示は記録だけにする
+    sink = RecordingSink()
+    notification_manager.engine.sink = sink
+
+    results = {
+        "check_notifications": measure(notification_manager.check_notifications, repeat),
+        "load_schedules_to_list": measure(window._load_schedules_to_list, repeat),
+    }
+    results["check_notifications"]["notifications_fired"] = len(sink.notifications)
+
+    # 一覧で予定を順に選択し、詳細表示（タスクのチェックリスト）の描画が終わるまでの時間
+    rows = window.schedule_list_widget.count()
+    if rows:
+        window.show()
+        selection = {"row": 0}
+
+        def select_next_schedule():
+            selection["row"] = (selection["row"] + 1) % rows
+            window.schedule_list_widget.setCurrentRow(selection["row"])
+            window.detail_area.repaint()
+
+        results["select_schedule_to_render"] = measure(select_next_schedule, repeat * 10)
+
+    window.show_past_schedules = True
+    results["load_past_schedules_to_list"] = measure(window._load_schedules_to_list, repeat)
+    window.show_past_schedules = False
+
+    window.close()
+    app.processEvents()
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(num_schedules, tasks_per_schedule, locked_ratio, completed_ratio, repeat,
+                   seed=0, include_gui=True):
+    """合成DBを作成してすべてのベンチマークを実行し、結果を辞書で返します。"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "benchmark.db")
+        generate_start = time.perf_counter()
+        dm = generate_database(path, num_schedules, tasks_per_schedule, locked_ratio, completed_ratio, seed=seed)
+        generate_seconds = time.perf_counter() - generate_start
+
+        results = bench_data_manager(dm, repeat)
+        results.update(bench_concurrent_reads(dm, repeat))
+        results.update(bench_notification_engine(dm, repeat))
+        results.update(bench_auto_scheduler(dm, repeat, seed=seed))
+        results.update(bench_backup(dm, repeat))
+        if include_gui:
+            results.update(bench_gui(dm, repeat))
+        dm.close()
+
+    return {
+        "metadata": {
+            "timestamp": datetime.now().isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+        "parameters": {
+            "schedules": num_schedules,
+            "tasks_per_schedule": tasks_per_schedule,
+            "locked_ratio": locked_ratio,
+            "completed_ratio": completed_ratio,
+            "repeat": repeat,
+            "seed": seed,
+            "generate_seconds": generate_seconds,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """前回の結果と比較し、median が threshold 倍を超えて悪化した項目名のリストを返します。"""
+    regressions = []
+    for name, stat in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base["median_ms"]:
+            continue
+        ratio = stat["median_ms"] / base["median_ms"]
+        marker = "  <-- 悪化" if ratio > threshold else ""
+        print(f"{name:32s} {base['median_ms']:10.3f}ms -> {stat['median_ms']:10.3f}ms ({ratio:5.2f}x){marker}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MyScheduleManager のベンチマーク")
+    parser.add_argument("--schedules", type=int, default=1000, help="合成する予定の件数")
+    parser.add_argument("--tasks", type=int, default=5, help="予定1件あたりのユーザータスク数")
+    parser.add_argument("--locked-ratio", type=float, default=0.1, help="ロック済み予定の割合")
+    parser.add_argument("--completed-ratio", type=float, default=0.3, help="完了済み予定・タスクの割合")
+    parser.add_argument("--repeat", type=int, default=5, help="各計測の繰り返し回数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    parser.add_argument("--no-gui", action="store_true", help="GUIのベンチマークを省略する")
+    parser.add_argument("--output", help="結果を書き出すJSONファイル")
+    parser.add_argument("--compare", help="比較対象となる前回の結果JSON")
+    parser.add_argument("--threshold", type=float, default=1.2, help="悪化とみなす median の倍率")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    report = run_benchmarks(
+        args.schedules, args.tasks, args.locked_ratio, args.completed_ratio, args.repeat,
+        seed=args.seed, include_gui=not args.no_gui,
+    )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(baseline, report, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
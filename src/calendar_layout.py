@@ -0,0 +1,132 @@
+# src/calendar_layout.py
+"""カレンダー表示用の予定のレイアウト計算（Qtに依存しない）
+
+表示範囲の予定を週単位で取得して日ごとに切り出し、時間が重なる予定を横に並べる列を
+スイープライン法で割り当てます。計算結果は週ごとにLRUキャッシュし、DBが変わったときだけ破棄するため、
+表示期間を行き来するスクロールではDBへの問い合わせもレイアウト計算も発生しません。
+"""
+
+import heapq
+from collections import OrderedDict, namedtuple
+from datetime import datetime, time, timedelta
+
+from src.metrics import metrics
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+MINUTES_PER_DAY = 24 * 60
+
+# 1日分に切り出した予定の表示位置
+# start_minute/end_minute はその日の0時からの分、column/columns は重なりの中での列番号と列数
+Segment = namedtuple("Segment", ["schedule", "start_minute", "end_minute", "column", "columns"])
+
+
+def week_start(day):
+    """day を含む週の月曜日の日付を返します。"""
+    return day - timedelta(days=day.weekday())
+
+
+def assign_columns(intervals):
+    """時間が重なる区間に列を割り当てます。
+
+    intervals は (start, end, key) のリストで、{key: (column, columns)} を返します。
+    開始順に走査し、終了した区間の列を再利用しながら空いている最小の列を割り当てます。
+    columns は重なりでつながった区間のまとまりごとの列数なので、まとまりの中では同じ幅で並べられます。
+    """
+    result = {}
+    active = []  # 表示中の区間の (end, column) のヒープ
+    free = []    # 空いた列番号のヒープ
+    cluster = []
+    cluster_columns = 0
+    for start, end, key in sorted(intervals, key=lambda interval: (interval[0], interval[1])):
+        while active and active[0][0] <= start:
+            heapq.heappush(free, heapq.heappop(active)[1])
+        if not active and cluster:
+            # 重なりが途切れたので、ここまでのまとまりの列数を確定する
+            for cluster_key in cluster:
+                result[cluster_key] = (result[cluster_key], cluster_columns)
+            cluster, cluster_columns, free = [], 0, []
+        if free:
+            column = heapq.heappop(free)
+        else:
+            column = cluster_columns
+            cluster_columns += 1
+        heapq.heappush(active, (end, column))
+        result[key] = column
+        cluster.append(key)
+    for cluster_key in cluster:
+        result[cluster_key] = (result[cluster_key], cluster_columns)
+    return result
+
+
+def layout_week(schedules, monday):
+    """1週間分の予定を日ごとに切り出し、重なりの列を割り当てた Segment のリストを7日分返します。"""
+    day_starts = [datetime.combine(monday + timedelta(days=i), time.min) for i in range(7)]
+    pieces = [[] for _ in range(7)]
+    for schedule in schedules:
+        start = datetime.strptime(schedule[2], DATETIME_FORMAT)
+        end = max(start, datetime.strptime(schedule[3], DATETIME_FORMAT))
+        first = max(0, (start.date() - monday).days)
+        # 終了がちょうど0時の予定は翌日に表示しない
+        last_moment = end - timedelta(microseconds=1) if end > start else end
+        last = min(6, (last_moment.date() - monday).days)
+        for i in range(first, last + 1):
+            day_start = day_starts[i]
+            piece_start = max(start, day_start)
+            piece_end = min(end, day_start + timedelta(days=1))
+            pieces[i].append((
+                schedule,
+                int((piece_start - day_start).total_seconds() // 60),
+                int((piece_end - day_start).total_seconds() // 60),
+            ))
+
+    days = []
+    for day_pieces in pieces:
+        columns = assign_columns([(start, end, index) for index, (_, start, end) in enumerate(day_pieces)])
+        days.append([
+            Segment(schedule, start, end, *columns[index])
+            for index, (schedule, start, end) in enumerate(day_pieces)
+        ])
+    return days
+
+
+class WeekCache:
+    """週ごとのレイアウト結果を保持するLRUキャッシュ"""
+    def __init__(self, data_manager, capacity=64):
+        self.data_manager = data_manager
+        self.capacity = capacity  # 月表示（6週）で前後数ヶ月を行き来しても収まる週数
+        self._weeks = OrderedDict()  # 月曜日の日付: 7日分の Segment のリスト
+        self._token = None
+
+    def get_week(self, monday):
+        """monday から始まる週のレイアウトを返します（キャッシュになければDBから取得して計算）。"""
+        change_token = getattr(self.data_manager, "change_token", None)
+        token = change_token() if change_token else None
+        if token is None or token != self._token:
+            # DBが変わったのでレイアウトをすべて作り直す
+            self._weeks.clear()
+            self._token = token
+
+        week = self._weeks.get(monday)
+        if week is not None:
+            self._weeks.move_to_end(monday)
+            metrics.increment("calendar.week_cache.hit")
+            return week
+
+        metrics.increment("calendar.week_cache.miss")
+        range_start = datetime.combine(monday, time.min)
+        schedules = self.data_manager.get_schedules_in_range(
+            range_start.strftime(DATETIME_FORMAT), (range_start + timedelta(days=7)).strftime(DATETIME_FORMAT)
+        )
+        week = layout_week(schedules, monday)
+        self._weeks[monday] = week
+        while len(self._weeks) > self.capacity:
+            self._weeks.popitem(last=False)
+        return week
+
+    def get_day(self, day):
+        """day 1日分の Segment のリストを返します。"""
+        monday = week_start(day)
+        return self.get_week(monday)[(day - monday).days]
+
+    def clear(self):
+        self._weeks.clear()
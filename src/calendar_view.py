@@ -0,0 +1,225 @@
+# src/calendar_view.py
+"""日・週・月のカレンダー表示ウィジェット
+
+表示中の期間の予定だけを WeekCache から取得し、QPainter で直接描画します。
+ウィジェットを予定ごとに作らないため、予定が数千件あっても期間の切り替えが軽く済みます。
+"""
+
+from datetime import date, timedelta
+
+from PySide6.QtCore import QRectF, QTimer, Qt, Signal
+from PySide6.QtGui import QColor, QPainter, QPen
+from PySide6.QtWidgets import QWidget
+
+from src.calendar_layout import MINUTES_PER_DAY, WeekCache, week_start
+from src.metrics import timed
+
+WEEKDAY_NAMES = ["月", "火", "水", "木", "金", "土", "日"]
+CATEGORY_COLORS = {
+    "プライベート": QColor("#28a745"),
+    "仕事": QColor("#007bff"),
+    "学習": QColor("#fd7e14"),
+    "その他": QColor("#6c757d"),
+}
+DEFAULT_COLOR = QColor("#17a2b8")
+INACTIVE_COLOR = QColor("#adb5bd")  # 完了済みの予定の色
+
+TIME_GUTTER_WIDTH = 44  # 時刻表示欄の幅
+HEADER_HEIGHT = 22  # 日付表示欄の高さ
+MIN_EVENT_HEIGHT = 14  # 短い予定でもタイトルが読めるようにする最小の高さ
+MONTH_WEEKS = 6
+
+
+class CalendarView(QWidget):
+    """予定を日・週・月のカレンダー形式で描画するウィジェット"""
+    scheduleClicked = Signal(object)  # クリックされた予定の行
+    rangeChanged = Signal(str)  # 表示期間が変わったときの見出し
+
+    MODES = ("day", "week", "month")
+
+    def __init__(self, data_manager, parent=None):
+        super().__init__(parent)
+        self.cache = WeekCache(data_manager)
+        self.mode = "week"
+        self.anchor = date.today()  # 表示期間を決める基準日
+        self._hit_rects = []  # 直前の描画での (予定の矩形, 予定の行)
+        self.setFocusPolicy(Qt.StrongFocus)
+        self.setMinimumHeight(300)
+
+    def set_mode(self, mode):
+        if mode not in self.MODES:
+            raise ValueError(f"不明な表示モードです: {mode}")
+        self.mode = mode
+        self._range_changed()
+
+    def go_today(self):
+        self.anchor = date.today()
+        self._range_changed()
+
+    def go_to(self, day):
+        self.anchor = day
+        self._range_changed()
+
+    def step(self, count):
+        """表示期間を count 期間分（日・週・月）前後に移動します。"""
+        if self.mode == "day":
+            self.anchor += timedelta(days=count)
+        elif self.mode == "week":
+            self.anchor += timedelta(weeks=count)
+        else:
+            month_index = self.anchor.year * 12 + self.anchor.month - 1 + count
+            self.anchor = date(month_index // 12, month_index % 12 + 1, 1)
+        self._range_changed()
+
+    def visible_range(self):
+        """表示する最初の日と日数を返します。"""
+        if self.mode == "day":
+            return self.anchor, 1
+        if self.mode == "week":
+            return week_start(self.anchor), 7
+        return week_start(self.anchor.replace(day=1)), MONTH_WEEKS * 7
+
+    def range_title(self):
+        first, days = self.visible_range()
+        if self.mode == "day":
+            return f"{first:%Y/%m/%d}（{WEEKDAY_NAMES[first.weekday()]}）"
+        if self.mode == "week":
+            last = first + timedelta(days=days - 1)
+            return f"{first:%Y/%m/%d} - {last:%m/%d}"
+        return f"{self.anchor.year}年{self.anchor.month}月"
+
+    def _range_changed(self):
+        self.rangeChanged.emit(self.range_title())
+        self.update()
+        # 前後の期間を描画後に読み込んでおき、次のスクロールではキャッシュから描画できるようにする
+        QTimer.singleShot(0, self._prefetch_adjacent)
+
+    def _prefetch_adjacent(self):
+        first, days = self.visible_range()
+        for day in (first - timedelta(days=days), first + timedelta(days=days * 2 - 1)):
+            self.cache.get_week(week_start(day))
+
+    def refresh(self):
+        """DBの変更を反映して描画し直します（DBが変わっていればレイアウトは描画時に作り直されます）。"""
+        self.update()
+
+    @timed("gui.calendar_paint")
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.fillRect(self.rect(), Qt.white)
+        self._hit_rects = []
+        if self.mode == "month":
+            self._paint_month(painter)
+        else:
+            self._paint_timeline(painter)
+        painter.end()
+
+    def _paint_timeline(self, painter):
+        """日・週表示: 縦軸を時刻にして、重なる予定は列に分けて並べる"""
+        first, days = self.visible_range()
+        column_width = (self.width() - TIME_GUTTER_WIDTH) / days
+        minute_height = (self.height() - HEADER_HEIGHT) / MINUTES_PER_DAY
+        today = date.today()
+
+        # 時刻の目盛り
+        painter.setPen(QPen(QColor("#dee2e6")))
+        for hour in range(24):
+            y = HEADER_HEIGHT + hour * 60 * minute_height
+            painter.drawLine(TIME_GUTTER_WIDTH, int(y), self.width(), int(y))
+            if minute_height * 60 >= 12 or hour % 3 == 0:
+                painter.setPen(QColor("#6c757d"))
+                painter.drawText(QRectF(0, y, TIME_GUTTER_WIDTH - 4, 14), Qt.AlignRight | Qt.AlignTop, f"{hour}:00")
+                painter.setPen(QPen(QColor("#dee2e6")))
+
+        for i in range(days):
+            day = first + timedelta(days=i)
+            x = TIME_GUTTER_WIDTH + i * column_width
+            painter.setPen(QPen(QColor("#dee2e6")))
+            painter.drawLine(int(x), 0, int(x), self.height())
+            painter.setPen(QColor("#dc3545") if day == today else QColor("#333333"))
+            painter.drawText(QRectF(x, 0, column_width, HEADER_HEIGHT), Qt.AlignCenter,
+                             f"{day.month}/{day.day}（{WEEKDAY_NAMES[day.weekday()]}）")
+
+            for segment in self.cache.get_day(day):
+                width = column_width / segment.columns
+                rect = QRectF(
+                    x + segment.column * width + 1,
+                    HEADER_HEIGHT + segment.start_minute * minute_height,
+                    width - 2,
+                    max((segment.end_minute - segment.start_minute) * minute_height, MIN_EVENT_HEIGHT),
+                )
+                self._paint_event(painter, rect, segment.schedule)
+
+    def _paint_month(self, painter):
+        """月表示: 6週分のマス目に、1日に収まる件数だけ予定のタイトルを並べる"""
+        first, _ = self.visible_range()
+        cell_width = self.width() / 7
+        cell_height = (self.height() - HEADER_HEIGHT) / MONTH_WEEKS
+        line_height = MIN_EVENT_HEIGHT + 2
+        today = date.today()
+
+        painter.setPen(QColor("#333333"))
+        for weekday, name in enumerate(WEEKDAY_NAMES):
+            painter.drawText(QRectF(weekday * cell_width, 0, cell_width, HEADER_HEIGHT), Qt.AlignCenter, name)
+
+        for week in range(MONTH_WEEKS):
+            for weekday in range(7):
+                day = first + timedelta(days=week * 7 + weekday)
+                x = weekday * cell_width
+                y = HEADER_HEIGHT + week * cell_height
+                painter.setPen(QPen(QColor("#dee2e6")))
+                painter.drawRect(QRectF(x, y, cell_width, cell_height))
+                if day == today:
+                    painter.setPen(QColor("#dc3545"))
+                elif day.month != self.anchor.month:
+                    painter.setPen(QColor("#adb5bd"))
+                else:
+                    painter.setPen(QColor("#333333"))
+                painter.drawText(QRectF(x + 3, y + 1, cell_width - 6, line_height), Qt.AlignLeft | Qt.AlignTop, str(day.day))
+
+                segments = self.cache.get_day(day)
+                max_lines = max(0, int((cell_height - line_height) // line_height))
+                shown = segments if len(segments) <= max_lines else segments[:max(0, max_lines - 1)]
+                for line, segment in enumerate(shown):
+                    rect = QRectF(x + 2, y + line_height * (line + 1), cell_width - 4, MIN_EVENT_HEIGHT)
+                    self._paint_event(painter, rect, segment.schedule)
+                if len(shown) < len(segments):
+                    painter.setPen(QColor("#6c757d"))
+                    painter.drawText(
+                        QRectF(x + 3, y + line_height * (len(shown) + 1), cell_width - 6, line_height),
+                        Qt.AlignLeft | Qt.AlignTop, f"他 {len(segments) - len(shown)} 件",
+                    )
+
+    def _paint_event(self, painter, rect, schedule):
+        is_completed = len(schedule) > 10 and schedule[10] == 1
+        color = INACTIVE_COLOR if is_completed else CATEGORY_COLORS.get(schedule[4], DEFAULT_COLOR)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(color)
+        painter.drawRoundedRect(rect, 3, 3)
+        painter.setPen(Qt.white)
+        title = f"{schedule[1]} 🔒" if len(schedule) > 8 and schedule[8] == 1 else schedule[1]
+        painter.drawText(rect.adjusted(3, 0, -2, 0), Qt.AlignLeft | Qt.AlignTop | Qt.TextWordWrap, title)
+        self._hit_rects.append((rect, schedule))
+
+    def mousePressEvent(self, event):
+        position = event.position()
+        # 後から描いた（手前にある）予定を優先する
+        for rect, schedule in reversed(self._hit_rects):
+            if rect.contains(position):
+                self.scheduleClicked.emit(schedule)
+                return
+        super().mousePressEvent(event)
+
+    def wheelEvent(self, event):
+        delta = event.angleDelta().y()
+        if delta:
+            self.step(-1 if delta > 0 else 1)
+
+    def keyPressEvent(self, event):
+        if event.key() in (Qt.Key_Left, Qt.Key_PageUp):
+            self.step(-1)
+        elif event.key() in (Qt.Key_Right, Qt.Key_PageDown):
+            self.step(1)
+        else:
+            super().keyPressEvent(event)
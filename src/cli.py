@@ -0,0 +1,246 @@
+# src/cli.py
+"""データベースの保守用コマンド
+
+使い方（リポジトリのルートで実行）:
+    python -m src.cli archive --days 365
+    python -m src.cli vacuum
+    python -m src.cli check --fix
+    python -m src.cli autoschedule requests.json --apply
+    python -m src.cli summary --from 2025-07-01 --to 2025-08-01
+    python -m src.cli backup --compress
+    python -m src.cli restore --at "2025-07-01 12:00"
+    python -m src.cli config
+    python -m src.cli calendar add team
+    python -m src.cli --calendar team vacuum
+    python -m src.cli agenda --from 2025-07-01 --to 2025-07-08
+"""
+
+import argparse
+import sys
+from datetime import datetime
+
+from src.auto_scheduler import AutoScheduler, load_requests
+from src.backup import create_backup, find_backup, list_backups, restore_backup, throughput_mb_s
+from src.config import FIELDS, ConfigError, get_config, get_config_store
+from src.data_manager import MAIN_CALENDAR, DataManager
+
+
+def _cmd_archive(data_manager, args):
+    moved = data_manager.archive_past_schedules(args.days, args.batch)
+    print(f"{moved}件の予定をアーカイブに移しました。")
+    return 0
+
+
+def _cmd_vacuum(data_manager, args):
+    sizes = data_manager.compact_database(args.pages)
+    if sizes is None:
+        print("領域の解放に失敗しました。", file=sys.stderr)
+        return 1
+    print(f"データベースのサイズ: {sizes[0]} -> {sizes[1]} バイト")
+    return 0
+
+
+def _cmd_check(data_manager, args):
+    result = data_manager.check_integrity(args.full)
+    if result is None:
+        print("整合性チェックに失敗しました。", file=sys.stderr)
+        return 1
+    print(f"整合性チェック: {', '.join(result['integrity'])}")
+    print(f"外部キー制約の違反: {result['foreign_key_violations']}件")
+    print(f"予定が削除済みのタスク: {result['orphan_tasks']}件")
+    if not args.fix:
+        return 0 if result["integrity"] == ["ok"] else 1
+
+    removed = data_manager.remove_orphan_tasks(args.batch)
+    print(f"{removed}件の孤立したタスクを削除しました。")
+    sizes = data_manager.compact_database()
+    if sizes is not None:
+        print(f"データベースのサイズ: {sizes[0]} -> {sizes[1]} バイト")
+    return 0 if result["integrity"] == ["ok"] else 1
+
+
+def _cmd_autoschedule(data_manager, args):
+    scheduler = AutoScheduler(data_manager, args.day_start, args.day_end, args.granularity)
+    plan = scheduler.plan(load_requests(args.requests))
+    for placement in plan.placements:
+        print(f"{placement.start:%Y/%m/%d %H:%M} - {placement.end:%H:%M}  {placement.request.title}")
+    for request in plan.unplaced:
+        print(f"配置できませんでした: {request.title}", file=sys.stderr)
+    if not args.apply:
+        print(f"{len(plan.placements)}件を配置できます（--apply で登録します）。")
+        return 0 if not plan.unplaced else 1
+
+    schedule_ids = scheduler.commit(plan)
+    if schedule_ids is None:
+        print("他の予定と重なったため登録しませんでした。もう一度実行してください。", file=sys.stderr)
+        return 1
+    print(f"{len(schedule_ids)}件の予定を登録しました。")
+    return 0 if not plan.unplaced else 1
+
+
+def _cmd_summary(data_manager, args):
+    range_start = f"{args.range_start} 00:00:00" if args.range_start else None
+    range_end = f"{args.range_end} 00:00:00" if args.range_end else None
+    rows = data_manager.get_category_summary(range_start, range_end)
+    if not rows:
+        print("該当する予定はありません。")
+        return 0
+    for category, count, minutes, completed in rows:
+        print(f"{category}: {count}件  {minutes // 60}時間{minutes % 60:02d}分  完了 {completed}件")
+    return 0
+
+
+def _cmd_backup(data_manager, args):
+    result = create_backup(data_manager.db_path, compress=args.compress, keep=args.keep, pages=args.pages)
+    if result is None:
+        print("バックアップに失敗しました。", file=sys.stderr)
+        return 1
+    print(f"バックアップを作成しました: {result.path}")
+    print(f"{result.pages}ページ / {result.db_bytes} バイト -> {result.size} バイト")
+    print(f"コピー {result.copy_seconds:.2f}秒（{throughput_mb_s(result):.1f} MB/秒）、"
+          f"全体 {result.seconds:.2f}秒（{throughput_mb_s(result, include_compression=True):.1f} MB/秒）")
+    return 0
+
+
+def _cmd_restore(data_manager, args):
+    if args.list:
+        for created_at, path in list_backups(data_manager.db_path):
+            print(f"{created_at:%Y/%m/%d %H:%M:%S}  {path}")
+        return 0
+    path = args.backup or find_backup(data_manager.db_path, datetime.fromisoformat(args.at) if args.at else None)
+    if path is None:
+        print("復元できるバックアップがありません。", file=sys.stderr)
+        return 1
+    if not restore_backup(data_manager, path, safety_backup=not args.no_safety_backup, pages=args.pages):
+        print("復元に失敗しました。", file=sys.stderr)
+        return 1
+    print(f"バックアップから復元しました: {path}")
+    return 0
+
+
+def _cmd_config(data_manager, args):
+    print(f"設定ファイル: {get_config_store().path}")
+    print(f"DB: {data_manager.db_path}")
+    for name, value in data_manager.config._asdict().items():
+        note = "" if FIELDS[name][3] else "  （変更は再起動後に反映）"
+        print(f"{name} = {value!r}{note}")
+    return 0
+
+
+def _cmd_calendar(data_manager, args):
+    if args.action == "list":
+        print(f"{MAIN_CALENDAR}  （本体のDB）  {data_manager.db_path}")
+        for _, name, path, enabled in data_manager.get_calendars():
+            print(f"{name}  {'有効' if enabled else '無効'}  {path}")
+        return 0
+    if not args.name:
+        print("カレンダー名を指定してください。", file=sys.stderr)
+        return 1
+    if args.action == "add":
+        ok = data_manager.add_calendar(args.name) is not None
+    else:
+        ok = data_manager.set_calendar_enabled(args.name, args.action == "enable")
+    if not ok:
+        print(f"カレンダー'{args.name}'を{args.action}できませんでした。", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _cmd_agenda(data_manager, args):
+    range_start = f"{args.range_start} 00:00:00"
+    range_end = f"{args.range_end} 00:00:00"
+    rows = data_manager.get_federated_schedules_in_range(range_start, range_end, include_main=not args.no_main)
+    if not rows:
+        print("該当する予定はありません。")
+        return 0
+    for calendar_name, schedule in rows:
+        print(f"{schedule[2][:16]} - {schedule[3][:16]}  [{calendar_name}] {schedule[1]}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MyScheduleManager の保守コマンド")
+    parser.add_argument("--db", help="データベースファイル（省略時は設定の db_path）")
+    parser.add_argument("--calendar", help="保守するカレンダー（archive・vacuum・check・backup などをそのカレンダーのDBに対して実行する）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    archive_parser = subparsers.add_parser("archive", help="古い予定をアーカイブDBに移す")
+    archive_parser.add_argument("--days", type=int, default=365, help="終了から何日経った予定を移すか")
+    archive_parser.add_argument("--batch", type=int, default=500, help="1トランザクションで移す件数")
+    archive_parser.set_defaults(func=_cmd_archive)
+
+    vacuum_parser = subparsers.add_parser("vacuum", help="削除で空いた領域をファイルから解放する")
+    vacuum_parser.add_argument("--pages", type=int, help="解放するページ数（省略時はすべて）")
+    vacuum_parser.set_defaults(func=_cmd_vacuum)
+
+    check_parser = subparsers.add_parser("check", help="整合性と孤立したタスクを確認する")
+    check_parser.add_argument("--full", action="store_true", help="quick_check ではなく integrity_check を実行する")
+    check_parser.add_argument("--fix", action="store_true", help="孤立したタスクを削除して領域を解放する")
+    check_parser.add_argument("--batch", type=int, default=1000, help="1トランザクションで削除する件数")
+    check_parser.set_defaults(func=_cmd_check)
+
+    autoschedule_parser = subparsers.add_parser("autoschedule", help="予定の要求を空き時間に自動で配置する")
+    autoschedule_parser.add_argument("requests", help="要求のJSONファイル（title, duration, earliest, latest などの配列）")
+    autoschedule_parser.add_argument("--day-start", type=int, default=9, help="予定を置き始める時刻（時）")
+    autoschedule_parser.add_argument("--day-end", type=int, default=18, help="予定を置き終える時刻（時）")
+    autoschedule_parser.add_argument("--granularity", type=int, default=15, help="開始時刻を揃える単位（分）")
+    autoschedule_parser.add_argument("--apply", action="store_true", help="計画を1つのトランザクションで登録する")
+    autoschedule_parser.set_defaults(func=_cmd_autoschedule)
+
+    summary_parser = subparsers.add_parser("summary", help="区分ごとの予定の件数と合計時間を表示する")
+    summary_parser.add_argument("--from", dest="range_start", help="集計を始める日（YYYY-MM-DD、この日を含む）")
+    summary_parser.add_argument("--to", dest="range_end", help="集計を終える日（YYYY-MM-DD、この日を含まない）")
+    summary_parser.set_defaults(func=_cmd_summary)
+
+    backup_parser = subparsers.add_parser("backup", help="アプリを起動したままDBをバックアップする")
+    backup_parser.add_argument("--compress", action="store_true", help="gzip で圧縮して保存する")
+    backup_parser.add_argument("--keep", type=int, default=7, help="残すバックアップの数")
+    backup_parser.add_argument("--pages", type=int, default=1024, help="1ステップでコピーするページ数")
+    backup_parser.set_defaults(func=_cmd_backup)
+
+    restore_parser = subparsers.add_parser("restore", help="バックアップからDBを復元する")
+    restore_parser.add_argument("backup", nargs="?", help="復元するバックアップファイル（省略時は最新）")
+    restore_parser.add_argument("--at", help="この日時（YYYY-MM-DD HH:MM）以前の最新のバックアップから復元する")
+    restore_parser.add_argument("--list", action="store_true", help="バックアップの一覧を表示する")
+    restore_parser.add_argument("--no-safety-backup", action="store_true", help="復元前に現在のDBをバックアップしない")
+    restore_parser.add_argument("--pages", type=int, default=1024, help="1ステップでコピーするページ数")
+    restore_parser.set_defaults(func=_cmd_restore)
+
+    config_parser = subparsers.add_parser("config", help="設定ファイルと環境変数を反映した現在の設定を表示する")
+    config_parser.set_defaults(func=_cmd_config)
+
+    calendar_parser = subparsers.add_parser("calendar", help="予定を別のDBファイルに分けるカレンダーを管理する")
+    calendar_parser.add_argument("action", choices=["list", "add", "enable", "disable"])
+    calendar_parser.add_argument("name", nargs="?", help="カレンダー名（英数字・-・_）")
+    calendar_parser.set_defaults(func=_cmd_calendar, federated=True)
+
+    agenda_parser = subparsers.add_parser("agenda", help="有効なカレンダーすべての予定を開始日時順に表示する")
+    agenda_parser.add_argument("--from", dest="range_start", required=True, help="期間の最初の日（YYYY-MM-DD、この日を含む）")
+    agenda_parser.add_argument("--to", dest="range_end", required=True, help="期間の最後の日（YYYY-MM-DD、この日を含まない）")
+    agenda_parser.add_argument("--no-main", action="store_true", help="本体のDBの予定を含めない")
+    agenda_parser.set_defaults(func=_cmd_agenda, federated=True)
+    args = parser.parse_args(argv)
+
+    from src.logging_setup import setup_logging
+    setup_logging()
+
+    try:
+        get_config()
+    except ConfigError as e:
+        print(e, file=sys.stderr)
+        return 2
+    data_manager = DataManager(args.db)
+    try:
+        target = data_manager
+        if args.calendar and not getattr(args, "federated", False):
+            target = data_manager.calendar(args.calendar)
+            if target is None:
+                print(f"カレンダー'{args.calendar}'はありません。", file=sys.stderr)
+                return 1
+        return args.func(target, args)
+    finally:
+        data_manager.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
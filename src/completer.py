@@ -0,0 +1,97 @@
+# src/completer.py
+"""入力欄に AutocompleteIndex の候補を表示する QCompleter
+
+候補の絞り込みと並べ替えはインデックス側で済ませ、QCompleter には上位の数件だけを渡して
+そのまま表示させます（UnfilteredPopupCompletion）。
+"""
+
+from PySide6.QtCore import QStringListModel, Qt
+from PySide6.QtGui import QTextCursor
+from PySide6.QtWidgets import QCompleter, QTextEdit
+
+LINE_MARKERS = "□✅- "  # タスクの行頭に付けられる記号（補完では無視する）
+
+
+class IndexCompleter(QCompleter):
+    """AutocompleteIndex の1つのフィールドの候補を表示する QCompleter"""
+    def __init__(self, autocomplete_index, field, parent=None):
+        super().__init__(parent)
+        self.autocomplete_index = autocomplete_index
+        self.field = field
+        self._model = QStringListModel(self)
+        self.setModel(self._model)
+        self.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.setMaxVisibleItems(autocomplete_index.limit)
+
+    def update_candidates(self, prefix):
+        """prefix の候補で一覧を更新し、候補の件数を返します。"""
+        candidates = self.autocomplete_index[self.field].complete(prefix)
+        if candidates == [prefix.strip()]:
+            candidates = []  # 入力済みの文字列そのものしかない場合は表示しない
+        self._model.setStringList(candidates)
+        return len(candidates)
+
+
+def attach_line_edit_completer(line_edit, autocomplete_index, field):
+    """QLineEdit に入力補完を設定します。"""
+    completer = IndexCompleter(autocomplete_index, field, line_edit)
+    line_edit.setCompleter(completer)
+    # QLineEdit は textEdited を送った後で complete() を呼ぶので、ここでは候補の更新だけ行う
+    line_edit.textEdited.connect(completer.update_candidates)
+    return completer
+
+
+class CompletingTextEdit(QTextEdit):
+    """カーソルのある行を入力補完する QTextEdit（1行1件のタスク入力欄用）"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._completer = None
+
+    def set_completer(self, completer):
+        self._completer = completer
+        completer.setWidget(self)
+        completer.activated[str].connect(self._insert_completion)
+
+    def _current_line_prefix(self):
+        cursor = self.textCursor()
+        return cursor.block().text()[:cursor.positionInBlock()].lstrip(LINE_MARKERS)
+
+    def _insert_completion(self, text):
+        """カーソルのある行を、行頭の記号を残して選ばれた候補に置き換えます。"""
+        cursor = self.textCursor()
+        line = cursor.block().text()
+        marker = line[:len(line) - len(line.lstrip(LINE_MARKERS))]
+        cursor.movePosition(QTextCursor.StartOfBlock)
+        cursor.movePosition(QTextCursor.EndOfBlock, QTextCursor.KeepAnchor)
+        cursor.insertText(marker + text)
+        self.setTextCursor(cursor)
+
+    def _update_popup(self):
+        popup = self._completer.popup()
+        prefix = self._current_line_prefix()
+        if not prefix.strip() or not self._completer.update_candidates(prefix):
+            popup.hide()
+            return
+        rect = self.cursorRect()
+        rect.setWidth(popup.sizeHintForColumn(0) + popup.verticalScrollBar().sizeHint().width())
+        self._completer.complete(rect)
+
+    def keyPressEvent(self, event):
+        if self._completer is None:
+            super().keyPressEvent(event)
+            return
+        if self._completer.popup().isVisible() and event.key() in (
+            Qt.Key_Return, Qt.Key_Enter, Qt.Key_Escape, Qt.Key_Tab, Qt.Key_Backtab
+        ):
+            # 候補の確定・取り消しは QCompleter に任せる
+            event.ignore()
+            return
+        super().keyPressEvent(event)
+        if event.text() or event.key() in (Qt.Key_Backspace, Qt.Key_Delete):
+            self._update_popup()
+
+    def inputMethodEvent(self, event):
+        super().inputMethodEvent(event)
+        # IMEで確定した文字列（日本語入力）でも候補を更新する
+        if self._completer is not None and event.commitString():
+            self._update_popup()
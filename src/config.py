@@ -0,0 +1,209 @@
+# src/config.py
+"""アプリの設定（Qtに依存しない）
+
+設定は JSON ファイル（既定は data/config.json、環境変数 MSM_CONFIG で変更可）から読み込み、
+環境変数 MSM_<項目名の大文字>（例: MSM_CACHE_SIZE_KIB）で項目ごとに上書きできます。
+読み込んだ値は FIELDS の型と範囲で検証し、不正な値があれば ConfigError にまとめて報告します。
+ConfigStore はファイルの更新を検知して読み直し、変わった項目を登録された関数に通知します（ホットリロード）。
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+ENV_PREFIX = "MSM_"
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "config.json")
+
+JOURNAL_MODES = ("WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY")
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+def _choice(choices):
+    def check(value):
+        value = value.upper()
+        if value not in choices:
+            raise ValueError(f"{'/'.join(choices)} のいずれかを指定してください")
+        return value
+    return check
+
+
+def _at_least(minimum, maximum=None):
+    def check(value):
+        # NaN はどの比較も偽になり範囲の確認を通ってしまうため、先に除く
+        if isinstance(value, float) and not math.isfinite(value):
+            raise ValueError("有限の数値を指定してください")
+        if value < minimum or (maximum is not None and value > maximum):
+            raise ValueError(f"{minimum}以上{'' if maximum is None else f'{maximum}以下'}の値を指定してください")
+        return value
+    return check
+
+
+def _page_size(value):
+    if value < 512 or value > 65536 or value & (value - 1):
+        raise ValueError("512〜65536 の2のべき乗を指定してください")
+    return value
+
+
+# 項目名: (型, 既定値, 検証する関数（正規化した値を返す）, 実行中に変更を反映できるか)
+FIELDS = {
+    # DBファイル（相対パスなら data ディレクトリからのパス。空なら schedule.db）
+    "db_path": (str, "", None, False),
+    "journal_mode": (str, "WAL", _choice(JOURNAL_MODES), False),
+    "synchronous": (str, "NORMAL", _choice(SYNCHRONOUS_MODES), True),
+    # 接続ごとのページキャッシュ（KiB。SQLite の既定と同じ 2000）
+    "cache_size_kib": (int, 2000, _at_least(0), True),
+    # 新しく作るDBのページサイズ（既存のDBには VACUUM するまで反映されず、WALモードのDBでは変更できない）
+    "page_size": (int, 4096, _page_size, False),
+    "busy_timeout_ms": (int, 5000, _at_least(0), True),
+    # 通知をチェックする間隔
+    "notification_interval_ms": (int, 60000, _at_least(1000), True),
+    # 通知のために読み込む予定の範囲（開始が何日先までの予定か。0 なら制限なし。最も長い通知設定より長くする）
+    "notification_horizon_days": (int, 0, _at_least(0), True),
+    # 開始後に「スケジュールの開始」のチェックを促す通知の間隔
+    "reminder_repeat_minutes": (int, 5, _at_least(1), True),
+    "sound_volume": (float, 0.5, _at_least(0.0, 1.0), True),
+    # 新しい予定の開始から終了までの既定の長さ
+    "default_duration_minutes": (int, 60, _at_least(1), True),
+    # 予定の詳細内容を zlib で圧縮して保存する大きさ（UTF-8 のバイト数。0 なら圧縮しない）
+    "description_compress_bytes": (int, 1024, _at_least(0), True),
+    # GUIのバックグラウンド処理（候補の読み込み・バックアップ・添付など）を同時に実行するスレッド数
+    "background_workers": (int, 2, _at_least(1, 16), False),
+}
+
+Config = namedtuple("Config", list(FIELDS))
+DEFAULT_CONFIG = Config(**{name: spec[1] for name, spec in FIELDS.items()})
+
+
+class ConfigError(ValueError):
+    """設定ファイルや環境変数に不正な値がある場合の例外（メッセージに全ての問題を含む）"""
+
+
+def _convert(name, value, from_env):
+    field_type, _, check, _ = FIELDS[name]
+    if from_env:
+        value = value.strip()
+    elif field_type is float and isinstance(value, int) and not isinstance(value, bool):
+        value = float(value)
+    type_error = ValueError(f"{field_type.__name__} 型の値を指定してください")
+    if from_env and field_type is not str:
+        try:
+            value = field_type(value)
+        except ValueError:
+            raise type_error from None
+    elif not isinstance(value, field_type) or isinstance(value, bool):
+        raise type_error
+    return check(value) if check else value
+
+
+def load_config(path=None, environ=None):
+    """設定ファイルと環境変数から Config を作成します。不正な値があれば ConfigError を送出します。
+
+    ファイルがなければ既定値を使います。path を省略すると環境変数 MSM_CONFIG か DEFAULT_CONFIG_PATH を読みます。
+    """
+    environ = os.environ if environ is None else environ
+    path = path or environ.get(ENV_PREFIX + "CONFIG") or DEFAULT_CONFIG_PATH
+    values = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            values = json.load(f)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        raise ConfigError(f"設定ファイルを読み込めません: {path} ({e})")
+    if not isinstance(values, dict):
+        raise ConfigError(f"設定ファイルはオブジェクト形式で記述してください: {path}")
+
+    errors = [f"{path}: 不明な項目 '{name}'" for name in values if name not in FIELDS]
+    config = {}
+    for name, (_, default, _, _) in FIELDS.items():
+        env_name = ENV_PREFIX + name.upper()
+        source, value, from_env = path, values.get(name, default), False
+        if env_name in environ:
+            source, value, from_env = env_name, environ[env_name], True
+        try:
+            config[name] = _convert(name, value, from_env)
+        except ValueError as e:
+            errors.append(f"{source}: {name} = {value!r}: {e}")
+    if errors:
+        raise ConfigError("設定に不正な値があります:\n  " + "\n  ".join(errors))
+    return Config(**config)
+
+
+def changed_fields(old, new):
+    """old と new で値が異なる項目名のリストを返します。"""
+    return [name for name in FIELDS if getattr(old, name) != getattr(new, name)]
+
+
+class ConfigStore:
+    """現在の設定を保持し、設定ファイルが更新されたら読み直して登録された関数に通知するクラス"""
+    def __init__(self, path=None, environ=None):
+        self.environ = os.environ if environ is None else environ
+        self.path = path or self.environ.get(ENV_PREFIX + "CONFIG") or DEFAULT_CONFIG_PATH
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._mtime = self._file_mtime()
+        self.config = load_config(self.path, self.environ)
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def subscribe(self, listener):
+        """設定が変わったときに listener(config, 変わった項目名のリスト) を呼び出すようにします。"""
+        self._listeners.append(listener)
+
+    def reload_if_changed(self):
+        """設定ファイルの更新日時が変わっていれば読み直します。変わった項目名のリストを返します。"""
+        mtime = self._file_mtime()
+        if mtime == self._mtime:
+            return []
+        self._mtime = mtime
+        return self.reload()
+
+    def reload(self):
+        """設定を読み直し、変わった項目名のリストを返します。
+
+        不正な値がある場合はエラーを記録して現在の設定のまま使い続けます（空のリストを返す）。
+        """
+        try:
+            new_config = load_config(self.path, self.environ)
+        except ConfigError as e:
+            logger.error("設定を読み直せなかったため、現在の設定を使い続けます: %s", e)
+            return []
+        with self._lock:
+            changed = changed_fields(self.config, new_config)
+            self.config = new_config
+        if not changed:
+            return []
+        logger.info("設定を読み直しました（変更: %s）。", ", ".join(changed))
+        restart_required = [name for name in changed if not FIELDS[name][3]]
+        if restart_required:
+            logger.warning("次の設定は再起動後に反映されます: %s", ", ".join(restart_required))
+        for listener in list(self._listeners):
+            listener(new_config, changed)
+        return changed
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_config_store():
+    """プロセス全体で共有する ConfigStore を返します（初回の呼び出しで読み込み、不正な値があれば ConfigError）。"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConfigStore()
+        return _store
+
+
+def get_config():
+    """プロセス全体で共有する現在の設定を返します。"""
+    return get_config_store().config
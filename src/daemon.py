@@ -0,0 +1,405 @@
+# src/daemon.py
+"""通知デーモン（GUIを閉じていても通知を出し続ける常駐プロセス）
+
+DataManager と NotificationEngine を1つのプロセスで動かし、Unixドメインソケット上で
+1行1メッセージの JSON-RPC 2.0 API を提供します。予定の全件チェックはデーモンだけが行い、
+GUIなどのクライアントは subscribe して通知イベントを受け取るだけになります。
+DataManager と NotificationEngine の呼び出しは1つのワーカースレッドで順に実行し、
+遅いクエリや書き込みロックの待ちでイベントループ（他のクライアントへの応答・配信）を止めません。
+
+使い方（リポジトリのルートで実行）:
+    python -m src.daemon serve
+    python -m src.daemon call list_schedules
+    python -m src.daemon call add_schedule '{"title": "会議", "start": "2030-01-01 10:00:00", "end": "2030-01-01 11:00:00"}'
+    python -m src.daemon events
+"""
+
+import argparse
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from src.config import ConfigError, get_config_store
+from src.data_manager import DataManager, schedule_to_dict
+from src.notification_engine import (
+    START_TASK, CompositeSink, LogSink, NotificationEngine, notification_to_dict,
+)
+
+logger = logging.getLogger(__name__)
+
+END_TASK = "スケジュールの終了"
+DEFAULT_SOCKET_PATH = os.environ.get(
+    "MSM_DAEMON_SOCKET",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "notifier.sock"),
+)
+
+# JSON-RPC 2.0 のエラーコード
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+# 購読中のクライアントごとの送信待ちデータの上限（イベントを読まないクライアントで際限なくメモリを使わない）
+MAX_SUBSCRIBER_BUFFER = 1024 * 1024
+
+
+class RpcError(Exception):
+    """クライアントに返すJSON-RPCのエラー"""
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class _BroadcastSink:
+    """通知を購読中のクライアントへイベントとして配信する sink"""
+    def __init__(self, daemon):
+        self.daemon = daemon
+
+    def notify(self, notification):
+        self.daemon.broadcast("notification", notification_to_dict(notification))
+
+
+class NotificationDaemon:
+    """通知チェックとローカルIPC APIを提供するデーモン"""
+    def __init__(self, data_manager, socket_path=DEFAULT_SOCKET_PATH, interval=None, clock=datetime.now,
+                 config_store=None):
+        config = data_manager.config
+        self.data_manager = data_manager
+        self.socket_path = socket_path
+        # interval（秒）を省略した場合は設定の notification_interval_ms を使う（設定の変更にも追従する）
+        self._interval_fixed = interval is not None
+        self.interval = interval if interval is not None else config.notification_interval_ms / 1000
+        self.config_store = config_store  # 指定した場合は通知チェックのたびに設定ファイルの更新を確認する
+        self.subscribers = set()  # イベントを購読中のクライアント（StreamWriter）
+        # DBと通知エンジンを使う処理を実行するスレッド（1つにして呼び出しの順序を保つ）
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="daemon-db")
+        self._loop = None  # serve() を実行中のイベントループ（broadcast を他のスレッドから呼ぶために使う）
+        self.engine = NotificationEngine(
+            data_manager, CompositeSink([LogSink(), _BroadcastSink(self)]), clock=clock,
+            reminder_minutes=config.reminder_repeat_minutes, horizon_days=config.notification_horizon_days,
+        )
+        if config_store is not None:
+            config_store.subscribe(data_manager.apply_config)
+            config_store.subscribe(self.apply_config)
+        self._methods = {
+            "ping": self.ping,
+            "add_schedule": self.add_schedule,
+            "list_schedules": self.list_schedules,
+            "get_tasks": self.get_tasks,
+            "complete_task": self.complete_task,
+            "complete_schedule": self.complete_schedule,
+            "update_task_check_status": self.update_task_check_status,
+        }
+
+    async def serve(self):
+        """ソケットで待ち受け、interval 秒ごとに通知をチェックします。"""
+        os.makedirs(os.path.dirname(self.socket_path), exist_ok=True)
+        if os.path.exists(self.socket_path):
+            # 前回異常終了したときのソケットファイルが残っていれば削除する
+            os.unlink(self.socket_path)
+
+        server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        os.chmod(self.socket_path, 0o600)  # 同じユーザーのプロセスからのみ接続可能にする
+        logger.info("通知デーモンを起動しました: %s", self.socket_path)
+
+        # SIGTERM/SIGINT で止められたときもソケットファイルを片付けてから終了する
+        loop = self._loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, asyncio.current_task().cancel)
+
+        ticker = asyncio.create_task(self._tick_loop())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            ticker.cancel()
+            # 実行中のDB操作が終わるのを待つ（この後で DataManager が閉じられる）
+            self._executor.shutdown(wait=True)
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            logger.info("通知デーモンを停止しました。")
+
+    def apply_config(self, config, changed=None):
+        """設定の通知の間隔・読み込む範囲を反映します。"""
+        self.engine.apply_config(config)
+        if not self._interval_fixed:
+            self.interval = config.notification_interval_ms / 1000
+
+    async def _run(self, func, *args, **kwargs):
+        """func をDB用のスレッドで実行し、結果を返します（イベントループは待っている間も他の処理を続ける）。"""
+        return await self._loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def _check(self):
+        if self.config_store is not None:
+            self.config_store.reload_if_changed()
+        self.engine.check_notifications()
+
+    async def _tick_loop(self):
+        while True:
+            try:
+                await self._run(self._check)
+            except Exception:
+                logger.exception("通知チェック中にエラーが発生しました。")
+            await asyncio.sleep(self.interval)
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # 1行がストリームの上限（64KiB）を超えた。行の残りと区別できないので応答して切断する
+                    logger.warning("上限を超える長さのリクエストを受け取ったため、接続を閉じます。")
+                    response = _error_response(None, PARSE_ERROR, "リクエストが長すぎます。")
+                    writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                response = await self._dispatch(line, writer)
+                if response is not None:
+                    writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.subscribers.discard(writer)
+            writer.close()
+
+    async def _dispatch(self, line, writer):
+        """1行分のリクエストを処理し、レスポンス（通知形式のリクエストなら None）を返します。"""
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return _error_response(None, PARSE_ERROR, "JSONとして解析できません。")
+        if not isinstance(request, dict) or request.get("jsonrpc") != "2.0" or "method" not in request:
+            return _error_response(request.get("id") if isinstance(request, dict) else None,
+                                   INVALID_REQUEST, "JSON-RPC 2.0 のリクエストではありません。")
+
+        request_id = request.get("id")
+        method = request["method"]
+        params = request.get("params") or {}
+        try:
+            if method == "subscribe":
+                self.subscribers.add(writer)
+                result = True
+            elif method in self._methods:
+                if not isinstance(params, dict):
+                    raise RpcError(INVALID_PARAMS, "params は名前付き引数で指定してください。")
+                func = self._methods[method]
+                # 引数の過不足は呼び出す前に確認する（メソッドの中で起きた TypeError はサーバーのエラーとして扱う）
+                try:
+                    inspect.signature(func).bind(**params)
+                except TypeError as e:
+                    raise RpcError(INVALID_PARAMS, str(e))
+                result = await self._run(func, **params)
+            else:
+                raise RpcError(METHOD_NOT_FOUND, f"メソッド '{method}' はありません。")
+        except RpcError as e:
+            return _error_response(request_id, e.code, e.message)
+        except Exception as e:
+            logger.exception("RPCメソッド %s の実行中にエラーが発生しました。", method)
+            return _error_response(request_id, SERVER_ERROR, str(e))
+
+        if "id" not in request:
+            return None
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def broadcast(self, event, params):
+        """購読中のすべてのクライアントにイベントを送ります（DB用のスレッドから呼ばれた場合はイベントループで送る）。"""
+        message = json.dumps({"jsonrpc": "2.0", "method": event, "params": params}, ensure_ascii=False)
+        data = message.encode("utf-8") + b"\n"
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if self._loop is not None and running_loop is not self._loop:
+            self._loop.call_soon_threadsafe(self._send_event, data)
+        else:
+            self._send_event(data)
+
+    def _send_event(self, data):
+        for writer in list(self.subscribers):
+            if writer.is_closing():
+                self.subscribers.discard(writer)
+                continue
+            if writer.transport.get_write_buffer_size() + len(data) > MAX_SUBSCRIBER_BUFFER:
+                logger.warning("イベントを受け取っていないクライアントの接続を切断します（送信待ち %sバイト）。",
+                               writer.transport.get_write_buffer_size())
+                self.subscribers.discard(writer)
+                writer.close()
+                continue
+            writer.write(data)
+
+    # --- RPCメソッド ---
+
+    def ping(self):
+        return "pong"
+
+    def add_schedule(self, title, start, end, category=None, location=None, description=None,
+                     notification_minutes=None, task_notification_minutes=None, tasks=None):
+        """予定を追加します。GUIと同様に開始/終了タスクを前後に自動で追加します。"""
+        schedule_id = self.data_manager.save_schedule(
+            title, start, end, category, location, description, 0,
+            notification_minutes, task_notification_minutes,
+        )
+        if not schedule_id:
+            raise RpcError(SERVER_ERROR, "予定を保存できませんでした。")
+        user_tasks = [t for t in (tasks or []) if t not in (START_TASK, END_TASK)]
+        self.data_manager.save_tasks(schedule_id, [START_TASK] + user_tasks + [END_TASK])
+        self.broadcast("schedules_changed", {"schedule_id": schedule_id})
+        return schedule_id
+
+    def list_schedules(self, past=False):
+        if past:
+            schedules = self.data_manager.get_past_schedules()
+        else:
+            schedules = self.data_manager.get_current_schedules()
+        return [schedule_to_dict(schedule) for schedule in self.data_manager.fill_descriptions(schedules)]
+
+    def get_tasks(self, schedule_id, archived=False):
+        return [
+            {"id": task_id, "task_description": desc, "is_completed": bool(is_completed)}
+            for task_id, desc, is_completed in self.data_manager.get_tasks_for_schedule(schedule_id, archived)
+        ]
+
+    def complete_task(self, task_id, is_completed=True):
+        """タスクの完了状態を更新します。「スケジュールの終了」なら予定の完了状態も更新します。"""
+        task = self.data_manager.get_task(task_id)
+        if not task:
+            raise RpcError(INVALID_PARAMS, f"タスクID {task_id} が見つかりません。")
+        _, schedule_id, task_desc, _ = task
+        if not self.data_manager.update_task_completion(task_id, is_completed):
+            return False
+        self.engine.update_task_check_status(schedule_id, task_desc, is_completed)
+        if task_desc == END_TASK:
+            self.data_manager.update_schedule_completion(schedule_id, is_completed)
+        self.broadcast("schedules_changed", {"schedule_id": schedule_id})
+        return True
+
+    def complete_schedule(self, schedule_id, is_completed=True):
+        success = self.data_manager.update_schedule_completion(schedule_id, is_completed)
+        if success:
+            self.broadcast("schedules_changed", {"schedule_id": schedule_id})
+        return success
+
+    def update_task_check_status(self, schedule_id, task_desc, is_checked):
+        """クライアント側でタスクのチェック状態が変わったことを通知エンジンに伝えます。"""
+        self.engine.update_task_check_status(schedule_id, task_desc, is_checked)
+        return True
+
+
+def _error_response(request_id, code, message):
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+class DaemonClient:
+    """通知デーモンに接続する同期クライアント（CLIやスクリプト用）"""
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, timeout=5):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(socket_path)
+        self._file = self.sock.makefile("rb")
+        self._next_id = 1
+
+    def call(self, method, **params):
+        """メソッドを呼び出して結果を返します。エラー時は RpcError を送出します。"""
+        request_id = self._next_id
+        self._next_id += 1
+        self._send({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params})
+        while True:
+            message = self._receive()
+            if message.get("id") != request_id:
+                continue  # 購読中のイベントは読み飛ばす
+            if "error" in message:
+                raise RpcError(message["error"]["code"], message["error"]["message"])
+            return message["result"]
+
+    def events(self):
+        """イベントを購読し、(イベント名, 内容) を順に返すジェネレータ"""
+        self.call("subscribe")
+        self.sock.settimeout(None)
+        while True:
+            message = self._receive()
+            if "method" in message and "id" not in message:
+                yield message["method"], message["params"]
+
+    def close(self):
+        self._file.close()
+        self.sock.close()
+
+    def _send(self, message):
+        self.sock.sendall(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    def _receive(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("通知デーモンとの接続が切れました。")
+        return json.loads(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MyScheduleManager 通知デーモン")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH, help="Unixドメインソケットのパス")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="デーモンを起動する")
+    serve_parser.add_argument("--db", help="データベースファイル（省略時は設定の db_path）")
+    serve_parser.add_argument("--interval", type=float, help="通知チェックの間隔（秒。省略時は設定の notification_interval_ms）")
+
+    call_parser = subparsers.add_parser("call", help="RPCメソッドを呼び出す")
+    call_parser.add_argument("method")
+    call_parser.add_argument("params", nargs="?", default="{}", help="JSON形式の名前付き引数")
+
+    subparsers.add_parser("events", help="イベントを購読して表示する")
+    args = parser.parse_args(argv)
+
+    from src.logging_setup import setup_logging
+    setup_logging()
+
+    if args.command == "serve":
+        try:
+            config_store = get_config_store()
+        except ConfigError as e:
+            print(e, file=sys.stderr)
+            return 2
+        data_manager = DataManager(args.db)
+        daemon = NotificationDaemon(data_manager, args.socket, args.interval, config_store=config_store)
+        try:
+            asyncio.run(daemon.serve())
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            pass
+        finally:
+            data_manager.close()
+        return 0
+
+    client = DaemonClient(args.socket)
+    try:
+        if args.command == "call":
+            result = client.call(args.method, **json.loads(args.params))
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+        else:
+            for event, params in client.events():
+                print(json.dumps({"event": event, "params": params}, ensure_ascii=False))
+    except RpcError as e:
+        print(f"エラー ({e.code}): {e.message}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,42 +1,308 @@
 import sqlite3
 import os
-from datetime import datetime
+import json
+import hashlib
+import heapq
+import logging
+import re
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+
+from src.backup import STEP_PAGES, copy_pages
+from src.config import FIELDS, get_config
+from src.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# get_*_schedules が返すタプルの並び順（schedules テーブルのカラム順）
+SCHEDULE_COLUMNS = (
+    "id", "title", "start_datatime", "end_datatime", "category", "location", "description",
+    "created_at", "is_locked", "notification_minutes", "is_completed", "completed_at",
+    "task_notification_minutes", "version",
+)
+
+# 複数の予定IDをJSON配列の1つのパラメータで渡すための副問い合わせ（IDの件数によらず1文で処理できる）
+IDS_SUBQUERY = "SELECT value FROM json_each(?)"
+
+# 区分・場所の参照テーブル（予定のカラム名: テーブル名）。予定には文字列の代わりにIDを保存する
+LOOKUP_TABLES = {"category": "categories", "location": "locations"}
+
+# 予定を読むSELECT文（{table} に schedules / archive.schedules を入れる）。区分・場所はIDで読み、
+# _decode_schedules で SCHEDULE_COLUMNS の並びのタプルに戻す。末尾の2列はID化する前の旧形式の文字列。
+# 詳細内容（description）は schedule_texts に分けて保存し、一覧では読まない（常に None。
+# 必要な予定だけ get_schedule_description / fill_descriptions で読む）
+SCHEDULE_SELECT = """
+    SELECT id, title, start_datatime, end_datatime, category_id, location_id, NULL AS description,
+           created_at, is_locked, notification_minutes, is_completed, completed_at,
+           task_notification_minutes, version, category, location
+    FROM {table}
+"""
+
+# 詳細内容を移行する際に1回のクエリで読む予定の件数
+DESCRIPTION_MIGRATION_BATCH = 500
+
+# 添付ファイルを読み書きする単位（ファイル全体をメモリに読み込まない）
+ATTACHMENT_CHUNK_SIZE = 64 * 1024
+
+# 追加のカレンダー（予定を別のDBファイルに分けたもの）の名前と、本体のDBのカレンダー名
+CALENDAR_NAME_PATTERN = re.compile(r"^[\w-]{1,64}$")
+MAIN_CALENDAR = "main"
+
+# 共有フォルダ上のDBを複数のインスタンスで使う場合に、書き込みロックの取得を待つ設定
+# （待つ時間は設定の busy_timeout_ms）
+BUSY_RETRIES = 5
+BUSY_RETRY_WAIT = 0.05 # 秒（リトライごとに倍にする）
+
+def resolve_db_path(db_name=None, config=None):
+    """DBファイルのパスを返します（DataManager と同じ規則。DBを開く前にパスが必要な場合に使う）。
+
+    db_name を省略した場合は設定の db_path（空なら schedule.db）を使います。
+    """
+    if db_name is None:
+        db_name = (config or get_config()).db_path or "schedule.db"
+    # プロジェクトのルートにある data ディレクトリ内にDBファイルを配置
+    # __file__ は現在のファイル(data_manager.py)のパス
+    # os.path.dirname(__file__) は src ディレクトリ
+    # os.path.dirname(os.path.dirname(__file__)) は MyScheduleManager ディレクトリ
+    # os.path.join(..., "data") で MyScheduleManager/data ディレクトリを指定
+    # db_name に絶対パスを渡した場合はそのパスをそのまま使う（ベンチマーク用のDBなど）
+    data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+    return os.path.join(data_dir, db_name)
+
+def snapshot_path_for(db_path):
+    """起動用スナップショットのパスを返します（schedule.db なら schedule.snapshot）。"""
+    return os.path.splitext(db_path)[0] + ".snapshot"
+
+def _encode_description(description, threshold):
+    """詳細内容を schedule_texts に保存する (値, compressed) に変換します。
+
+    UTF-8 で threshold バイト以上なら zlib で圧縮し、小さくなった場合だけ圧縮した BLOB を使います（threshold が 0 なら圧縮しない）。
+    """
+    data = description.encode("utf-8")
+    if threshold and len(data) >= threshold:
+        compressed = zlib.compress(data)
+        if len(compressed) < len(data):
+            return compressed, 1
+    return description, 0
+
+def _decode_description(value, compressed):
+    """_encode_description で変換した値を詳細内容の文字列に戻します。"""
+    if compressed:
+        return zlib.decompress(value).decode("utf-8")
+    return value
+
+def schedule_to_dict(schedule):
+    """予定のタプルをカラム名をキーにした辞書に変換します。"""
+    return dict(zip(SCHEDULE_COLUMNS, schedule))
+
+def _serialized_write(func):
+    """書き込み用の接続を使うメソッドを、スレッド間で1つずつ実行されるようにするデコレータ
+
+    メソッドの実行前に BEGIN IMMEDIATE で書き込みロックを取得し、途中で return した場合など
+    コミットされずに残ったトランザクションはロールバックします。
+    """
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self._write_lock:
+            self.last_error = None
+            if self.conn:
+                self._begin_immediate()
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                if self.conn and self.conn.in_transaction:
+                    self.conn.rollback()
+                self.write_generation += 1
+    return wrapper
 
 class DataManager:
-    def __init__(self, db_name="schedule.db"):
-        # プロジェクトのルートにある data ディレクトリ内にDBファイルを配置
-        # __file__ は現在のファイル(data_manager.py)のパス
-        # os.path.dirname(__file__) は src ディレクトリ
-        # os.path.dirname(os.path.dirname(__file__)) は MyScheduleManager ディレクトリ
-        # os.path.join(..., "data") で MyScheduleManager/data ディレクトリを指定
-        data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+    def __init__(self, db_name=None, config=None):
+        # 接続のPRAGMAなどの設定（apply_config で実行中に変更できる）
+        self.config = config or get_config()
+        self._config_generation = 0 #apply_config のたびに増やし、読み取り用接続が次に使われるときに反映する
+        self.db_path = resolve_db_path(db_name, self.config)
+        data_dir = os.path.dirname(self.db_path)
+        # 古い予定を移すアーカイブ用DB（schedule.db なら schedule_archive.db）
+        self.archive_path = os.path.splitext(self.db_path)[0] + "_archive.db"
+        # 終了時に書き出す起動用スナップショット
+        self.snapshot_path = snapshot_path_for(self.db_path)
         
         # dataディレクトリが存在しない場合は作成
         if not os.path.exists(data_dir):
             os.makedirs(data_dir)
-            print(f"dataディレクトリを作成しました: {data_dir}")
+            logger.info("dataディレクトリを作成しました: %s", data_dir)
         
-        self.db_path = os.path.join(data_dir, db_name)
-        self.conn = None #接続オブジェクト
-        self.cursor = None #カーソルオブジェクト
+        self.conn = None #書き込み用の接続オブジェクト（_write_lock で直列化して使う）
+        self.cursor = None #書き込み用のカーソルオブジェクト
+        self._write_lock = threading.RLock()
+        self._local = threading.local() #スレッドごとの読み取り用接続
+        self._read_conns = [] #close() でまとめて閉じるための読み取り用接続の一覧
+        self._read_conns_lock = threading.Lock()
+        self.last_error = None #直前の書き込みが失敗した理由（"not_found" / "locked" / "conflict" / "error"）
+        self.write_generation = 0 #このインスタンスから書き込みを行った回数（変更検知用）
+        self._archive_attached = False #書き込み用の接続にアーカイブDBをATTACH済みか
+        # 区分・場所のID: 名前（テーブルごと）。同じ名前は同じ文字列オブジェクトを全予定で共有する
+        self._lookup_names = {table: {} for table in LOOKUP_TABLES.values()}
+        self._calendar_managers = {} #カレンダー名: そのカレンダーのDBの DataManager（書き込み・保守用）
+        self._calendar_lock = threading.Lock()
+        self._query_tracking = False #各スレッドが最後に実行を始めたSQLを記録するか（停止の調査用）
+        self._last_queries = {} #スレッドID: (SQL, 実行を始めた時刻)
         self._connect() #データベースに接続
         self._create_tables() #テーブルを作成
 
     def _connect(self):
-        """データベースに接続"""
+        """データベースに接続（書き込み用の接続）"""
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            # 書き込みは _write_lock で直列化するので、どのスレッドからでも使えるようにする
+            self.conn = sqlite3.connect(self.db_path, timeout=self.config.busy_timeout_ms / 1000, check_same_thread=False)
+            # ページサイズはテーブルを作る前（新しいDB）にだけ反映される
+            self.conn.execute(f"PRAGMA page_size={self.config.page_size}")
+            # WALモード（既定）では読み取りが書き込みを待たずに並行して実行できる
+            self.conn.execute(f"PRAGMA journal_mode={self.config.journal_mode}")
+            self._apply_connection_pragmas(self.conn)
+            # tasks の ON DELETE CASCADE を有効にする（外部キー制約は接続ごとに有効化が必要）
+            self.conn.execute("PRAGMA foreign_keys=ON")
             self.cursor = self.conn.cursor()
-            print(f"データベースに接続しました: {self.db_path}")
+            logger.info("データベースに接続しました: %s", self.db_path)
         except sqlite3.Error as e:
-            print(f"データベース接続エラー: {e}")
+            logger.error("データベース接続エラー: %s", e)
             self.conn = None
             self.cursor = None
 
+    def _read_cursor(self, with_archive=False):
+        """呼び出し元スレッド専用の読み取り用接続のカーソルを返します（初回は接続を作成）。
+
+        with_archive=True の場合は、アーカイブDBが存在すれば archive としてATTACHします。
+        アーカイブDBがまだ無い場合は None を返します。
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # close() で別スレッドから閉じられるよう check_same_thread は無効にする（使うのは作成したスレッドのみ）
+            conn = sqlite3.connect(self.db_path, timeout=self.config.busy_timeout_ms / 1000, check_same_thread=False)
+            conn.execute("PRAGMA query_only=ON")
+            if self._query_tracking:
+                conn.set_trace_callback(self._record_query)
+            self._local.conn = conn
+            self._local.archive_attached = False
+            self._local.calendars = OrderedDict() #ATTACH済みのカレンダーのID: DBファイル（最近使った順）
+            self._local.config_generation = None
+            with self._read_conns_lock:
+                self._read_conns.append(conn)
+        if self._local.config_generation != self._config_generation:
+            # 接続は作成したスレッドだけが使うので、設定の変更はこのスレッドで次に使うときに反映する
+            self._local.config_generation = self._config_generation
+            self._apply_connection_pragmas(conn)
+        if with_archive and not self._local.archive_attached:
+            if not os.path.exists(self.archive_path):
+                return None
+            if self._local.calendars and len(self._local.calendars) >= conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED):
+                # カレンダーでATTACHできる数を使い切っていれば、最も長く使っていないものを空ける
+                evicted_id, _ = self._local.calendars.popitem(last=False)
+                conn.execute(f"DETACH DATABASE cal_{evicted_id}")
+            conn.execute("ATTACH DATABASE ? AS archive", (self.archive_path,))
+            self._local.archive_attached = True
+        return conn.cursor()
+
+    def _apply_connection_pragmas(self, conn):
+        """実行中に変更できる接続ごとの設定を conn に反映します。"""
+        conn.execute(f"PRAGMA synchronous={self.config.synchronous}")
+        conn.execute(f"PRAGMA cache_size=-{self.config.cache_size_kib}")  # 負の値は KiB 単位
+        conn.execute(f"PRAGMA busy_timeout={self.config.busy_timeout_ms}")
+
+    def apply_config(self, config, changed=None):
+        """設定を差し替え、実行中に変更できる項目（synchronous・cache_size_kib・busy_timeout_ms）を接続に反映します。
+
+        ConfigStore.subscribe に登録して使います。DBのパス・journal_mode・page_size は次に開いたときに反映されるため、
+        self.config には開いたときの値を残します。
+        """
+        with self._write_lock:
+            self.config = config._replace(**{name: getattr(self.config, name) for name, spec in FIELDS.items() if not spec[3]})
+            self._config_generation += 1
+            if self.conn:
+                self._apply_connection_pragmas(self.conn)
+
+    def enable_query_tracking(self):
+        """各スレッドが最後に実行を始めたSQLを記録するようにします（current_query で取得できる）。"""
+        self._query_tracking = True
+        if self.conn:
+            self.conn.set_trace_callback(self._record_query)
+        with self._read_conns_lock:
+            for conn in self._read_conns:
+                conn.set_trace_callback(self._record_query)
+
+    def _record_query(self, sql):
+        # SQLiteが文を実行するスレッドで呼ばれる
+        self._last_queries[threading.get_ident()] = (sql, time.monotonic())
+
+    def current_query(self, thread_id):
+        """thread_id のスレッドが最後に実行を始めたSQLと、その時刻（time.monotonic）を返します。記録がなければ None です。"""
+        return self._last_queries.get(thread_id)
+
+    def _begin_immediate(self):
+        """書き込みトランザクションを開始します。他のインスタンスが書き込み中なら待ってリトライします。"""
+        wait = BUSY_RETRY_WAIT
+        for attempt in range(BUSY_RETRIES):
+            try:
+                self.conn.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) and "busy" not in str(e):
+                    raise
+                logger.warning("データベースが他のインスタンスで使用中です（%s回目のリトライ）: %s", attempt + 1, e)
+                time.sleep(wait)
+                wait *= 2
+        # ここで諦めた場合は、各メソッドの実行時にエラーとして扱われる
+        logger.error("データベースの書き込みロックを取得できませんでした。")
+
+    def _explain_write_failure(self, schedule_id, expected_version=None):
+        """条件付きの UPDATE/DELETE が0行だったときに理由を調べ、last_error に記録します。"""
+        self.cursor.execute("SELECT is_locked, version FROM schedules WHERE id = ?", (schedule_id,))
+        result = self.cursor.fetchone()
+        if not result:
+            self.last_error = "not_found"
+            logger.warning("予定ID %s が見つかりません。", schedule_id)
+        elif result[0] == 1:
+            self.last_error = "locked"
+            logger.warning("予定ID %s はロックされています。", schedule_id)
+        elif expected_version is not None and result[1] != expected_version:
+            self.last_error = "conflict"
+            logger.warning("予定ID %s は他のインスタンスで更新されています（期待: %s, 現在: %s）。",
+                           schedule_id, expected_version, result[1])
+        return self.last_error
+
+    def data_version(self):
+        """他の接続（別プロセスを含む）がコミットするたびに変わる値を返します（PRAGMA data_version）。"""
+        if not self.conn:
+            return None
+        # 呼び出し元スレッドの読み取り用接続で読むため、復元や添付ファイルの保存で書き込み中でも待たない
+        # （この DataManager の書き込み用接続のコミットも、読み取り用接続からは他の接続の変更として見える）
+        return self._read_cursor().execute("PRAGMA data_version").fetchone()[0]
+
+    def change_token(self):
+        """DBの内容が変わったかどうかを安く判定するための値を返します。
+
+        他の接続からの変更（data_version）と、このインスタンスからの書き込み（write_generation）の
+        どちらかが変われば別の値になります。有効なカレンダーがある場合は、カレンダーごとの DataManager の
+        change_token も含めるため、他のプロセスがカレンダーのDBに書き込んだ場合も値が変わります。
+        """
+        token = (self.data_version(), self.write_generation)
+        for _, name, path, _ in self.get_calendars(enabled_only=True):
+            if not os.path.exists(path):
+                continue  # DBファイルがないカレンダーは読み込みでも飛ばす
+            manager = self.calendar(name)
+            if manager is not None:
+                token += ((name, manager.change_token()),)
+        return token
+
     def _create_tables(self):
         """必要なテーブルを作成します（存在しない場合)"""
         if not self.conn:
-            print("データベース接続が確率されていないため、テーブルを作成できません")
+            logger.warning("データベース接続が確率されていないため、テーブルを作成できません")
             return
         
         try:
@@ -47,18 +313,30 @@ class DataManager:
                     title TEXT NOT NULL,
                     start_datatime TEXT NOT NULL,
                     end_datatime TEXT NOT NULL,
-                    category TEXT,
-                    location TEXT,
+                    category TEXT, -- 旧形式の区分（category_id に移行した後は NULL）
+                    location TEXT, -- 旧形式の場所（location_id に移行した後は NULL）
                     description TEXT,
                     created_at TEXT DEFAULT CURRENT_TIMESTAMP,
                     is_locked INTEGER DEFAULT 0, -- 0:ロックなし, 1:ロック中
                     notification_minutes INTEGER DEFAULT NULL, -- 通知を送る分前（NULL:通知なし）
                     is_completed INTEGER DEFAULT 0, -- 0:未完了, 1:完了
                     completed_at TEXT DEFAULT NULL, -- 完了した日時
-                    task_notification_minutes INTEGER DEFAULT NULL -- タスク完了後の通知（分後）
+                    task_notification_minutes INTEGER DEFAULT NULL, -- タスク完了後の通知（分後）
+                    version INTEGER DEFAULT 1, -- 更新のたびに増える行バージョン（楽観的排他制御用）
+                    category_id INTEGER REFERENCES categories(id), -- 区分（categories テーブルのID）
+                    location_id INTEGER REFERENCES locations(id) -- 場所（locations テーブルのID）
                 )
             ''')
 
+            #categories / locationsテーブル: 区分・場所の名前（予定からはIDで参照する）
+            for table in LOOKUP_TABLES.values():
+                self.cursor.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        id INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL UNIQUE
+                    )
+                ''')
+
             #tasksテーブル: 各予定に紐づくタスク
             self.cursor.execute('''
                 CREATE TABLE IF NOT EXISTS tasks (
@@ -71,12 +349,89 @@ class DataManager:
                 )
             ''')
             
+            #schedule_templatesテーブル: 繰り返し登録する予定のテンプレート
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schedule_templates (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL UNIQUE,
+                    title TEXT NOT NULL,
+                    category TEXT,
+                    location TEXT,
+                    description TEXT,
+                    tasks TEXT, -- 改行区切りのタスク一覧
+                    notification_minutes INTEGER DEFAULT NULL,
+                    task_notification_minutes INTEGER DEFAULT NULL,
+                    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            #attachment_blobsテーブル: 添付ファイルの内容（SHA-256 が同じ内容は1件だけ保存する）
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS attachment_blobs (
+                    hash TEXT PRIMARY KEY, -- 内容の SHA-256（16進数）
+                    size INTEGER NOT NULL,
+                    data BLOB NOT NULL -- blobopen で少しずつ読み書きする
+                )
+            ''')
+
+            #schedule_textsテーブル: 予定の詳細内容（一覧の読み込みで読まないよう schedules から分けて保存する）
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schedule_texts (
+                    schedule_id INTEGER PRIMARY KEY REFERENCES schedules(id) ON DELETE CASCADE,
+                    description BLOB NOT NULL, -- compressed が 1 なら zlib で圧縮したUTF-8、0 なら文字列のまま
+                    compressed INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+
+            #calendarsテーブル: 追加のカレンダー（予定は calendars ディレクトリの別のDBファイルに保存する）
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS calendars (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, -- ATTACH するときの名前（cal_<id>）に使うため再利用しない
+                    name TEXT NOT NULL UNIQUE,
+                    path TEXT NOT NULL, -- DBファイル（本体のDBと同じディレクトリからの相対パス）
+                    enabled INTEGER NOT NULL DEFAULT 1, -- 0 なら統合した表示・検索に含めない
+                    created_at TEXT
+                )
+            ''')
+
+            #attachmentsテーブル: 予定に添付したファイル（内容は attachment_blobs を参照）
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS attachments (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    schedule_id INTEGER NOT NULL,
+                    blob_hash TEXT NOT NULL REFERENCES attachment_blobs(hash),
+                    filename TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (schedule_id) REFERENCES schedules(id) ON DELETE CASCADE
+                )
+            ''')
+            # どの添付ファイルからも参照されなくなった内容を削除する（予定の削除によるカスケード削除でも実行される）
+            self.cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS attachments_release_blob AFTER DELETE ON attachments
+                WHEN NOT EXISTS (SELECT 1 FROM attachments WHERE blob_hash = OLD.blob_hash)
+                BEGIN
+                    DELETE FROM attachment_blobs WHERE hash = OLD.blob_hash;
+                END
+            ''')
+            
+            # 開始日時順の範囲検索・キーセットページング用のインデックス
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_schedules_start ON schedules(start_datatime, id)")
+            # 予定ごとのタスク取得と、予定削除時のカスケード削除でtasksを全件走査しないためのインデックス
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_schedule ON tasks(schedule_id)")
+            # 予定ごとの添付ファイルの一覧と、内容を参照している添付ファイルの確認用のインデックス
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_attachments_schedule ON attachments(schedule_id)")
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_attachments_blob ON attachments(blob_hash)")
+            
             # マイグレーション: is_locked カラムが存在するか確認し、なければ追加
             self._migrate_database()
+            # 区分での絞り込み・集計用のインデックス（category_id はマイグレーションで追加される場合がある）
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_schedules_category ON schedules(category_id, start_datatime)")
+            self._run_data_migrations()
             
-            print("データベーステーブルが正常に作成または確認されました。")
+            logger.info("データベーステーブルが正常に作成または確認されました。")
         except sqlite3.Error as e:
-            print(f"テーブル作成エラー: {e}")
+            logger.error("テーブル作成エラー: %s", e)
             
     def _migrate_database(self):
         """データベースのマイグレーション処理を行います。"""
@@ -95,324 +450,1523 @@ class DataManager:
             has_completed_at = any(column[1] == 'completed_at' for column in columns)
             # task_notification_minutes カラムが存在するかチェック
             has_task_notification = any(column[1] == 'task_notification_minutes' for column in columns)
+            # version カラムが存在するかチェック
+            has_version = any(column[1] == 'version' for column in columns)
+            # category_id / location_id カラムが存在するかチェック
+            has_category_id = any(column[1] == 'category_id' for column in columns)
+            has_location_id = any(column[1] == 'location_id' for column in columns)
             
             if not has_is_locked:
-                print("データベースをマイグレーション: is_locked カラムを追加します")
+                logger.info("データベースをマイグレーション: is_locked カラムを追加します")
                 self.cursor.execute("ALTER TABLE schedules ADD COLUMN is_locked INTEGER DEFAULT 0")
                 self.conn.commit()
-                print("マイグレーション完了: is_locked カラムを追加しました")
+                logger.info("マイグレーション完了: is_locked カラムを追加しました")
                 
             if not has_notification:
-                print("データベースをマイグレーション: notification_minutes カラムを追加します")
+                logger.info("データベースをマイグレーション: notification_minutes カラムを追加します")
                 self.cursor.execute("ALTER TABLE schedules ADD COLUMN notification_minutes INTEGER DEFAULT NULL")
                 self.conn.commit()
-                print("マイグレーション完了: notification_minutes カラムを追加しました")
+                logger.info("マイグレーション完了: notification_minutes カラムを追加しました")
                 
             if not has_is_completed:
-                print("データベースをマイグレーション: is_completed カラムを追加します")
+                logger.info("データベースをマイグレーション: is_completed カラムを追加します")
                 self.cursor.execute("ALTER TABLE schedules ADD COLUMN is_completed INTEGER DEFAULT 0")
                 self.conn.commit()
-                print("マイグレーション完了: is_completed カラムを追加しました")
+                logger.info("マイグレーション完了: is_completed カラムを追加しました")
                 
             if not has_completed_at:
-                print("データベースをマイグレーション: completed_at カラムを追加します")
+                logger.info("データベースをマイグレーション: completed_at カラムを追加します")
                 self.cursor.execute("ALTER TABLE schedules ADD COLUMN completed_at TEXT DEFAULT NULL")
                 self.conn.commit()
-                print("マイグレーション完了: completed_at カラムを追加しました")
+                logger.info("マイグレーション完了: completed_at カラムを追加しました")
                 
             if not has_task_notification:
-                print("データベースをマイグレーション: task_notification_minutes カラムを追加します")
+                logger.info("データベースをマイグレーション: task_notification_minutes カラムを追加します")
                 self.cursor.execute("ALTER TABLE schedules ADD COLUMN task_notification_minutes INTEGER DEFAULT NULL")
                 self.conn.commit()
-                print("マイグレーション完了: task_notification_minutes カラムを追加しました")
+                logger.info("マイグレーション完了: task_notification_minutes カラムを追加しました")
+                
+            if not has_version:
+                logger.info("データベースをマイグレーション: version カラムを追加します")
+                self.cursor.execute("ALTER TABLE schedules ADD COLUMN version INTEGER DEFAULT 1")
+                self.conn.commit()
+                logger.info("マイグレーション完了: version カラムを追加しました")
+                
+            if not has_category_id:
+                logger.info("データベースをマイグレーション: category_id カラムを追加します")
+                self.cursor.execute("ALTER TABLE schedules ADD COLUMN category_id INTEGER REFERENCES categories(id)")
+                self.conn.commit()
+                logger.info("マイグレーション完了: category_id カラムを追加しました")
+                
+            if not has_location_id:
+                logger.info("データベースをマイグレーション: location_id カラムを追加します")
+                self.cursor.execute("ALTER TABLE schedules ADD COLUMN location_id INTEGER REFERENCES locations(id)")
+                self.conn.commit()
+                logger.info("マイグレーション完了: location_id カラムを追加しました")
         except sqlite3.Error as e:
-            print(f"マイグレーションエラー: {e}")
-    
+            logger.error("マイグレーションエラー: %s", e)
+
+    def _run_data_migrations(self):
+        """既存の行を書き換えるマイグレーションを一度ずつ実行します（PRAGMA user_version で実施済みの段階を記録）。"""
+        steps = (
+            # 1: 外部キー制約が無効だった頃に残った孤立タスクを削除する
+            ("予定が削除済みのタスクを削除します", self.remove_orphan_tasks),
+            # 2: 区分・場所の文字列を参照テーブルのIDに置き換える
+            ("区分・場所を参照テーブルのIDに置き換えます", self.normalize_lookup_values),
+            # 3: 詳細内容を schedule_texts に移す
+            ("予定の詳細内容を schedule_texts に移します", self.move_descriptions),
+        )
+        try:
+            done = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            for version, (description, step) in enumerate(steps, start=1):
+                if done >= version:
+                    continue
+                logger.info("データベースをマイグレーション: %s", description)
+                self.last_error = None
+                count = step()
+                if self.last_error == "error":
+                    # 実施済みとして記録せず、次に開いたときにこの段階から再実行する
+                    logger.error("マイグレーションに失敗しました（次回の起動時に再実行します）: %s", description)
+                    break
+                self.conn.execute(f"PRAGMA user_version = {version}")
+                logger.info("マイグレーション完了: %s件の行を更新しました", count)
+        except sqlite3.Error as e:
+            logger.error("マイグレーションエラー: %s", e)
+
+    @timed("data_manager.normalize_lookup_values")
+    @_serialized_write
+    def normalize_lookup_values(self):
+        """category / location に文字列が残っている予定を、参照テーブルのIDに置き換えて文字列を NULL にします。
+
+        置き換えた予定の件数を返します（失敗した場合は 0 を返し、last_error を "error" にします）。
+        アーカイブDBの予定は文字列のまま残し、読み取り時にそのまま使います。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、区分・場所を移行できません。")
+            return 0
+        
+        try:
+            updated = 0
+            for column, table in LOOKUP_TABLES.items():
+                self.cursor.execute(
+                    f"INSERT OR IGNORE INTO {table} (name) SELECT DISTINCT {column} FROM schedules WHERE {column} IS NOT NULL"
+                )
+                self.cursor.execute(f'''
+                    UPDATE schedules
+                    SET {column}_id = (SELECT id FROM {table} WHERE name = schedules.{column}), {column} = NULL
+                    WHERE {column} IS NOT NULL
+                ''')
+                updated = max(updated, self.cursor.rowcount)
+            self.conn.commit()
+            return updated
+        except sqlite3.Error as e:
+            self.last_error = "error"
+            logger.error("区分・場所の移行エラー: %s", e)
+            return 0
+
+    @timed("data_manager.move_descriptions")
+    @_serialized_write
+    def move_descriptions(self):
+        """schedules に詳細内容が残っている予定の詳細内容を schedule_texts に移し、schedules 側を NULL にします。
+
+        移した予定の件数を返します（失敗した場合は 0 を返し、last_error を "error" にします）。
+        アーカイブDBの予定は予定の行に残し、get_schedule_description で読みます。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、詳細内容を移行できません。")
+            return 0
+        
+        try:
+            moved = 0
+            last_id = 0
+            threshold = self.config.description_compress_bytes
+            while True:
+                self.cursor.execute(
+                    "SELECT id, description FROM schedules WHERE id > ? AND description IS NOT NULL ORDER BY id LIMIT ?",
+                    (last_id, DESCRIPTION_MIGRATION_BATCH),
+                )
+                rows = self.cursor.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                self.cursor.executemany(
+                    "INSERT OR REPLACE INTO schedule_texts (schedule_id, description, compressed) VALUES (?, ?, ?)",
+                    [(schedule_id,) + _encode_description(description, threshold)
+                     for schedule_id, description in rows if description],
+                )
+                moved += len(rows)
+            self.cursor.execute("UPDATE schedules SET description = NULL WHERE description IS NOT NULL")
+            self.conn.commit()
+            return moved
+        except sqlite3.Error as e:
+            self.last_error = "error"
+            logger.error("詳細内容の移行エラー: %s", e)
+            return 0
+
+    def _save_description(self, schedule_id, description):
+        """予定の詳細内容を schedule_texts に保存します（空なら削除する）。書き込みトランザクション内で呼び出します。"""
+        if not description:
+            self.cursor.execute("DELETE FROM schedule_texts WHERE schedule_id = ?", (schedule_id,))
+            return
+        self.cursor.execute(
+            "INSERT OR REPLACE INTO schedule_texts (schedule_id, description, compressed) VALUES (?, ?, ?)",
+            (schedule_id,) + _encode_description(description, self.config.description_compress_bytes),
+        )
+
+    def _lookup_ids(self, category, location):
+        """区分・場所の名前を参照テーブルのIDに変換します（未登録の名前は追加する）。書き込みトランザクション内で呼び出します。"""
+        ids = []
+        for table, name in (("categories", category), ("locations", location)):
+            if name is None:
+                ids.append(None)
+                continue
+            self.cursor.execute(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", (name,))
+            self.cursor.execute(f"SELECT id FROM {table} WHERE name = ?", (name,))
+            ids.append(self.cursor.fetchone()[0])
+        return ids
+
+    def _decode_schedules(self, cursor, rows, schema="main"):
+        """SCHEDULE_SELECT で読んだ行を、区分・場所を名前にした SCHEDULE_COLUMNS の並びのタプルに変換します。
+
+        名前は参照テーブルごとの辞書から取り出すため、同じ区分・場所の予定は同じ文字列オブジェクトを共有します。
+        IDは追加順に振られて削除されないので、最大のIDが辞書になければ（他のインスタンスが追加した場合など）読み直します。
+        schema には行を読んだDB（ATTACHしたカレンダーなら cal_<id>）を指定し、そのDBの参照テーブルで名前にします。
+        """
+        if not rows:
+            return rows
+        lookups = []
+        for table in LOOKUP_TABLES.values():
+            key = table if schema == "main" else f"{schema}.{table}"
+            names = self._lookup_names.setdefault(key, {})
+            max_id = cursor.execute(f"SELECT MAX(id) FROM {schema}.{table}").fetchone()[0]
+            if max_id is not None and max_id not in names:
+                names.update(cursor.execute(f"SELECT id, name FROM {schema}.{table}").fetchall())
+            lookups.append(names.get)
+        # IDが NULL の行（ID化する前の予定）は旧形式の文字列をそのまま使う
+        category_name, location_name = lookups
+        return [
+            row[:4] + (category_name(row[4], row[14]), location_name(row[5], row[15])) + row[6:14]
+            for row in rows
+        ]
+
+    @timed("data_manager.save_schedule")
+    @_serialized_write
     def save_schedule(self, title, start_dt, end_dt, category, location, description, is_locked=0, notification_minutes=None, task_notification_minutes=None):
         """新しい予定をデータベースに保存します。"""
         if not self.conn:
-            print("データベース接続が確立されていないため、予定を保存できません。")
+            logger.warning("データベース接続が確立されていないため、予定を保存できません。")
             return None
         
         created_at = datetime.now().isoformat()
         try:
+            category_id, location_id = self._lookup_ids(category, location)
             self.cursor.execute('''
-                INSERT INTO schedules (title, start_datatime, end_datatime, category, location, description, created_at, is_locked, notification_minutes, task_notification_minutes)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (title, start_dt, end_dt, category, location, description, created_at, is_locked, notification_minutes, task_notification_minutes))
-            self.conn.commit()
+                INSERT INTO schedules (title, start_datatime, end_datatime, category_id, location_id, created_at, is_locked, notification_minutes, task_notification_minutes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (title, start_dt, end_dt, category_id, location_id, created_at, is_locked, notification_minutes, task_notification_minutes))
             schedule_id = self.cursor.lastrowid #挿入されたレコードIDを取得
-            print(f"予定'{title}'がID{schedule_id}で保存されました。")
+            self._save_description(schedule_id, description)
+            self.conn.commit()
+            logger.debug("予定'%s'がID%sで保存されました。", title, schedule_id)
             return schedule_id
         except sqlite3.Error as e:
-            print(f"予定保存エラー: {e}")
+            logger.error("予定保存エラー: %s", e)
             return None
 
-    def update_schedule(self, schedule_id, title, start_dt, end_dt, category, location, description, notification_minutes=None, task_notification_minutes=None):
-        """既存の予定をデータベースで更新します。ロックされている場合は更新できません。"""
+    @timed("data_manager.update_schedule")
+    @_serialized_write
+    def update_schedule(self, schedule_id, title, start_dt, end_dt, category, location, description, notification_minutes=None, task_notification_minutes=None, expected_version=None):
+        """既存の予定をデータベースで更新します。ロックされている場合は更新できません。
+
+        expected_version を指定した場合は、その版から変更されていないときだけ更新します
+        （他のインスタンスで先に更新されていれば False を返し、last_error は "conflict" になります）。
+        """
         if not self.conn:
-            print("データベース接続が確立されていないため、予定を更新できません。")
+            logger.warning("データベース接続が確立されていないため、予定を更新できません。")
             return False
         
         try:
-            # ロック状態を確認
-            self.cursor.execute("SELECT is_locked FROM schedules WHERE id = ?", (schedule_id,))
-            result = self.cursor.fetchone()
-            if not result:
-                print(f"予定ID{schedule_id}が見つかりません。")
-                return False
-            
-            if result[0] == 1:  # ロックされている場合
-                print(f"予定ID{schedule_id}はロックされているため更新できません。")
-                return False
-            
+            category_id, location_id = self._lookup_ids(category, location)
+            # ロック状態とバージョンの確認を UPDATE の条件に含め、1文で判定と更新を行う
             self.cursor.execute('''
                 UPDATE schedules 
-                SET title = ?, start_datatime = ?, end_datatime = ?, category = ?, location = ?, description = ?, 
-                    notification_minutes = ?, task_notification_minutes = ?
-                WHERE id = ?
-            ''', (title, start_dt, end_dt, category, location, description, notification_minutes, task_notification_minutes, schedule_id))
-            self.conn.commit()
+                SET title = ?, start_datatime = ?, end_datatime = ?, category = NULL, location = NULL,
+                    category_id = ?, location_id = ?, description = NULL, 
+                    notification_minutes = ?, task_notification_minutes = ?, version = version + 1
+                WHERE id = ? AND is_locked = 0 AND (? IS NULL OR version = ?)
+            ''', (title, start_dt, end_dt, category_id, location_id, notification_minutes, task_notification_minutes,
+                  schedule_id, expected_version, expected_version))
             
             if self.cursor.rowcount > 0:
-                print(f"予定ID{schedule_id}が正常に更新されました。")
+                self._save_description(schedule_id, description)
+                self.conn.commit()
+                logger.debug("予定ID%sが正常に更新されました。", schedule_id)
                 return True
             else:
-                print(f"予定ID{schedule_id}が見つからず、更新されませんでした。")
+                self._explain_write_failure(schedule_id, expected_version)
                 return False
         except sqlite3.Error as e:
-            print(f"予定更新エラー: {e}")
+            logger.error("予定更新エラー: %s", e)
             return False
     
+    @timed("data_manager.save_tasks")
+    @_serialized_write
     def save_tasks(self, schedule_id, tasks_list):
         """指定された予定に紐づくタスクをデータベースに保存します。ロックされている場合は保存できません。"""
         if not self.conn:
-            print("データベース接続が確立されていないため、タスクを保存できません。")
+            logger.warning("データベース接続が確立されていないため、タスクを保存できません。")
             return False
         
+        tasks = [task_desc for task_desc in tasks_list if task_desc.strip()]  # 空でないタスクのみ保存
         try:
-            # ロック状態を確認
-            self.cursor.execute("SELECT is_locked FROM schedules WHERE id = ?", (schedule_id,))
-            result = self.cursor.fetchone()
-            if not result:
-                print(f"予定ID{schedule_id}が見つかりません。")
-                return False
-            
-            if result[0] == 1:  # ロックされている場合
-                print(f"予定ID{schedule_id}はロックされているためタスクを保存できません。")
-                return False
-            
             #既存のタスクをいったん削除して再挿入する（シンプルにするための実装）
-            self.cursor.execute("DELETE FROM tasks WHERE schedule_id = ?", (schedule_id,))
-
-            for task_desc in tasks_list:
-                if task_desc.strip():  # 空でないタスクのみ保存
-                    self.cursor.execute('''
-                        INSERT INTO tasks (schedule_id, task_description, is_completed)
-                        VALUES (?, ?, 0)
-                    ''', (schedule_id, task_desc))
+            # どちらの文もロックされていない予定だけを対象にし、ロック状態の確認と更新を同じ文で行う
+            self.cursor.execute(
+                "DELETE FROM tasks WHERE schedule_id = (SELECT id FROM schedules WHERE id = ? AND is_locked = 0)",
+                (schedule_id,),
+            )
+            self.cursor.execute('''
+                INSERT INTO tasks (schedule_id, task_description, is_completed)
+                SELECT schedules.id, json_each.value, 0 FROM schedules, json_each(?)
+                WHERE schedules.id = ? AND schedules.is_locked = 0
+                ORDER BY json_each.key
+            ''', (json.dumps(tasks, ensure_ascii=False), schedule_id))
+            if self.cursor.rowcount != len(tasks) or not tasks:
+                # 挿入件数が合わない場合（タスクが空のときは件数では判定できない）は予定の状態を調べる
+                if self._explain_write_failure(schedule_id):
+                    return False
             self.conn.commit()
-            print(f"予定ID{schedule_id}に紐づくタスクが保存されました。")
+            logger.debug("予定ID%sに紐づくタスクが保存されました。", schedule_id)
             return True
         except sqlite3.Error as e:
-            print(f"タスク保存エラー: {e}")
+            logger.error("タスク保存エラー: %s", e)
             return False
 
+    @timed("data_manager.get_all_schedules")
     def get_all_schedules(self):
         """すべての予定を取得します。"""
         if not self.conn:
-            print("データベース接続が確立されていないため、予定を取得できません。")
+            logger.warning("データベース接続が確立されていないため、予定を取得できません。")
             return []
         
-        self.cursor.execute("SELECT * FROM schedules ORDER BY start_datatime ASC")
+        cursor = self._read_cursor()
+        cursor.execute(SCHEDULE_SELECT.format(table="schedules") + "ORDER BY start_datatime ASC")
         #カラム名付きで結果を取得できるように、row_factoryを設定することもできるが、ここではタプルに返す
-        return self.cursor.fetchall()
+        return self._decode_schedules(cursor, cursor.fetchall())
     
-    def get_tasks_for_schedule(self, schedule_id):
-        """特定の予定に紐づくタスクを取得します。"""
+    @timed("data_manager.get_tasks_for_schedule")
+    def get_tasks_for_schedule(self, schedule_id, archived=False):
+        """特定の予定に紐づくタスクを取得します。
+
+        archived=True ならアーカイブ済みの予定のタスクをアーカイブDBから取得します。
+        """
         if not self.conn:
-            print("データベース接続が確立されていないため、タスクを取得できません。")
+            logger.warning("データベース接続が確立されていないため、タスクを取得できません。")
+            return []
+        
+        if not archived:
+            cursor = self._read_cursor()
+            cursor.execute("SELECT id, task_description, is_completed FROM tasks WHERE schedule_id = ?", (schedule_id,))
+            return cursor.fetchall()
+        cursor = self._read_cursor(with_archive=True)
+        if cursor is None or not cursor.execute("SELECT 1 FROM archive.sqlite_master WHERE name = 'tasks'").fetchone():
             return []
+        cursor.execute("SELECT id, task_description, is_completed FROM archive.tasks WHERE schedule_id = ?", (schedule_id,))
+        return cursor.fetchall()
+    
+    @timed("data_manager.get_task")
+    def get_task(self, task_id):
+        """タスクを1件取得します。(id, schedule_id, task_description, is_completed) を返します。"""
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、タスクを取得できません。")
+            return None
         
-        self.cursor.execute("SELECT id, task_description, is_completed FROM tasks WHERE schedule_id = ?", (schedule_id,))
-        return self.cursor.fetchall()
+        cursor = self._read_cursor()
+        cursor.execute("SELECT id, schedule_id, task_description, is_completed FROM tasks WHERE id = ?", (task_id,))
+        return cursor.fetchone()
     
+    @timed("data_manager.update_task_completion")
+    @_serialized_write
     def update_task_completion(self, task_id, is_completed):
         """タスクの完了状態を更新します。ロックされている場合は更新できません。"""
         if not self.conn:
-            print("データベース接続が確立されていないため、タスクの状態を更新できません。")
+            logger.warning("データベース接続が確立されていないため、タスクの状態を更新できません。")
             return False
         
         try:
-            # タスクに関連する予定IDを取得
-            self.cursor.execute("SELECT schedule_id FROM tasks WHERE id = ?", (task_id,))
-            result = self.cursor.fetchone()
-            if not result:
-                print(f"タスクID {task_id} が見つかりません。")
-                return False
-            
-            schedule_id = result[0]
-            
-            # 予定のロック状態を確認
-            self.cursor.execute("SELECT is_locked FROM schedules WHERE id = ?", (schedule_id,))
-            result = self.cursor.fetchone()
-            if not result:
-                print(f"予定ID {schedule_id} が見つかりません。")
-                return False
-            
-            if result[0] == 1:  # ロックされている場合
-                print(f"予定ID {schedule_id} はロックされているためタスクを更新できません。")
-                return False
-
+            # 予定がロックされていないことを UPDATE の条件に含め、1文で判定と更新を行う
             completed_at = datetime.now().isoformat() if is_completed else None
             self.cursor.execute('''
-                UPDATE tasks SET is_completed = ?, completed_at = ? WHERE id = ?
+                UPDATE tasks SET is_completed = ?, completed_at = ?
+                WHERE id = ? AND schedule_id IN (SELECT id FROM schedules WHERE is_locked = 0)
             ''', (1 if is_completed else 0, completed_at, task_id))
+            if self.cursor.rowcount == 0:
+                # 更新できなかった理由（タスク・予定が存在しない、ロック中）を調べる
+                self.cursor.execute("SELECT schedule_id FROM tasks WHERE id = ?", (task_id,))
+                result = self.cursor.fetchone()
+                if not result:
+                    self.last_error = "not_found"
+                    logger.warning("タスクID %s が見つかりません。", task_id)
+                else:
+                    self._explain_write_failure(result[0])
+                return False
             self.conn.commit()
-            print(f"タスクID {task_id} の完了状態を更新しました: {is_completed}")
+            logger.debug("タスクID %s の完了状態を更新しました: %s", task_id, is_completed)
             return True
         except sqlite3.Error as e:
-            print(f"タスク状態の更新エラー: {e}")
+            logger.error("タスク状態の更新エラー: %s", e)
             return False
     
-    def toggle_schedule_lock(self, schedule_id):
+    @timed("data_manager.toggle_schedule_lock")
+    @_serialized_write
+    def toggle_schedule_lock(self, schedule_id, expected_version=None):
         """予定のロック状態を切り替えます。"""
         if not self.conn:
-            print("データベース接続が確立されていないため、予定のロック状態を更新できません。")
+            logger.warning("データベース接続が確立されていないため、予定のロック状態を更新できません。")
             return False
         
         try:
-            # 現在のロック状態を確認
-            self.cursor.execute("SELECT is_locked FROM schedules WHERE id = ?", (schedule_id,))
-            result = self.cursor.fetchone()
-            if not result:
-                print(f"予定ID {schedule_id} が見つかりません。")
-                return False
-            
-            current_lock_state = result[0]
-            new_lock_state = 0 if current_lock_state else 1
-            
-            # ロック状態を反転
+            # ロック状態を1文で反転する（読み取りと書き込みの間に他のインスタンスが割り込めないように）
             self.cursor.execute('''
-                UPDATE schedules SET is_locked = ? WHERE id = ?
-            ''', (new_lock_state, schedule_id))
+                UPDATE schedules SET is_locked = 1 - is_locked, version = version + 1
+                WHERE id = ? AND (? IS NULL OR version = ?)
+            ''', (schedule_id, expected_version, expected_version))
+            if self.cursor.rowcount == 0:
+                self._explain_write_failure(schedule_id, expected_version)
+                return False
             self.conn.commit()
-            print(f"予定ID {schedule_id} のロック状態を更新しました: {new_lock_state}")
+            logger.debug("予定ID %s のロック状態を反転しました。", schedule_id)
             return True
         except sqlite3.Error as e:
-            print(f"予定ロック状態の更新エラー: {e}")
+            logger.error("予定ロック状態の更新エラー: %s", e)
             return False
     
-    def delete_schedule(self, schedule_id):
+    @timed("data_manager.delete_schedule")
+    @_serialized_write
+    def delete_schedule(self, schedule_id, expected_version=None):
         """予定を削除します。"""
         if not self.conn:
-            print("データベース接続が確立されていないため、予定を削除できません。")
+            logger.warning("データベース接続が確立されていないため、予定を削除できません。")
             return False
         
         try:
-            # ロック状態を確認
-            self.cursor.execute("SELECT is_locked FROM schedules WHERE id = ?", (schedule_id,))
-            result = self.cursor.fetchone()
-            if not result:
-                print(f"予定ID {schedule_id} が見つかりません。")
-                return False
-            
-            if result[0] == 1:  # ロックされている場合
-                print(f"予定ID {schedule_id} はロックされているため削除できません。")
-                return False
-            
+            # ロックされていない（かつ指定された版のままの）場合だけ削除する
             # 予定を削除（関連するタスクはON DELETE CASCADEで自動削除される）
-            self.cursor.execute("DELETE FROM schedules WHERE id = ?", (schedule_id,))
+            self.cursor.execute(
+                "DELETE FROM schedules WHERE id = ? AND is_locked = 0 AND (? IS NULL OR version = ?)",
+                (schedule_id, expected_version, expected_version),
+            )
+            if self.cursor.rowcount == 0:
+                self._explain_write_failure(schedule_id, expected_version)
+                return False
             self.conn.commit()
-            print(f"予定ID {schedule_id} を削除しました。")
+            logger.debug("予定ID %s を削除しました。", schedule_id)
             return True
         except sqlite3.Error as e:
-            print(f"予定削除エラー: {e}")
+            logger.error("予定削除エラー: %s", e)
             return False
 
+    @timed("data_manager.get_past_schedules")
     def get_past_schedules(self):
         """過去の予定を取得します。"""
         if not self.conn:
-            print("データベース接続が確立されていないため、過去の予定を取得できません。")
+            logger.warning("データベース接続が確立されていないため、過去の予定を取得できません。")
             return []
         
         current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.cursor.execute("""
-            SELECT * FROM schedules 
+        cursor = self._read_cursor()
+        cursor.execute(SCHEDULE_SELECT.format(table="schedules") + """
             WHERE end_datatime < ? 
             ORDER BY start_datatime DESC
         """, (current_datetime,))
-        return self.cursor.fetchall()
+        return self._decode_schedules(cursor, cursor.fetchall())
     
-    def get_current_schedules(self):
-        """現在および未来の予定を取得します。"""
+    @timed("data_manager.get_past_schedules_page")
+    def get_past_schedules_page(self, before=None, limit=200):
+        """過去の予定を開始日時の新しい順に最大 limit 件取得します（キーセットページング）。
+
+        before には前のページの最後の予定の (start_datatime, id) を渡します。
+        None の場合は最新の過去の予定から取得します。OFFSETを使わないため、何ページ目でも同じ速さで取得できます。
+        """
         if not self.conn:
-            print("データベース接続が確立されていないため、予定を取得できません。")
+            logger.warning("データベース接続が確立されていないため、過去の予定を取得できません。")
             return []
         
         current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.cursor.execute("""
-            SELECT * FROM schedules 
-            WHERE end_datatime >= ? 
-            ORDER BY start_datatime ASC
-        """, (current_datetime,))
-        return self.cursor.fetchall()
+        cursor = self._read_cursor()
+        if before is None:
+            cursor.execute(SCHEDULE_SELECT.format(table="schedules") + """
+                WHERE end_datatime < ?
+                ORDER BY start_datatime DESC, id DESC
+                LIMIT ?
+            """, (current_datetime, limit))
+        else:
+            cursor.execute(SCHEDULE_SELECT.format(table="schedules") + """
+                WHERE end_datatime < ? AND (start_datatime, id) < (?, ?)
+                ORDER BY start_datatime DESC, id DESC
+                LIMIT ?
+            """, (current_datetime, before[0], before[1], limit))
+        return self._decode_schedules(cursor, cursor.fetchall())
+    
+    @timed("data_manager.get_schedules_in_range")
+    def get_schedules_in_range(self, range_start, range_end, after=None, limit=-1):
+        """range_start から range_end までの期間に重なる予定を開始日時順に取得します（カレンダー表示用）。
+
+        日時は "YYYY-MM-DD HH:MM:SS" 形式の文字列で指定します。
+        after に前のページの最後の予定の (start_datatime, id) を渡すと、その次から最大 limit 件を返します（キーセットページング）。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、予定を取得できません。")
+            return []
         
+        cursor = self._read_cursor()
+        if after is None:
+            cursor.execute(SCHEDULE_SELECT.format(table="schedules") + """
+                WHERE start_datatime < ? AND end_datatime >= ?
+                ORDER BY start_datatime, id
+                LIMIT ?
+            """, (range_end, range_start, limit))
+        else:
+            cursor.execute(SCHEDULE_SELECT.format(table="schedules") + """
+                WHERE start_datatime < ? AND end_datatime >= ? AND (start_datatime, id) > (?, ?)
+                ORDER BY start_datatime, id
+                LIMIT ?
+            """, (range_end, range_start, after[0], after[1], limit))
+        return self._decode_schedules(cursor, cursor.fetchall())
+    
+    @timed("data_manager.get_current_schedules")
+    def get_current_schedules(self, now=None, until=None):
+        """現在および未来の予定を取得します。now を省略した場合は現在時刻を基準にします。
+
+        until（datetime）を指定した場合は、開始日時が until より前の予定だけを返します（通知の読み込む範囲）。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、予定を取得できません。")
+            return []
+        
+        current_datetime = (now or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+        cursor = self._read_cursor()
+        if until is None:
+            cursor.execute(SCHEDULE_SELECT.format(table="schedules") + """
+                WHERE end_datatime >= ?
+                ORDER BY start_datatime ASC
+            """, (current_datetime,))
+        else:
+            cursor.execute(SCHEDULE_SELECT.format(table="schedules") + """
+                WHERE end_datatime >= ? AND start_datatime < ?
+                ORDER BY start_datatime ASC
+            """, (current_datetime, until.strftime("%Y-%m-%d %H:%M:%S")))
+        return self._decode_schedules(cursor, cursor.fetchall())
+
+    @timed("data_manager.get_schedules_by_category")
+    def get_schedules_by_category(self, category, range_start=None, range_end=None):
+        """区分が category の予定を開始日時順に取得します。
+
+        range_start / range_end を指定した場合は、開始日時がその範囲（range_end は含まない）の予定だけを返します。
+        idx_schedules_category で該当する区分・期間の行だけを読みます。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、予定を取得できません。")
+            return []
+
+        conditions = ["category_id = (SELECT id FROM categories WHERE name = ?)"]
+        params = [category]
+        if range_start is not None:
+            conditions.append("start_datatime >= ?")
+            params.append(range_start)
+        if range_end is not None:
+            conditions.append("start_datatime < ?")
+            params.append(range_end)
+        cursor = self._read_cursor()
+        cursor.execute(
+            SCHEDULE_SELECT.format(table="schedules") + f"WHERE {' AND '.join(conditions)} ORDER BY start_datatime, id",
+            params,
+        )
+        return self._decode_schedules(cursor, cursor.fetchall())
+
+    @timed("data_manager.get_category_summary")
+    def get_category_summary(self, range_start=None, range_end=None):
+        """区分ごとの予定の件数・合計時間（分）・完了した件数を、件数の多い順に返します。
+
+        (区分, 件数, 合計時間, 完了件数) のリストを返します。range_start / range_end は get_schedules_by_category と同じです。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、区分ごとの集計を取得できません。")
+            return []
+
+        conditions = ["category_id IS NOT NULL"]
+        params = []
+        if range_start is not None:
+            conditions.append("start_datatime >= ?")
+            params.append(range_start)
+        if range_end is not None:
+            conditions.append("start_datatime < ?")
+            params.append(range_end)
+        try:
+            cursor = self._read_cursor()
+            # 区分IDごとに集計してから名前を付ける（idx_schedules_category の順に区分ごとにまとめて読める）
+            cursor.execute(f'''
+                SELECT categories.name, totals.count, totals.minutes, totals.completed
+                FROM (
+                    SELECT category_id, COUNT(*) AS count,
+                           CAST(ROUND(SUM(julianday(end_datatime) - julianday(start_datatime)) * 1440) AS INTEGER) AS minutes,
+                           SUM(is_completed) AS completed
+                    FROM schedules WHERE {' AND '.join(conditions)} GROUP BY category_id
+                ) AS totals
+                JOIN categories ON categories.id = totals.category_id
+                ORDER BY totals.count DESC, categories.name
+            ''', params)
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error("区分ごとの集計エラー: %s", e)
+            return []
+
+    @timed("data_manager.update_schedule_completion")
+    @_serialized_write
     def update_schedule_completion(self, schedule_id, is_completed):
         """予定の完了状態を更新します。"""
         if not self.conn:
-            print("データベース接続が確立されていないため、予定の状態を更新できません。")
+            logger.warning("データベース接続が確立されていないため、予定の状態を更新できません。")
             return False
             
         try:
-            # ロック状態を確認
-            self.cursor.execute("SELECT is_locked FROM schedules WHERE id = ?", (schedule_id,))
-            result = self.cursor.fetchone()
-            if not result:
-                print(f"予定ID {schedule_id} が見つかりません。")
-                return False
-                
-            if result[0] == 1:  # ロックされている場合
-                print(f"予定ID {schedule_id} はロックされているため更新できません。")
-                return False
-                
+            # ロック状態の確認を UPDATE の条件に含め、1文で判定と更新を行う
             completed_at = datetime.now().isoformat() if is_completed else None
             self.cursor.execute('''
-                UPDATE schedules SET is_completed = ?, completed_at = ? WHERE id = ?
+                UPDATE schedules SET is_completed = ?, completed_at = ?, version = version + 1
+                WHERE id = ? AND is_locked = 0
             ''', (1 if is_completed else 0, completed_at, schedule_id))
+            if self.cursor.rowcount == 0:
+                self._explain_write_failure(schedule_id)
+                return False
             self.conn.commit()
-            print(f"予定ID {schedule_id} の完了状態を更新しました: {is_completed}")
+            logger.debug("予定ID %s の完了状態を更新しました: %s", schedule_id, is_completed)
             return True
         except sqlite3.Error as e:
-            print(f"予定状態の更新エラー: {e}")
+            logger.error("予定状態の更新エラー: %s", e)
             return False
             
+    @timed("data_manager.get_schedule_completion_status")
     def get_schedule_completion_status(self, schedule_id):
         """予定の完了状態を取得します。"""
         if not self.conn:
-            print("データベース接続が確立されていないため、予定の状態を取得できません。")
+            logger.warning("データベース接続が確立されていないため、予定の状態を取得できません。")
             return None
             
         try:
-            self.cursor.execute("SELECT is_completed FROM schedules WHERE id = ?", (schedule_id,))
-            result = self.cursor.fetchone()
+            cursor = self._read_cursor()
+            cursor.execute("SELECT is_completed FROM schedules WHERE id = ?", (schedule_id,))
+            result = cursor.fetchone()
             if not result:
-                print(f"予定ID {schedule_id} が見つかりません。")
+                logger.warning("予定ID %s が見つかりません。", schedule_id)
                 return None
                 
             return bool(result[0])
         except sqlite3.Error as e:
-            print(f"予定状態の取得エラー: {e}")
+            logger.error("予定状態の取得エラー: %s", e)
             return None
 
+    @timed("data_manager.shift_schedules")
+    @_serialized_write
+    def shift_schedules(self, schedule_ids, minutes):
+        """複数の予定の開始・終了日時を minutes 分ずらします（ロック中の予定は変更しません）。
+
+        1つのUPDATE文で処理し、変更した予定の件数を返します。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、予定を変更できません。")
+            return 0
+        
+        modifier = f"{int(minutes):+d} minutes"
+        try:
+            self.cursor.execute(f'''
+                UPDATE schedules
+                SET start_datatime = datetime(start_datatime, ?), end_datatime = datetime(end_datatime, ?),
+                    version = version + 1
+                WHERE id IN ({IDS_SUBQUERY}) AND is_locked = 0
+            ''', (modifier, modifier, json.dumps(list(schedule_ids))))
+            count = self.cursor.rowcount
+            self.conn.commit()
+            logger.debug("%s件の予定を%s分ずらしました。", count, minutes)
+            return count
+        except sqlite3.Error as e:
+            logger.error("予定の一括変更エラー: %s", e)
+            return 0
+
+    @timed("data_manager.set_schedules_completion")
+    @_serialized_write
+    def set_schedules_completion(self, schedule_ids, is_completed):
+        """複数の予定の完了状態をまとめて更新します（ロック中の予定は変更しません）。変更した件数を返します。"""
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、予定の状態を更新できません。")
+            return 0
+        
+        completed_at = datetime.now().isoformat() if is_completed else None
+        try:
+            self.cursor.execute(f'''
+                UPDATE schedules SET is_completed = ?, completed_at = ?, version = version + 1
+                WHERE id IN ({IDS_SUBQUERY}) AND is_locked = 0
+            ''', (1 if is_completed else 0, completed_at, json.dumps(list(schedule_ids))))
+            count = self.cursor.rowcount
+            self.conn.commit()
+            logger.debug("%s件の予定の完了状態を更新しました: %s", count, is_completed)
+            return count
+        except sqlite3.Error as e:
+            logger.error("予定状態の一括更新エラー: %s", e)
+            return 0
+
+    @timed("data_manager.set_schedules_lock")
+    @_serialized_write
+    def set_schedules_lock(self, schedule_ids, is_locked):
+        """複数の予定をまとめてロック/ロック解除します。状態が変わった件数を返します。"""
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、予定のロック状態を変更できません。")
+            return 0
+        
+        value = 1 if is_locked else 0
+        try:
+            self.cursor.execute(f'''
+                UPDATE schedules SET is_locked = ?, version = version + 1
+                WHERE id IN ({IDS_SUBQUERY}) AND is_locked != ?
+            ''', (value, json.dumps(list(schedule_ids)), value))
+            count = self.cursor.rowcount
+            self.conn.commit()
+            logger.debug("%s件の予定のロック状態を変更しました: %s", count, is_locked)
+            return count
+        except sqlite3.Error as e:
+            logger.error("ロック状態の一括変更エラー: %s", e)
+            return 0
+
+    @timed("data_manager.delete_schedules")
+    @_serialized_write
+    def delete_schedules(self, schedule_ids):
+        """複数の予定とそのタスクをまとめて削除します（ロック中の予定は削除しません）。削除した予定の件数を返します。"""
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、予定を削除できません。")
+            return 0
+        
+        ids = json.dumps(list(schedule_ids))
+        try:
+            # 関連するタスクはON DELETE CASCADEで同じ文の中で削除される
+            self.cursor.execute(f"DELETE FROM schedules WHERE id IN ({IDS_SUBQUERY}) AND is_locked = 0", (ids,))
+            count = self.cursor.rowcount
+            self.conn.commit()
+            logger.debug("%s件の予定を削除しました。", count)
+            return count
+        except sqlite3.Error as e:
+            logger.error("予定の一括削除エラー: %s", e)
+            return 0
+
+    @timed("data_manager.save_planned_schedules")
+    @_serialized_write
+    def save_planned_schedules(self, entries, check_overlap=True):
+        """複数の予定とそのタスクを1つのトランザクションで保存し、予定IDのリストを返します。
+
+        entries は save_schedule の引数名（title, start_dt, end_dt, ...）と tasks をキーに持つ辞書のリストです。
+        check_overlap=True の場合、保存する予定が登録済みの予定や互いに重なるときは何も保存せずに None を返します
+        （自動スケジューラの計画後に他のインスタンスが予定を登録した場合など。last_error は "conflict"）。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、予定を保存できません。")
+            return None
+        if not entries:
+            return []
+        
+        try:
+            if check_overlap:
+                conflict = self._find_planned_overlap(entries)
+                if conflict:
+                    self.last_error = "conflict"
+                    logger.warning("予定「%s」(%s - %s) の時間帯には他の予定が登録されています。",
+                                   conflict["title"], conflict["start_dt"], conflict["end_dt"])
+                    return None
+            
+            created_at = datetime.now().isoformat()
+            schedule_ids = []
+            for entry in entries:
+                category_id, location_id = self._lookup_ids(entry.get("category"), entry.get("location"))
+                self.cursor.execute('''
+                    INSERT INTO schedules (title, start_datatime, end_datatime, category_id, location_id, created_at,
+                                           notification_minutes, task_notification_minutes)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (entry["title"], entry["start_dt"], entry["end_dt"], category_id, location_id,
+                      created_at, entry.get("notification_minutes"), entry.get("task_notification_minutes")))
+                schedule_id = self.cursor.lastrowid
+                self._save_description(schedule_id, entry.get("description"))
+                self.cursor.executemany(
+                    "INSERT INTO tasks (schedule_id, task_description, is_completed) VALUES (?, ?, 0)",
+                    [(schedule_id, task) for task in entry.get("tasks", ())],
+                )
+                schedule_ids.append(schedule_id)
+            self.conn.commit()
+            logger.debug("%s件の予定をまとめて保存しました。", len(schedule_ids))
+            return schedule_ids
+        except sqlite3.Error as e:
+            logger.error("予定の一括保存エラー: %s", e)
+            return None
+
+    def _find_planned_overlap(self, entries):
+        """保存しようとしている予定のうち、登録済みの予定か他の保存する予定と重なる最初のものを返します。"""
+        range_start = min(entry["start_dt"] for entry in entries)
+        range_end = max(entry["end_dt"] for entry in entries)
+        self.cursor.execute(
+            "SELECT start_datatime, end_datatime FROM schedules WHERE start_datatime < ? AND end_datatime > ?",
+            (range_end, range_start),
+        )
+        intervals = [(start, end, None) for start, end in self.cursor.fetchall()]
+        intervals += [(entry["start_dt"], entry["end_dt"], entry) for entry in entries]
+        intervals.sort(key=lambda interval: interval[:2])
+        # 開始順に走査し、これまでで最も遅く終わる登録済みの予定・保存する予定と比べる
+        existing_end = planned_end = ""
+        planned_entry = None
+        for start, end, entry in intervals:
+            if entry is not None and start < max(existing_end, planned_end):
+                return entry
+            if entry is None and start < planned_end:
+                return planned_entry
+            if entry is None:
+                existing_end = max(existing_end, end)
+            elif end > planned_end:
+                planned_end, planned_entry = end, entry
+        return None
+
+    @timed("data_manager.save_template")
+    @_serialized_write
+    def save_template(self, name, title, category, location, description, tasks,
+                      notification_minutes=None, task_notification_minutes=None):
+        """予定のテンプレートを保存します（同じ名前のテンプレートは上書き）。テンプレートのIDを返します。"""
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、テンプレートを保存できません。")
+            return None
+        
+        try:
+            self.cursor.execute('''
+                INSERT INTO schedule_templates (name, title, category, location, description, tasks,
+                                                notification_minutes, task_notification_minutes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    title = excluded.title, category = excluded.category, location = excluded.location,
+                    description = excluded.description, tasks = excluded.tasks,
+                    notification_minutes = excluded.notification_minutes,
+                    task_notification_minutes = excluded.task_notification_minutes
+            ''', (name, title, category, location, description, "\n".join(tasks),
+                  notification_minutes, task_notification_minutes))
+            self.cursor.execute("SELECT id FROM schedule_templates WHERE name = ?", (name,))
+            template_id = self.cursor.fetchone()[0]
+            self.conn.commit()
+            logger.debug("テンプレート「%s」を保存しました。", name)
+            return template_id
+        except sqlite3.Error as e:
+            logger.error("テンプレート保存エラー: %s", e)
+            return None
+
+    @timed("data_manager.get_templates")
+    def get_templates(self):
+        """テンプレートを名前順に取得します。
+
+        (id, name, title, category, location, description, tasks のリスト, notification_minutes,
+        task_notification_minutes) のリストを返します。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、テンプレートを取得できません。")
+            return []
+        
+        cursor = self._read_cursor()
+        cursor.execute('''
+            SELECT id, name, title, category, location, description, tasks, notification_minutes, task_notification_minutes
+            FROM schedule_templates ORDER BY name
+        ''')
+        return [
+            row[:6] + ([task for task in (row[6] or "").split("\n") if task],) + row[7:]
+            for row in cursor.fetchall()
+        ]
+
+    @timed("data_manager.get_completion_frequencies")
+    def get_completion_frequencies(self):
+        """入力補完用に、登録済みのタイトル・場所・タスクと、それぞれが使われた回数を返します。
+
+        {"title": [(文字列, 回数), ...], "location": [...], "task": [...]} の辞書を返します。
+        自動で追加される「スケジュールの開始」「スケジュールの終了」タスクは含めません。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、入力補完の候補を取得できません。")
+            return {}
+        
+        try:
+            cursor = self._read_cursor()
+            return {
+                "title": cursor.execute(
+                    "SELECT title, COUNT(*) FROM schedules GROUP BY title"
+                ).fetchall(),
+                "location": cursor.execute('''
+                    SELECT locations.name, COUNT(*) FROM schedules JOIN locations ON locations.id = schedules.location_id
+                    WHERE locations.name != '' GROUP BY locations.id
+                ''').fetchall(),
+                "task": cursor.execute(
+                    "SELECT task_description, COUNT(*) FROM tasks WHERE task_description NOT IN (?, ?) GROUP BY task_description",
+                    ("スケジュールの開始", "スケジュールの終了"),
+                ).fetchall(),
+            }
+        except sqlite3.Error as e:
+            logger.error("入力補完の候補の取得エラー: %s", e)
+            return {}
+
+    @timed("data_manager.delete_template")
+    @_serialized_write
+    def delete_template(self, template_id):
+        """テンプレートを削除します。"""
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、テンプレートを削除できません。")
+            return False
+        
+        try:
+            self.cursor.execute("DELETE FROM schedule_templates WHERE id = ?", (template_id,))
+            if self.cursor.rowcount == 0:
+                self.last_error = "not_found"
+                return False
+            self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            logger.error("テンプレート削除エラー: %s", e)
+            return False
+
+    def add_attachment(self, schedule_id, file_path):
+        """ファイルを予定に添付し、添付ファイルのIDを返します。ロック中の予定には添付できません。
+
+        ファイルは ATTACHMENT_CHUNK_SIZE ずつ読み、同じ内容がすでに保存されていれば内容は保存しません。
+        失敗した場合は None を返します（予定がない・ロック中の場合は last_error に理由が入ります）。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、ファイルを添付できません。")
+            return None
+        
+        # 書き込みロックを取得する前にハッシュを求めておき、ロックを持つ時間を内容のコピーだけにする
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(ATTACHMENT_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    size += len(chunk)
+        except OSError as e:
+            logger.error("添付するファイルを読み込めません: %s", e)
+            return None
+        return self._insert_attachment(schedule_id, file_path, digest.hexdigest(), size)
+
+    @timed("data_manager.insert_attachment")
+    @_serialized_write
+    def _insert_attachment(self, schedule_id, file_path, blob_hash, size):
+        try:
+            self.cursor.execute("SELECT is_locked FROM schedules WHERE id = ?", (schedule_id,))
+            row = self.cursor.fetchone()
+            if row is None or row[0] == 1:
+                self.last_error = "not_found" if row is None else "locked"
+                logger.warning("予定ID %s にはファイルを添付できません（%s）。", schedule_id, self.last_error)
+                return None
+            if size > self.conn.getlimit(sqlite3.SQLITE_LIMIT_LENGTH):
+                logger.error("添付するファイルが大きすぎます: %s バイト", size)
+                return None
+            
+            self.cursor.execute(
+                "INSERT OR IGNORE INTO attachment_blobs (hash, size, data) VALUES (?, ?, zeroblob(?))",
+                (blob_hash, size, size),
+            )
+            if self.cursor.rowcount:
+                # 領域だけ確保した BLOB にファイルを少しずつ書き込み、書き込んだ内容のハッシュも確かめる
+                digest = hashlib.sha256()
+                with open(file_path, "rb") as f, self.conn.blobopen("attachment_blobs", "data", self.cursor.lastrowid) as blob:
+                    for chunk in iter(lambda: f.read(min(ATTACHMENT_CHUNK_SIZE, size - blob.tell())), b""):
+                        blob.write(chunk)
+                        digest.update(chunk)
+                if blob_hash != digest.hexdigest():
+                    logger.error("添付するファイルが読み込み中に変更されました: %s", file_path)
+                    return None
+            
+            self.cursor.execute(
+                "INSERT INTO attachments (schedule_id, blob_hash, filename, size, created_at) VALUES (?, ?, ?, ?, ?)",
+                (schedule_id, blob_hash, os.path.basename(file_path), size, datetime.now().isoformat()),
+            )
+            attachment_id = self.cursor.lastrowid
+            self.conn.commit()
+            logger.debug("予定ID%sにファイル'%s'を添付しました。", schedule_id, file_path)
+            return attachment_id
+        except (sqlite3.Error, OSError) as e:
+            logger.error("ファイル添付エラー: %s", e)
+            return None
+
+    @timed("data_manager.get_attachments")
+    def get_attachments(self, schedule_id, archived=False):
+        """予定の添付ファイルを (id, filename, size, created_at) のリストで返します（内容は読み込みません）。
+
+        archived=True ならアーカイブ済みの予定の添付ファイルを返します。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、添付ファイルを取得できません。")
+            return []
+        
+        try:
+            cursor = self._read_cursor(with_archive=archived)
+            if cursor is None:
+                return []
+            if archived and not cursor.execute(
+                "SELECT 1 FROM archive.sqlite_master WHERE name = 'attachments'"
+            ).fetchone():
+                return []  # 添付ファイルを追加する前に作られたアーカイブ
+            table = "archive.attachments" if archived else "main.attachments"
+            cursor.execute(f"SELECT id, filename, size, created_at FROM {table} WHERE schedule_id = ? ORDER BY id", (schedule_id,))
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error("添付ファイルの取得エラー: %s", e)
+            return []
+
+    @timed("data_manager.get_schedule_descriptions")
+    def get_schedule_descriptions(self, schedule_ids, archived=False):
+        """予定IDのリストの詳細内容を {予定ID: 詳細内容} の辞書で返します（詳細内容がない予定は含まない）。
+
+        archived=True ならアーカイブ済みの予定の詳細内容を返します。schedule_texts に移す前の予定は予定の行から読みます。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、詳細内容を取得できません。")
+            return {}
+        
+        try:
+            cursor = self._read_cursor(with_archive=archived)
+            if cursor is None:
+                return {}
+            schema = "archive" if archived else "main"
+            ids = json.dumps(list(schedule_ids))
+            if archived and not cursor.execute(
+                "SELECT 1 FROM archive.sqlite_master WHERE name = 'schedule_texts'"
+            ).fetchone():
+                # 詳細内容を分ける前に作られたアーカイブは予定の行にだけ保存されている
+                cursor.execute(f"SELECT id, NULL, 0, description FROM archive.schedules WHERE id IN ({IDS_SUBQUERY})", (ids,))
+            else:
+                cursor.execute(f'''
+                    SELECT s.id, t.description, t.compressed, s.description
+                    FROM {schema}.schedules AS s LEFT JOIN {schema}.schedule_texts AS t ON t.schedule_id = s.id
+                    WHERE s.id IN ({IDS_SUBQUERY})
+                ''', (ids,))
+            descriptions = {}
+            for schedule_id, value, compressed, inline in cursor.fetchall():
+                description = inline if value is None else _decode_description(value, compressed)
+                if description is not None:
+                    descriptions[schedule_id] = description
+            return descriptions
+        except (sqlite3.Error, zlib.error, UnicodeDecodeError) as e:
+            logger.error("詳細内容の取得エラー: %s", e)
+            return {}
+
+    def get_schedule_description(self, schedule_id, archived=False):
+        """予定の詳細内容を返します（ない場合は None）。一覧では読まないため、選択した予定の詳細を表示するときに使います。"""
+        return self.get_schedule_descriptions([schedule_id], archived).get(schedule_id)
+
+    def fill_descriptions(self, schedules, archived=False):
+        """get_*_schedules で読んだ予定のタプルに、詳細内容を1回のクエリでまとめて読んで入れたリストを返します。"""
+        if not schedules:
+            return schedules
+        descriptions = self.get_schedule_descriptions([schedule[0] for schedule in schedules], archived)
+        return [schedule[:6] + (descriptions.get(schedule[0]),) + schedule[7:] for schedule in schedules]
+
+    @timed("data_manager.export_attachment")
+    def export_attachment(self, attachment_id, dest_path, archived=False):
+        """添付ファイルの内容を dest_path に書き出します。成功した場合は True を返します。
+
+        内容は blobopen で ATTACHMENT_CHUNK_SIZE ずつ読み、一時ファイルに書いてから置き換えます。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、添付ファイルを書き出せません。")
+            return False
+        
+        schema = "archive" if archived else "main"
+        tmp_path = f"{dest_path}.partial"
+        try:
+            cursor = self._read_cursor(with_archive=archived)
+            if cursor is None:
+                return False
+            cursor.execute(f'''
+                SELECT attachment_blobs.rowid FROM {schema}.attachments
+                JOIN {schema}.attachment_blobs ON attachment_blobs.hash = attachments.blob_hash
+                WHERE attachments.id = ?
+            ''', (attachment_id,))
+            row = cursor.fetchone()
+            if row is None:
+                logger.warning("添付ファイルID %s が見つかりません。", attachment_id)
+                return False
+            with cursor.connection.blobopen("attachment_blobs", "data", row[0], readonly=True, name=schema) as blob, \
+                    open(tmp_path, "wb") as f:
+                for chunk in iter(lambda: blob.read(ATTACHMENT_CHUNK_SIZE), b""):
+                    f.write(chunk)
+            os.replace(tmp_path, dest_path)
+            return True
+        except (sqlite3.Error, OSError) as e:
+            logger.error("添付ファイルの書き出しエラー: %s", e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+    @timed("data_manager.delete_attachment")
+    @_serialized_write
+    def delete_attachment(self, attachment_id):
+        """添付ファイルを削除します（ロック中の予定の添付ファイルは削除できません）。
+
+        他の添付ファイルから参照されていない内容はトリガーで一緒に削除されます。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、添付ファイルを削除できません。")
+            return False
+        
+        try:
+            self.cursor.execute('''
+                DELETE FROM attachments
+                WHERE id = ? AND schedule_id IN (SELECT id FROM schedules WHERE is_locked = 0)
+            ''', (attachment_id,))
+            if self.cursor.rowcount == 0:
+                self.cursor.execute("SELECT schedule_id FROM attachments WHERE id = ?", (attachment_id,))
+                row = self.cursor.fetchone()
+                self.last_error = "locked" if row else "not_found"
+                return False
+            self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            logger.error("添付ファイルの削除エラー: %s", e)
+            return False
+
+    def _attach_archive(self):
+        """書き込み用の接続にアーカイブDBをATTACHし、テーブル構成を本体に合わせます。"""
+        if self._archive_attached:
+            return
+        self.conn.execute("ATTACH DATABASE ? AS archive", (self.archive_path,))
+        self._archive_attached = True
+        for table in ("schedules", "tasks", "schedule_texts", "attachments", "attachment_blobs"):
+            main_columns = [(c[1], c[2]) for c in self.conn.execute(f"PRAGMA main.table_info({table})")]
+            archive_columns = {c[1] for c in self.conn.execute(f"PRAGMA archive.table_info({table})")}
+            if not archive_columns:
+                # 本体と同じカラム構成の空テーブルを作成（制約は不要なのでCREATE TABLE ASで複製）
+                self.conn.execute(f"CREATE TABLE archive.{table} AS SELECT * FROM main.{table} WHERE 0")
+            else:
+                # 本体側のマイグレーションで増えたカラムをアーカイブにも追加
+                for name, column_type in main_columns:
+                    if name not in archive_columns:
+                        self.conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {name} {column_type}")
+        self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS archive.idx_archive_schedules_id ON schedules(id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_schedules_start ON schedules(start_datatime, id)")
+        self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS archive.idx_archive_tasks_id ON tasks(id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_tasks_schedule ON tasks(schedule_id)")
+        self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS archive.idx_archive_schedule_texts_id ON schedule_texts(schedule_id)")
+        self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS archive.idx_archive_attachments_id ON attachments(id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_attachments_schedule ON attachments(schedule_id)")
+        self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS archive.idx_archive_attachment_blobs_hash ON attachment_blobs(hash)")
+        self.conn.commit()
+
+    def archive_past_schedules(self, horizon_days=365, batch_size=500):
+        """終了から horizon_days 日以上経った予定とそのタスクをアーカイブDBに移します。
+
+        batch_size 件ずつ別のトランザクションで移すため、大量の予定があってもGUIの書き込みを長く止めません。
+        移した予定の件数を返します。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、予定をアーカイブできません。")
+            return 0
+        
+        cutoff = (datetime.now() - timedelta(days=horizon_days)).strftime("%Y-%m-%d %H:%M:%S")
+        total = 0
+        while True:
+            moved = self._archive_batch(cutoff, batch_size)
+            if not moved:
+                break
+            total += moved
+        logger.info("%s件の予定をアーカイブに移しました（%s より前に終了した予定）。", total, cutoff)
+        return total
+
+    @timed("data_manager.archive_batch")
+    @_serialized_write
+    def _archive_batch(self, cutoff, batch_size):
+        """アーカイブ対象の予定を最大 batch_size 件移し、移した件数を返します。"""
+        try:
+            self._attach_archive()
+            self.cursor.execute(
+                "SELECT id FROM main.schedules WHERE end_datatime < ? ORDER BY end_datatime LIMIT ?",
+                (cutoff, batch_size),
+            )
+            ids = [row[0] for row in self.cursor.fetchall()]
+            if not ids:
+                return 0
+            
+            placeholders = ",".join("?" * len(ids))
+            # 添付ファイルの内容は、移す予定の添付ファイルが参照しているものをコピーする（アーカイブ側で重複しない）
+            self.cursor.execute(f'''
+                INSERT OR IGNORE INTO archive.attachment_blobs (hash, size, data)
+                SELECT hash, size, data FROM main.attachment_blobs
+                WHERE hash IN (SELECT blob_hash FROM main.attachments WHERE schedule_id IN ({placeholders}))
+            ''', ids)
+            for table, key in (("schedules", "id"), ("tasks", "schedule_id"), ("schedule_texts", "schedule_id"),
+                               ("attachments", "schedule_id")):
+                columns = ", ".join(c[1] for c in self.cursor.execute(f"PRAGMA main.table_info({table})").fetchall())
+                # 途中で中断して本体とアーカイブの両方に残った行があっても、再実行で上書きできるようにする
+                self.cursor.execute(
+                    f"INSERT OR REPLACE INTO archive.{table} ({columns}) SELECT {columns} FROM main.{table} WHERE {key} IN ({placeholders})",
+                    ids,
+                )
+            # 詳細内容と添付ファイルはカスケード削除され、参照されなくなった内容もトリガーで削除される
+            self.cursor.execute(f"DELETE FROM main.tasks WHERE schedule_id IN ({placeholders})", ids)
+            self.cursor.execute(f"DELETE FROM main.schedules WHERE id IN ({placeholders})", ids)
+            self.conn.commit()
+            return len(ids)
+        except sqlite3.Error as e:
+            logger.error("アーカイブエラー: %s", e)
+            return 0
+
+    @timed("data_manager.get_archived_schedules")
+    def get_archived_schedules(self, before=None, limit=200):
+        """アーカイブ済みの予定を開始日時の新しい順に最大 limit 件取得します。
+
+        before は get_past_schedules_page と同じく前のページの最後の予定の (start_datatime, id) です。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、アーカイブ済みの予定を取得できません。")
+            return []
+        
+        cursor = self._read_cursor(with_archive=True)
+        if cursor is None or not cursor.execute(
+            "SELECT 1 FROM archive.sqlite_master WHERE name = 'schedules'"
+        ).fetchone():
+            return []
+        if not any(column[1] == "category_id" for column in cursor.execute("PRAGMA archive.table_info(schedules)")):
+            # 区分・場所のIDを追加する前に作られたアーカイブは、書き込み用の接続でカラム構成を本体に合わせる
+            with self._write_lock:
+                self._attach_archive()
+        if before is None:
+            cursor.execute(SCHEDULE_SELECT.format(table="archive.schedules") + """
+                ORDER BY start_datatime DESC, id DESC
+                LIMIT ?
+            """, (limit,))
+        else:
+            cursor.execute(SCHEDULE_SELECT.format(table="archive.schedules") + """
+                WHERE (start_datatime, id) < (?, ?)
+                ORDER BY start_datatime DESC, id DESC
+                LIMIT ?
+            """, (before[0], before[1], limit))
+        return self._decode_schedules(cursor, cursor.fetchall())
+
+    @timed("data_manager.restore_from_file")
+    def restore_from_file(self, source_path, pages=STEP_PAGES, progress=None):
+        """source_path のDB（バックアップ）の内容でこのDBを置き換えます。成功した場合は True を返します。
+
+        まず書き込みロックを持たずに一時ファイルへ pages ページずつコピーし（ステップの間は待つ）、
+        その後ロックを持って一時ファイルから書き込み用の接続へ待たずに一度でコピーします。
+        他の接続はDBを開いたままでよく、コピーが終わった時点で復元した内容が見えるようになります。
+        progress は backup.copy_pages と同じで、一時ファイルへのコピーの進み具合を返します。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、バックアップから復元できません。")
+            return False
+
+        fd, staging_path = tempfile.mkstemp(suffix=".restore", dir=os.path.dirname(self.db_path))
+        os.close(fd)
+        source = staging = None
+        try:
+            source = sqlite3.connect(source_path)
+            source.execute("PRAGMA query_only=ON")
+            staging = sqlite3.connect(staging_path)
+            page_count = copy_pages(source, staging, pages, progress=progress)
+            source.close()
+            source = None
+            with self._write_lock:
+                try:
+                    # 書き込み用の接続はコピー中に他のスレッドから使えないため、ステップの間で待たない
+                    copy_pages(staging, self.conn, -1, sleep=0)
+                finally:
+                    self.write_generation += 1
+                # 復元したDBでは区分・場所のIDが別の名前を指している場合がある
+                self._lookup_names = {table: {} for table in LOOKUP_TABLES.values()}
+        except sqlite3.Error as e:
+            logger.error("復元エラー: %s", e)
+            return False
+        finally:
+            for conn in (source, staging):
+                if conn is not None:
+                    conn.close()
+            for path in (staging_path, staging_path + "-wal", staging_path + "-shm"):
+                if os.path.exists(path):
+                    os.remove(path)
+        # 以前のバージョンで作成したバックアップなら、テーブルとカラムをこのバージョンに合わせる
+        self._create_tables()
+        logger.info("バックアップから復元しました: %s（%sページ）", source_path, page_count)
+        return True
+
+    def compact_database(self, pages=None):
+        """削除で空いた領域をファイルから解放します。
+
+        auto_vacuum が INCREMENTAL の場合は PRAGMA incremental_vacuum で pages ページずつ（None なら全部）解放し、
+        そうでない場合は INCREMENTAL に切り替えてから VACUUM します（次回以降は incremental_vacuum で済みます）。
+        解放前後のファイルサイズ（DBファイルとWALファイルの合計、バイト）を返します。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、領域を解放できません。")
+            return None
+        
+        with self._write_lock:
+            size_before = self._database_size()
+            try:
+                auto_vacuum = self.conn.execute("PRAGMA main.auto_vacuum").fetchone()[0]
+                if auto_vacuum == 2:  # INCREMENTAL
+                    if pages is None:
+                        self.conn.execute("PRAGMA main.incremental_vacuum").fetchall()
+                    else:
+                        self.conn.execute(f"PRAGMA main.incremental_vacuum({int(pages)})").fetchall()
+                    self.conn.commit()
+                else:
+                    self.conn.execute("PRAGMA main.auto_vacuum = INCREMENTAL")
+                    self.conn.execute("VACUUM main")
+                # WALに残っている内容をDBファイルに書き戻し、WALファイルも切り詰める
+                self.conn.execute("PRAGMA main.wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error as e:
+                logger.error("領域解放エラー: %s", e)
+                return None
+        size_after = self._database_size()
+        logger.info("データベースの領域を解放しました: %s -> %s バイト", size_before, size_after)
+        return size_before, size_after
+
+    def _database_size(self):
+        """DBファイルとWALファイル（WALモードでコミット済みでもDBファイルに書き戻していない内容）の合計サイズを返します。"""
+        size = os.path.getsize(self.db_path)
+        wal_path = self.db_path + "-wal"
+        if os.path.exists(wal_path):
+            size += os.path.getsize(wal_path)
+        return size
+
+    def remove_orphan_tasks(self, batch_size=1000):
+        """予定が存在しないタスクを batch_size 件ずつ別のトランザクションで削除し、削除した件数を返します。
+
+        途中で失敗した場合はそこで止め、last_error を "error" にします。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、孤立したタスクを削除できません。")
+            return 0
+        
+        total = 0
+        while True:
+            removed = self._remove_orphan_batch(batch_size)
+            if not removed:
+                break
+            total += removed
+        if total:
+            logger.info("%s件の孤立したタスクを削除しました。", total)
+        return total
+
+    @timed("data_manager.remove_orphan_batch")
+    @_serialized_write
+    def _remove_orphan_batch(self, batch_size):
+        """孤立したタスクを最大 batch_size 件削除し、削除した件数を返します。"""
+        try:
+            self.cursor.execute('''
+                DELETE FROM main.tasks WHERE id IN (
+                    SELECT id FROM main.tasks
+                    WHERE schedule_id NOT IN (SELECT id FROM main.schedules)
+                    LIMIT ?
+                )
+            ''', (batch_size,))
+            removed = self.cursor.rowcount
+            self.conn.commit()
+            return removed
+        except sqlite3.Error as e:
+            self.last_error = "error"
+            logger.error("孤立タスクの削除エラー: %s", e)
+            return 0
+
+    @timed("data_manager.check_integrity")
+    def check_integrity(self, full=False):
+        """データベースの整合性を調べ、結果を辞書で返します。
+
+        full=True なら PRAGMA integrity_check、そうでなければ軽い quick_check を実行します。
+        "integrity" は問題がなければ ["ok"]、"foreign_key_violations" は PRAGMA foreign_key_check の件数、
+        "orphan_tasks" は予定が存在しないタスクの件数です。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、整合性を確認できません。")
+            return None
+        
+        with self._write_lock:
+            try:
+                check = "integrity_check" if full else "quick_check"
+                integrity = [row[0] for row in self.conn.execute(f"PRAGMA main.{check}")]
+                violations = len(self.conn.execute("PRAGMA main.foreign_key_check").fetchall())
+                orphans = self.conn.execute(
+                    "SELECT COUNT(*) FROM main.tasks WHERE schedule_id NOT IN (SELECT id FROM main.schedules)"
+                ).fetchone()[0]
+            except sqlite3.Error as e:
+                logger.error("整合性チェックエラー: %s", e)
+                return None
+        result = {"integrity": integrity, "foreign_key_violations": violations, "orphan_tasks": orphans}
+        logger.info("整合性チェック結果: %s", result)
+        return result
+
+    def _calendar_path(self, path):
+        return os.path.join(os.path.dirname(self.db_path), path)
+
+    @timed("data_manager.add_calendar")
+    @_serialized_write
+    def add_calendar(self, name):
+        """予定を別のDBファイルに保存するカレンダーを追加し、IDを返します。同じ名前がある場合などは None を返します。
+
+        DBファイルは本体のDBと同じディレクトリの calendars/<name>.db に作成します。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、カレンダーを追加できません。")
+            return None
+        if name == MAIN_CALENDAR or not CALENDAR_NAME_PATTERN.match(name):
+            logger.error("カレンダー名に使えない名前です: %s", name)
+            return None
+        
+        path = os.path.join("calendars", f"{name}.db")
+        try:
+            self.cursor.execute(
+                "INSERT INTO calendars (name, path, created_at) VALUES (?, ?, ?)", (name, path, datetime.now().isoformat())
+            )
+            calendar_id = self.cursor.lastrowid
+            # 本体と同じテーブル構成で作成しておく（ATTACHして読むときにテーブルがないと失敗するため）
+            os.makedirs(os.path.dirname(self._calendar_path(path)), exist_ok=True)
+            manager = DataManager(self._calendar_path(path), self.config)
+            if not manager.conn:
+                return None
+            with self._calendar_lock:
+                self._calendar_managers[name] = manager
+            self.conn.commit()
+            logger.info("カレンダー'%s'を追加しました: %s", name, path)
+            return calendar_id
+        except sqlite3.IntegrityError:
+            logger.error("カレンダー'%s'はすでにあります。", name)
+            return None
+        except sqlite3.Error as e:
+            logger.error("カレンダー追加エラー: %s", e)
+            return None
+
+    @timed("data_manager.set_calendar_enabled")
+    @_serialized_write
+    def set_calendar_enabled(self, name, enabled):
+        """カレンダーを統合した表示・検索に含めるかどうかを切り替えます。カレンダーがなければ False を返します。"""
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、カレンダーを変更できません。")
+            return False
+        
+        try:
+            self.cursor.execute("UPDATE calendars SET enabled = ? WHERE name = ?", (1 if enabled else 0, name))
+            if self.cursor.rowcount == 0:
+                self.last_error = "not_found"
+                return False
+            self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            logger.error("カレンダー変更エラー: %s", e)
+            return False
+
+    @timed("data_manager.get_calendars")
+    def get_calendars(self, enabled_only=False):
+        """追加したカレンダーを (id, name, path, enabled) のリストで返します（path は絶対パス）。"""
+        if not self.conn:
+            return []
+        
+        cursor = self._read_cursor()
+        cursor.execute(
+            "SELECT id, name, path, enabled FROM calendars" + (" WHERE enabled = 1" if enabled_only else "") + " ORDER BY id"
+        )
+        return [(calendar_id, name, self._calendar_path(path), enabled) for calendar_id, name, path, enabled in cursor.fetchall()]
+
+    def calendar(self, name):
+        """カレンダーの予定を読み書きする DataManager を返します（MAIN_CALENDAR なら自分自身）。なければ None を返します。
+
+        予定の登録・アーカイブ・VACUUM・バックアップなどはこの DataManager で行うため、カレンダーごとのDBの大きさで済みます。
+        """
+        if name == MAIN_CALENDAR:
+            return self
+        with self._calendar_lock:
+            manager = self._calendar_managers.get(name)
+            if manager is not None:
+                return manager
+            for _, calendar_name, path, _ in self.get_calendars():
+                if calendar_name == name:
+                    manager = DataManager(path, self.config)
+                    self._calendar_managers[name] = manager
+                    return manager
+        logger.warning("カレンダー'%s'が見つかりません。", name)
+        return None
+
+    def _attach_calendar(self, conn, calendar_id, path):
+        """読み取り用接続にカレンダーのDBを cal_<id> としてATTACHし、スキーマ名を返します。
+
+        ATTACHできる数（SQLITE_LIMIT_ATTACHED）に達している場合は、最も長く使っていないカレンダーをDETACHします。
+        """
+        schema = f"cal_{calendar_id}"
+        attached = self._local.calendars
+        if attached.get(calendar_id) == path:
+            attached.move_to_end(calendar_id)
+            return schema
+        if calendar_id in attached:
+            conn.execute(f"DETACH DATABASE {schema}")
+            del attached[calendar_id]
+        limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) - (1 if self._local.archive_attached else 0)
+        while attached and len(attached) >= limit:
+            evicted_id, _ = attached.popitem(last=False)
+            conn.execute(f"DETACH DATABASE cal_{evicted_id}")
+        conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+        attached[calendar_id] = path
+        return schema
+
+    @timed("data_manager.get_federated_schedules_in_range")
+    def get_federated_schedules_in_range(self, range_start, range_end, include_main=True):
+        """有効なカレンダー全体から期間に重なる予定を開始日時順に取得し、(カレンダー名, 予定のタプル) のリストで返します。
+
+        カレンダーごとに開始日時順で読み（idx_schedules_start を使う）、heapq.merge で1つの並びにまとめます。
+        カレンダーのDBは読み取り用接続に必要になったときだけATTACHします。
+        """
+        if not self.conn:
+            logger.warning("データベース接続が確立されていないため、予定を取得できません。")
+            return []
+        
+        sources = [(None, MAIN_CALENDAR, None)] if include_main else []
+        sources += [(calendar_id, name, path) for calendar_id, name, path, _ in self.get_calendars(enabled_only=True)]
+        try:
+            cursor = self._read_cursor()
+            per_calendar = []
+            for calendar_id, name, path in sources:
+                if path is None:
+                    schema = "main"
+                elif not os.path.exists(path):
+                    logger.warning("カレンダー'%s'のDBファイルがありません: %s", name, path)
+                    continue
+                else:
+                    # ATTACHできる数よりカレンダーが多い場合に備え、ATTACHしたらすぐに読む
+                    schema = self._attach_calendar(cursor.connection, calendar_id, path)
+                cursor.execute(SCHEDULE_SELECT.format(table=f"{schema}.schedules") + """
+                    WHERE start_datatime < ? AND end_datatime >= ?
+                    ORDER BY start_datatime, id
+                """, (range_end, range_start))
+                schedules = self._decode_schedules(cursor, cursor.fetchall(), schema)
+                per_calendar.append([(name, schedule) for schedule in schedules])
+        except sqlite3.Error as e:
+            logger.error("カレンダーをまとめた予定の取得エラー: %s", e)
+            return []
+        return list(heapq.merge(*per_calendar, key=lambda item: item[1][2]))
+
     def close(self):
         """データベース接続を閉じます。"""
+        with self._calendar_lock:
+            for manager in self._calendar_managers.values():
+                manager.close()
+            self._calendar_managers.clear()
+        with self._read_conns_lock:
+            for conn in self._read_conns:
+                conn.close()
+            self._read_conns.clear()
+        self._local = threading.local()
         if self.conn:
             self.conn.close()
-            print("データベース接続を閉じました。")
+            logger.info("データベース接続を閉じました。")
 
 # デバッグ用のテストコード (このファイルが直接実行された場合にのみ実行)
 if __name__ == "__main__":
+    from src.logging_setup import setup_logging
+    setup_logging("DEBUG")
     dm = DataManager()
 
     # テストデータの保存
@@ -0,0 +1,358 @@
+# src/feed_server.py
+"""予定を ICS（iCalendar）と JSON のフィードとして配信する読み取り専用のHTTPサーバー
+
+asyncio でローカルホストのみで待ち受け、スマートフォンのカレンダーアプリやダッシュボードから購読できるようにします。
+フィードは DataManager の期間指定の読み込みを FEED_BATCH_SIZE 件ずつ（キーセットページング）行い、
+チャンク形式で書き出すため、予定が多くても全体をメモリ上に組み立てません。
+DBの読み込みは1つのスレッドで実行するため、長いフィードを読み込んでいる間も他の接続（304 の応答など）は待たされません。
+ETag と Last-Modified は DataManager.change_token（DBの変更の検知）と日付から求め、If-None-Match /
+If-Modified-Since が一致すれば 304 を返します（DBが変わっていなければ予定を読みません）。
+
+使い方（リポジトリのルートで実行）:
+    python -m src.feed_server --port 8765
+    curl http://127.0.0.1:8765/schedules.ics
+    curl "http://127.0.0.1:8765/schedules.json?from=2030-01-01&to=2030-02-01"
+"""
+
+import argparse
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from urllib.parse import parse_qs, urlsplit
+
+from src.config import ConfigError, get_config
+from src.data_manager import DataManager, schedule_to_dict
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+FEED_BATCH_SIZE = 500  # 1回の読み込みで取得して書き出す予定の件数
+DEFAULT_PAST_DAYS = 30  # from を省略したときに含める過去の日数
+DEFAULT_FUTURE_DAYS = 365  # to を省略したときに含める未来の日数
+MAX_HEADER_BYTES = 16 * 1024
+REQUEST_TIMEOUT = 10  # リクエストヘッダーを待つ秒数
+ICS_LINE_OCTETS = 75  # iCalendar の1行の最大バイト数（これを超える行は折り返す）
+
+FEEDS = {
+    "/schedules.ics": "text/calendar; charset=utf-8",
+    "/schedules.json": "application/json; charset=utf-8",
+}
+
+
+class HttpError(Exception):
+    """ステータスコードとメッセージを持つ例外（そのままエラーレスポンスにする）"""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 431: "Request Header Fields Too Large", 500: "Internal Server Error"}
+
+
+def _ics_escape(text):
+    return (text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _ics_line(line):
+    """1行を CRLF 付きで返します。75バイトを超える場合は文字の途中で切らないように折り返します。"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= ICS_LINE_OCTETS:
+        return line + "\r\n"
+    parts = []
+    current, size, limit = [], 0, ICS_LINE_OCTETS
+    for char in line:
+        char_size = len(char.encode("utf-8"))
+        if size + char_size > limit:
+            parts.append("".join(current))
+            current, size, limit = [], 0, ICS_LINE_OCTETS - 1  # 続きの行は先頭の空白の分だけ短くする
+        current.append(char)
+        size += char_size
+    parts.append("".join(current))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _ics_datetime(value):
+    """'YYYY-MM-DD HH:MM:SS' をタイムゾーンなし（端末のローカル時刻）の iCalendar 形式にします。"""
+    return value.replace("-", "").replace(":", "").replace(" ", "T")
+
+
+def schedule_to_vevent(schedule, dtstamp):
+    """予定のタプルを VEVENT の文字列（CRLF 区切り）にします。"""
+    data = schedule_to_dict(schedule)
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:schedule-{data['id']}@myschedulemanager",
+        f"DTSTAMP:{dtstamp}",
+        f"DTSTART:{_ics_datetime(data['start_datatime'])}",
+        f"DTEND:{_ics_datetime(data['end_datatime'])}",
+        f"SUMMARY:{_ics_escape(data['title'] or '')}",
+        f"SEQUENCE:{data['version'] or 0}",
+    ]
+    if data["location"]:
+        lines.append(f"LOCATION:{_ics_escape(data['location'])}")
+    if data["category"]:
+        lines.append(f"CATEGORIES:{_ics_escape(data['category'])}")
+    if data["description"]:
+        lines.append(f"DESCRIPTION:{_ics_escape(data['description'])}")
+    if data["is_completed"]:
+        lines.append("X-MSM-COMPLETED:TRUE")
+    lines.append("END:VEVENT")
+    return "".join(_ics_line(line) for line in lines)
+
+
+class FeedServer:
+    """予定のフィードを配信するHTTPサーバー"""
+    def __init__(self, data_manager, host=DEFAULT_HOST, port=DEFAULT_PORT, batch_size=FEED_BATCH_SIZE):
+        self.data_manager = data_manager
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        # 再起動後は change_token が最初から数え直されるため、ETag に起動ごとの値を含めて前回の ETag と一致させない
+        self._instance = os.urandom(8).hex()
+        self._token = None
+        self._last_modified = None  # change_token か日付が最後に変わった（とサーバーが気付いた）時刻
+        # DBを読む処理を実行するスレッド（イベントループを止めないように、DataManager はこのスレッドからだけ使う）
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="feed-db")
+
+    async def serve(self, ready=None):
+        """待ち受けを開始し、止められるまで処理します。ready（asyncio.Event）を指定すると待ち受け開始時にセットします。"""
+        server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]  # port=0 の場合に割り当てられたポート
+        logger.info("フィードの配信を開始しました: http://%s:%s/schedules.ics", self.host, self.port)
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            # 実行中の読み込みが終わるのを待つ（この後で DataManager が閉じられる）
+            self._executor.shutdown(wait=True)
+
+    async def _run(self, func, *args, **kwargs):
+        """func をDB用のスレッドで実行し、結果を返します（イベントループは待っている間も他の接続を処理する）。"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _current_version(self):
+        """DBの変更を確認し、(change_token と日付, Last-Modified の時刻) を返します。
+
+        既定の期間は今日の日付から決まり、日付が変わると内容も変わるため、日付が変わったときも Last-Modified を進めます。
+        """
+        token = (await self._run(self.data_manager.change_token), datetime.now().date().isoformat())
+        if token != self._token or self._last_modified is None:
+            self._token = token
+            # HTTP の日付は秒単位なので秒未満を切り捨て、同じ秒に2回変わっても前の時刻より進める
+            now = datetime.now(timezone.utc).replace(microsecond=0)
+            if self._last_modified is not None and now <= self._last_modified:
+                now = self._last_modified + timedelta(seconds=1)
+            self._last_modified = now
+        return self._token, self._last_modified
+
+    async def _handle_client(self, reader, writer):
+        method = path = None
+        try:
+            try:
+                header_bytes = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), REQUEST_TIMEOUT)
+            except asyncio.LimitOverrunError:
+                raise HttpError(431, "リクエストヘッダーが大きすぎます。")
+            if len(header_bytes) > MAX_HEADER_BYTES:
+                raise HttpError(431, "リクエストヘッダーが大きすぎます。")
+            method, target, headers = self._parse_request(header_bytes)
+            path = urlsplit(target).path
+            await self._respond(writer, method, target, headers)
+        except HttpError as e:
+            await self._send_error(writer, e.status, e.message)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception:
+            logger.exception("フィードの配信中にエラーが発生しました: %s %s", method, path)
+            try:
+                await self._send_error(writer, 500, "サーバーでエラーが発生しました。")
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _parse_request(header_bytes):
+        lines = header_bytes.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "リクエスト行を解析できません。")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        return method, target, headers
+
+    @staticmethod
+    def _parse_range(query):
+        """クエリの from / to（YYYY-MM-DD、to の日は含まない）を期間の文字列にします。"""
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        try:
+            start = datetime.strptime(query["from"][0], "%Y-%m-%d") if "from" in query else today - timedelta(days=DEFAULT_PAST_DAYS)
+            end = datetime.strptime(query["to"][0], "%Y-%m-%d") if "to" in query else today + timedelta(days=DEFAULT_FUTURE_DAYS)
+        except ValueError:
+            raise HttpError(400, "from / to は YYYY-MM-DD の形式で指定してください。")
+        if end <= start:
+            raise HttpError(400, "to は from より後の日付を指定してください。")
+        return start.strftime("%Y-%m-%d %H:%M:%S"), end.strftime("%Y-%m-%d %H:%M:%S")
+
+    async def _respond(self, writer, method, target, headers):
+        if method not in ("GET", "HEAD"):
+            raise HttpError(405, "GET と HEAD のみ利用できます。")
+        url = urlsplit(target)
+        if url.path not in FEEDS:
+            raise HttpError(404, "フィードが見つかりません（/schedules.ics または /schedules.json）。")
+        range_start, range_end = self._parse_range(parse_qs(url.query))
+        metrics.increment("feed.requests")
+
+        token, last_modified = await self._current_version()
+        # 既定の期間は日付が変わると動くので、解決した期間（の開始日・終了日）も ETag に含める
+        digest = hashlib.sha1(f"{self._instance}|{token}|{url.path}|{range_start}|{range_end}".encode()).hexdigest()
+        etag = f'"{digest[:20]}"'
+        common = [
+            ("ETag", etag),
+            ("Last-Modified", format_datetime(last_modified, usegmt=True)),
+            ("Cache-Control", "no-cache"),
+        ]
+        if self._not_modified(headers, etag, last_modified):
+            metrics.increment("feed.not_modified")
+            await self._send_head(writer, 304, common)
+            return
+
+        chunked = method == "GET"
+        await self._send_head(
+            writer, 200,
+            [("Content-Type", FEEDS[url.path])] + common + ([("Transfer-Encoding", "chunked")] if chunked else []),
+        )
+        if not chunked:
+            return
+        if url.path.endswith(".ics"):
+            body = self._ics_chunks(range_start, range_end)
+        else:
+            body = self._json_chunks(range_start, range_end)
+        count = 0
+        async for chunk in body:
+            data = chunk.encode("utf-8")
+            writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+            await writer.drain()  # 受け取りの遅いクライアントに合わせて、読み込みも待たせる
+            count += 1
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        logger.debug("フィードを配信しました: %s（%sチャンク）", target, count)
+
+    @staticmethod
+    def _not_modified(headers, etag, last_modified):
+        """条件付きリクエストが現在の内容と一致するか判定します（If-None-Match があれば If-Modified-Since は見ない）。"""
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None:
+            if if_none_match.strip() == "*":
+                return True
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return etag in tags
+        if_modified_since = headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            return last_modified <= since
+        return False
+
+    def _read_batch(self, range_start, range_end, after):
+        """after の次から期間に重なる予定を最大 batch_size 件、詳細内容を入れて返します（DB用のスレッドで実行する）。
+
+        詳細内容は一覧のクエリでは読まれないため、ページごとにまとめて読んで入れます。
+        """
+        schedules = self.data_manager.get_schedules_in_range(range_start, range_end, after, self.batch_size)
+        return self.data_manager.fill_descriptions(schedules)
+
+    async def _batches(self, range_start, range_end):
+        """期間に重なる予定を batch_size 件ずつ返します（ページごとに別のクエリで読み、読み取りを長く開いたままにしない）。"""
+        after = None
+        while True:
+            schedules = await self._run(self._read_batch, range_start, range_end, after)
+            if schedules:
+                yield schedules
+            if len(schedules) < self.batch_size:
+                return
+            after = (schedules[-1][2], schedules[-1][0])
+
+    async def _ics_chunks(self, range_start, range_end):
+        dtstamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        yield "".join(_ics_line(line) for line in (
+            "BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//MyScheduleManager//Schedule Feed//JA",
+            "CALSCALE:GREGORIAN", "X-WR-CALNAME:My Schedule Manager",
+        ))
+        async for schedules in self._batches(range_start, range_end):
+            yield "".join(schedule_to_vevent(schedule, dtstamp) for schedule in schedules)
+        yield _ics_line("END:VCALENDAR")
+
+    async def _json_chunks(self, range_start, range_end):
+        yield f'{{"range_start": {json.dumps(range_start)}, "range_end": {json.dumps(range_end)}, "schedules": ['
+        separator = ""
+        async for schedules in self._batches(range_start, range_end):
+            yield separator + ",".join(json.dumps(schedule_to_dict(schedule), ensure_ascii=False) for schedule in schedules)
+            separator = ","
+        yield "]}"
+
+    @staticmethod
+    async def _send_head(writer, status, headers):
+        lines = [f"HTTP/1.1 {status} {REASONS[status]}"] + [f"{name}: {value}" for name, value in headers]
+        lines.append("Connection: close")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+    async def _send_error(self, writer, status, message):
+        body = json.dumps({"error": message}, ensure_ascii=False).encode("utf-8")
+        await self._send_head(writer, status, [
+            ("Content-Type", "application/json; charset=utf-8"), ("Content-Length", str(len(body))),
+        ])
+        writer.write(body)
+        await writer.drain()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MyScheduleManager フィード配信サーバー")
+    parser.add_argument("--db", help="データベースファイル（省略時は設定の db_path）")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="待ち受けるアドレス（既定はこの端末からのみ）")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="待ち受けるポート")
+    parser.add_argument("--batch", type=int, default=FEED_BATCH_SIZE, help="1回の読み込みで書き出す予定の件数")
+    args = parser.parse_args(argv)
+
+    from src.logging_setup import setup_logging
+    setup_logging()
+
+    try:
+        get_config()
+    except ConfigError as e:
+        print(e, file=sys.stderr)
+        return 2
+    data_manager = DataManager(args.db)
+    try:
+        asyncio.run(FeedServer(data_manager, args.host, args.port, args.batch).serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        data_manager.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
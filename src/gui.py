@@ -2,28 +2,91 @@
 
 import sys
 import os
-from datetime import datetime, timedelta
+import json
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from PySide6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QPushButton, QLineEdit, QTextEdit, QComboBox,
-    QDateTimeEdit, QMessageBox, QCheckBox, QSpinBox,
-    QListWidget, QListWidgetItem, QStackedWidget, QScrollArea, # リスト表示用に追加
+    QDateTimeEdit, QDateEdit, QMessageBox, QCheckBox, QSpinBox,
+    QListWidget, QListWidgetItem, QStackedWidget, # リスト表示用に追加
+    QAbstractItemView, QInputDialog, QFileDialog,
     QSystemTrayIcon, QStyle # システムトレイアイコン用
 )
-from PySide6.QtCore import QDateTime, Qt, QTimer, QUrl, Signal
+from PySide6.QtCore import QDate, QDateTime, Qt, QTimer, QUrl, Signal
 from PySide6.QtGui import QIcon, QDesktopServices
 from PySide6.QtMultimedia import QSoundEffect
+from PySide6.QtNetwork import QLocalSocket
 
-from src.data_manager import DataManager
+from src.autocomplete import AutocompleteIndex
+from src.backup import create_backup, list_backups, restore_backup, throughput_mb_s
+from src.completer import CompletingTextEdit, IndexCompleter, attach_line_edit_completer
+from src.config import get_config_store
+from src.data_manager import DataManager, resolve_db_path, snapshot_path_for
+from src.calendar_view import CalendarView
+from src.metrics import timed
+from src.daemon import DEFAULT_SOCKET_PATH
+from src.notification_engine import CompositeSink, NotificationEngine, notification_from_dict
+from src.snapshot import load_snapshot, write_snapshot
+from src.stall_watchdog import StallWatchdog
+from src.task_checklist import TaskChecklistModel, TaskChecklistView
 
-class NotificationManager:
-    """予定の通知を管理するクラス"""
+logger = logging.getLogger(__name__)
+
+PAST_PAGE_SIZE = 200  # 過去の予定一覧で1回に読み込む件数
+# 終了時に起動用スナップショットを書き出し、次回起動時に使う（MSM_SNAPSHOT=0 で無効）
+SNAPSHOT_ENABLED = os.environ.get("MSM_SNAPSHOT", "1") != "0"
+# イベントループが止まった時のスタックを data/stall_report.json に記録する（MSM_WATCHDOG=0 で無効）
+WATCHDOG_ENABLED = os.environ.get("MSM_WATCHDOG", "1") != "0"
+WATCHDOG_THRESHOLD = 0.5  # この秒数以上イベントループが止まったら記録する
+WATCHDOG_HEARTBEAT_MS = 100
+
+class TrayNotificationSink:
+    """システムトレイに通知を表示する sink"""
+    def __init__(self, tray_icon):
+        self.tray_icon = tray_icon
+
+    def notify(self, notification):
+        self.tray_icon.showMessage(
+            "予定の通知",
+            notification.message,
+            QSystemTrayIcon.Information,
+            5000  # 5秒間表示
+        )
+
+class SoundNotificationSink:
+    """通知音を再生する sink"""
+    def __init__(self, sound):
+        self.sound = sound
+
+    def notify(self, notification):
+        if self.sound.isLoaded():
+            self.sound.play()
+
+class PopupNotificationSink:
+    """最前面のポップアップで通知を表示する sink"""
     def __init__(self, parent):
         self.parent = parent
+
+    def notify(self, notification):
+        msg_box = QMessageBox(self.parent)
+        msg_box.setWindowTitle("予定の通知")
+        msg_box.setText(notification.message)
+        msg_box.setIcon(QMessageBox.Information)
+        msg_box.setWindowFlags(msg_box.windowFlags() | Qt.WindowStaysOnTopHint)  # 最前面に表示
+        msg_box.exec()
+
+class NotificationManager:
+    """予定の通知を管理するクラス（判定は NotificationEngine、表示はQtの sink が担当）"""
+    def __init__(self, parent, clock=datetime.now):
+        self.parent = parent
         self.data_manager = parent.data_manager
+        config = parent.config_store.config
+        self.interval_ms = config.notification_interval_ms  # 通知をチェックする間隔
         self.timer = QTimer(parent)
         self.timer.timeout.connect(self.check_notifications)
-        self.timer.start(60000)  # 1分ごとにチェック
         
         # システムトレイアイコンの設定
         self.tray_icon = QSystemTrayIcon(parent)
@@ -39,124 +102,89 @@ class NotificationManager:
         sound_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), "resources", "notification.wav")
         if os.path.exists(sound_file):
             self.sound.setSource(QUrl.fromLocalFile(sound_file))
-            self.sound.setVolume(0.5)
-        
-        # 最後に通知した時間を記録する辞書（schedule_id: last_notification_time）
-        self.last_notifications = {}
+            self.sound.setVolume(config.sound_volume)
         
-        # スケジュール開始タスクのチェック状態を記録する辞書（schedule_id: is_checked）
-        self.schedule_start_checked = {}
+        # 通知の判定ロジック（トレイ通知 → 通知音 → ポップアップの順に出力）
+        self.sink = CompositeSink([
+            TrayNotificationSink(self.tray_icon),
+            SoundNotificationSink(self.sound),
+            PopupNotificationSink(parent),
+        ])
+        self.engine = NotificationEngine(
+            self.data_manager, self.sink, clock=clock,
+            reminder_minutes=config.reminder_repeat_minutes, horizon_days=config.notification_horizon_days,
+        )
+        parent.config_store.subscribe(self.apply_config)
         
-        # 通知を繰り返す予定のリスト
-        self.repeat_notification_schedules = set()
+        # 通知デーモンが起動していれば予定のチェックはデーモンに任せ、通知イベントを受け取るだけにする
+        self.daemon_socket = QLocalSocket(parent)
+        self.daemon_socket.readyRead.connect(self._on_daemon_ready_read)
+        self.daemon_socket.disconnected.connect(self._on_daemon_disconnected)
+        self.daemon_socket.connectToServer(DEFAULT_SOCKET_PATH)
+        if self.daemon_socket.waitForConnected(200):
+            self._send_to_daemon("subscribe", {}, request_id=1)
+            logger.info("通知デーモンに接続しました: %s", DEFAULT_SOCKET_PATH)
+        else:
+            self.timer.start(self.interval_ms)  # 既定は1分ごとにチェック
     
-    def check_notifications(self):
-        """通知が必要な予定をチェックする"""
-        current_time = datetime.now()
-        
-        # 現在および未来の予定を取得
-        schedules = self.data_manager.get_current_schedules()
-        
-        for schedule in schedules:
-            schedule_id = schedule[0]
-            title = schedule[1]
-            start_time_str = schedule[2]
-            
-            # 開始時間をdatetimeオブジェクトに変換
-            start_time = datetime.strptime(start_time_str, "%Y-%m-%d %H:%M:%S")
-            
-            # 1. 通知設定による通知
-            notification_minutes = None
+    def apply_config(self, config, changed=None):
+        """設定の通知の間隔・音量・読み込む範囲を反映します（設定ファイルが更新されたときに呼ばれる）。"""
+        self.engine.apply_config(config)
+        self.sound.setVolume(config.sound_volume)
+        if config.notification_interval_ms != self.interval_ms:
+            self.interval_ms = config.notification_interval_ms
+            if self.timer.isActive():
+                self.timer.start(self.interval_ms)
+    
+    def _send_to_daemon(self, method, params, request_id=None):
+        """通知デーモンにJSON-RPCのメッセージを送る（request_id なしは応答不要の通知）"""
+        message = {"jsonrpc": "2.0", "method": method, "params": params}
+        if request_id is not None:
+            message["id"] = request_id
+        self.daemon_socket.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.daemon_socket.flush()
+    
+    def _on_daemon_ready_read(self):
+        """通知デーモンから届いたイベントを処理する（行の途中までしか届いていなければ次の readyRead で読む）"""
+        while self.daemon_socket.canReadLine():
+            line = bytes(self.daemon_socket.readLine())
             try:
-                notification_minutes = schedule[9]  # notification_minutes カラムは9番目
-            except IndexError:
-                pass
-            
-            if notification_minutes is not None:
-                # 通知時間を計算（開始時間の何分前に通知するか）
-                notification_time = start_time - timedelta(minutes=notification_minutes)
-                
-                # 現在時刻が通知時間を過ぎているかつ、まだ通知していないか、前回の通知から24時間以上経過している場合
-                last_notified = self.last_notifications.get(f"{schedule_id}_scheduled")
-                if (current_time >= notification_time and 
-                    (last_notified is None or (current_time - last_notified).total_seconds() > 86400)):
-                    
-                    # 通知を表示
-                    self.show_notification(title, start_time_str, schedule_id, "scheduled")
-                    
-                    # 最後に通知した時間を記録
-                    self.last_notifications[f"{schedule_id}_scheduled"] = current_time
-            
-            # 2. 開始時間から5分後の強制通知
-            five_min_after_start = start_time + timedelta(minutes=5)
-            
-            # 「スケジュールの開始」タスクのチェック状態を取得
-            start_task_checked = self.schedule_start_checked.get(schedule_id, False)
-            
-            # 現在時刻が開始時間から5分後を過ぎていて、まだ通知していない場合
-            last_notified = self.last_notifications.get(f"{schedule_id}_5min")
-            if (current_time >= five_min_after_start and not start_task_checked and
-                (last_notified is None or (current_time - last_notified).total_seconds() > 300)):  # 5分ごとに繰り返し
-                
-                # 「スケジュールの開始」タスクのチェック状態を確認
-                tasks = self.data_manager.get_tasks_for_schedule(schedule_id)
-                for task in tasks:
-                    task_id, task_desc, is_completed = task
-                    if task_desc == "スケジュールの開始":
-                        if is_completed:
-                            start_task_checked = True
-                            self.schedule_start_checked[schedule_id] = True
-                            # チェックされていれば繰り返し通知リストから削除
-                            if schedule_id in self.repeat_notification_schedules:
-                                self.repeat_notification_schedules.remove(schedule_id)
-                        else:
-                            # チェックされていなければ繰り返し通知リストに追加
-                            self.repeat_notification_schedules.add(schedule_id)
-                        break
-                
-                # チェックされていなければ通知
-                if not start_task_checked:
-                    self.show_notification(
-                        title, 
-                        start_time_str, 
-                        schedule_id, 
-                        "start_reminder",
-                        "スケジュールの開始時間から5分が経過しました。「スケジュールの開始」にチェックを入れてください。"
-                    )
-                    
-                    # 最後に通知した時間を記録
-                    self.last_notifications[f"{schedule_id}_5min"] = current_time
+                message = json.loads(line.decode("utf-8"))
+            except (ValueError, UnicodeDecodeError) as e:
+                logger.warning("通知デーモンから解析できないメッセージを受け取りました: %s", e)
+                continue
+            if not isinstance(message, dict):
+                logger.warning("通知デーモンから不明な形式のメッセージを受け取りました: %r", message)
+                continue
+            if message.get("method") == "notification":
+                try:
+                    notification = notification_from_dict(message["params"])
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.warning("通知デーモンから不正な形式の通知を受け取りました: %r (%s)", message.get("params"), e)
+                    continue
+                self.sink.notify(notification)
+            elif (message.get("method") == "schedules_changed" and hasattr(self.parent, "_load_schedules_to_list")
+                  and self.data_manager is not None):
+                # 他のクライアントが予定を変更したので一覧を読み直す
+                self.parent._load_schedules_to_list()
     
-    def show_notification(self, title, start_time, schedule_id, notification_type, custom_message=None):
-        """通知を表示する"""
-        # 開始時間を読みやすい形式に変換
-        readable_time = datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S").strftime("%Y/%m/%d %H:%M")
-        
-        # 通知メッセージを設定
-        if custom_message:
-            message = custom_message
-        else:
-            message = f"予定「{title}」が {readable_time} から始まります。"
-        
-        # システムトレイ通知を表示
-        self.tray_icon.showMessage(
-            "予定の通知",
-            message,
-            QSystemTrayIcon.Information,
-            5000  # 5秒間表示
-        )
-        
-        # 通知音を再生
-        if self.sound.isLoaded():
-            self.sound.play()
-        
-        # ポップアップメッセージボックスを表示（最前面に表示）
-        msg_box = QMessageBox(self.parent)
-        msg_box.setWindowTitle("予定の通知")
-        msg_box.setText(message)
-        msg_box.setIcon(QMessageBox.Information)
-        msg_box.setWindowFlags(msg_box.windowFlags() | Qt.WindowStaysOnTopHint)  # 最前面に表示
-        msg_box.exec()
+    def _on_daemon_disconnected(self):
+        """通知デーモンが停止した場合は、このプロセスで通知チェックを再開する"""
+        logger.warning("通知デーモンとの接続が切れたため、アプリ内で通知チェックを行います。")
+        if not self.timer.isActive():
+            self.timer.start(self.interval_ms)
+    
+    def set_data_manager(self, data_manager):
+        """別スレッドで開き終えた DataManager を使うようにする（それまでは通知をチェックしない）"""
+        self.data_manager = data_manager
+        self.engine.data_manager = data_manager
+
+    @timed("gui.check_notifications")
+    def check_notifications(self):
+        """通知が必要な予定をチェックする"""
+        if self.data_manager is None:
+            return []
+        return self.engine.check_notifications()
     
     def tray_icon_activated(self, reason):
         """システムトレイアイコンがクリックされたときの処理"""
@@ -167,26 +195,125 @@ class NotificationManager:
             
     def update_task_check_status(self, schedule_id, task_desc, is_checked):
         """タスクのチェック状態を更新する"""
-        if task_desc == "スケジュールの開始":
-            self.schedule_start_checked[schedule_id] = is_checked
-            # チェックされていれば繰り返し通知リストから削除
-            if is_checked and schedule_id in self.repeat_notification_schedules:
-                self.repeat_notification_schedules.remove(schedule_id)
+        self.engine.update_task_check_status(schedule_id, task_desc, is_checked)
+        if self.daemon_socket.state() == QLocalSocket.ConnectedState:
+            self._send_to_daemon("update_task_check_status", {
+                "schedule_id": schedule_id, "task_desc": task_desc, "is_checked": is_checked,
+            })
 
 class ScheduleApp(QWidget):
-    def __init__(self):
+    backupFinished = Signal(object)  # 別スレッドで作成したバックアップ（BackupResult、失敗時は None）
+    restoreFinished = Signal(bool)  # 別スレッドでの復元の結果
+    attachmentAdded = Signal(object, object)  # 別スレッドで添付した予定のIDと添付ファイルのID（失敗時は None）
+    dataManagerOpened = Signal(object)  # 起動時に別スレッドで開いた DataManager（失敗時は None）
+
+    def __init__(self, data_manager=None):
         super().__init__()
         self.setWindowTitle("My Schedule Manager")
         self.setGeometry(100, 100, 1000, 700) # ウィンドウサイズを少し広げました
-        self.data_manager = DataManager()
+        # 設定（data/config.json と環境変数）。ファイルが更新されたら change_watch_timer で読み直す
+        self.config_store = get_config_store()
+        # 前回終了時のスナップショットがDBと一致していれば、最初の一覧表示と通知判定に使う
+        # （DBを開くとWALファイルが作られて一致しなくなるため、DataManager の作成より先に読み込む）
+        snapshot = None
+        if data_manager is None and SNAPSHOT_ENABLED:
+            db_path = resolve_db_path()
+            snapshot = load_snapshot(snapshot_path_for(db_path), db_path)
+        initial_schedules = snapshot.current_schedules() if snapshot else None
+        if snapshot:
+            snapshot.close()
+        # 候補の読み込み・バックアップ・添付などのバックグラウンド処理を実行するスレッド
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.config_store.config.background_workers, thread_name_prefix="gui-worker"
+        )
+        # スナップショットを使う場合は、DBの接続・テーブルの確認・マイグレーションを別スレッドで行い、
+        # その間はスナップショットの一覧を表示しておく（DBを開き終えるまで data_manager は None）
+        self.data_manager = data_manager
+        if self.data_manager is None and initial_schedules is None:
+            self.data_manager = DataManager()
+        self._initial_schedules = initial_schedules
+        self._open_future = None
         self.editing_schedule_id = None  # 編集中の予定ID
+        self.editing_schedule_version = None  # 編集開始時の予定のバージョン
         self.is_edit_mode = False  # 編集モードフラグ
+        self.current_selected_schedule_id = None  # 詳細表示中の予定ID
         self.show_past_schedules = False  # 過去の予定表示フラグ（デフォルトは非表示）
+        self.archived_schedule_ids = set()  # 一覧に表示中のアーカイブ済み予定のID（閲覧のみ）
+        self.past_cursor = None  # 過去の予定一覧で最後に読み込んだ予定の (start_datatime, id)
+        self.past_source = None  # 過去の予定の次の読み込み先（"main" / "archive"、None は読み込み終了）
+        self._lock_icon = None  # 一覧のロック中アイコン（全項目で共有）
+        self.autocomplete_index = AutocompleteIndex()  # タイトル・場所・タスクの入力補完の候補
+        self.stall_watchdog = None  # start_stall_watchdog() で開始する
+        # 共有DBを他のインスタンスと使う場合に備え、変更があったときだけ一覧を読み直す（DBを開いた後に開始）
+        self._last_data_version = None
+        self.change_watch_timer = QTimer(self)
+        self.change_watch_timer.timeout.connect(self._reload_if_changed)
         self.init_ui()
-        self._load_schedules_to_list() # アプリ起動時に予定を読み込む
+        self._load_schedules_to_list(initial_schedules) # アプリ起動時に予定を読み込む
         
         # 通知マネージャーを初期化（UI初期化後に行う）
         self.notification_manager = NotificationManager(self)
+        if self.data_manager is None:
+            # DBを開き終えるまでは操作を受け付けない（一覧はスナップショットで表示済み）
+            self.setEnabled(False)
+            self.dataManagerOpened.connect(self._on_data_manager_opened)
+            self._open_future = self.executor.submit(self._open_data_manager)
+        else:
+            self._setup_data_manager()
+
+    def _open_data_manager(self):
+        """別スレッドでDBを開き、dataManagerOpened で GUI のスレッドに渡します。"""
+        try:
+            data_manager = DataManager()
+        except Exception:
+            logger.exception("データベースを開けませんでした。")
+            data_manager = None
+        self.dataManagerOpened.emit(data_manager)
+        return data_manager
+
+    def _on_data_manager_opened(self, data_manager):
+        if self.data_manager is not None:
+            return  # 開き終える前にウィンドウを閉じた場合（closeEvent で受け取り済み）
+        # 別スレッドで開けなかった場合は、従来どおりこのスレッドで開く（失敗すれば例外になる）
+        self.data_manager = data_manager or DataManager()
+        self._setup_data_manager()
+        self.setEnabled(True)
+        current_item = self.schedule_list_widget.currentItem()
+        if current_item:
+            self._show_schedule_detail(current_item)
+
+    def _setup_data_manager(self):
+        """DBを使う部分（設定の反映・テンプレート・入力補完・通知・変更の監視）を準備します。"""
+        self.config_store.subscribe(self.data_manager.apply_config)
+        self.calendar_view.cache.data_manager = self.data_manager
+        self.notification_manager.set_data_manager(self.data_manager)
+        if self._initial_schedules is not None:
+            # スナップショットはDBと一致することを確認済みなので、change_token が変わるまで読み直さない
+            self.notification_manager.engine.seed_schedules(self._initial_schedules)
+            self._initial_schedules = None
+        if self.stall_watchdog is not None and self.stall_watchdog.data_manager is None:
+            self.stall_watchdog.data_manager = self.data_manager
+            self.data_manager.enable_query_tracking()
+        self._load_templates()
+        # 入力補完の候補は履歴が多いと読み込みに時間がかかるため、起動を待たせないよう別スレッドで読み込む
+        self.executor.submit(self.autocomplete_index.load, self.data_manager)
+        self._last_data_version = self.data_manager.data_version()
+        self.change_watch_timer.start(5000)  # PRAGMA data_version の確認だけなので短い間隔でよい
+
+    def start_stall_watchdog(self):
+        """イベントループの停止の監視を始めます（GUIのスレッドから呼び出す）。"""
+        db_path = self.data_manager.db_path if self.data_manager is not None else resolve_db_path()
+        # DBを開き終える前なら、実行中のクエリは開いた後（_setup_data_manager）から記録する
+        report_path = os.path.join(os.path.dirname(db_path), "stall_report.json")
+        self.stall_watchdog = StallWatchdog(
+            report_path, self.data_manager, WATCHDOG_THRESHOLD, WATCHDOG_HEARTBEAT_MS / 1000
+        )
+        # 既定の CoarseTimer は間隔が5%ずれるため、遅延の計測には PreciseTimer を使う
+        self.heartbeat_timer = QTimer(self)
+        self.heartbeat_timer.setTimerType(Qt.PreciseTimer)
+        self.heartbeat_timer.timeout.connect(self.stall_watchdog.beat)
+        self.heartbeat_timer.start(WATCHDOG_HEARTBEAT_MS)
+        self.stall_watchdog.start()
 
     def init_ui(self):
         main_layout = QHBoxLayout()
@@ -199,10 +326,25 @@ class ScheduleApp(QWidget):
         self.header_label.setStyleSheet("font-size: 24px; font-weight: bold; margin-bottom: 15px; color: #333;")
         form_panel_layout.addWidget(self.header_label)
 
+        # テンプレート（選択するとタイトル・区分・場所・詳細・タスク・通知設定がフォームに入力される）
+        template_layout = QHBoxLayout()
+        template_layout.addWidget(QLabel("テンプレート:"))
+        self.template_input = QComboBox()
+        self.template_input.activated.connect(self._apply_template)
+        template_layout.addWidget(self.template_input, 1)
+        self.save_template_button = QPushButton("現在の内容を保存")
+        self.save_template_button.clicked.connect(self._save_as_template)
+        template_layout.addWidget(self.save_template_button)
+        self.delete_template_button = QPushButton("削除")
+        self.delete_template_button.clicked.connect(self._delete_template)
+        template_layout.addWidget(self.delete_template_button)
+        form_panel_layout.addLayout(template_layout)
+
         # ... (タイトル、開始日時、終了日時、区分、場所の入力フィールドはそのまま) ...
         form_panel_layout.addWidget(QLabel("タイトル:"))
         self.title_input = QLineEdit()
         self.title_input.setPlaceholderText("例: 家族と旅行、定例会議")
+        attach_line_edit_completer(self.title_input, self.autocomplete_index, "title")
         form_panel_layout.addWidget(self.title_input)
 
         form_panel_layout.addWidget(QLabel("開始日時:"))
@@ -214,7 +356,7 @@ class ScheduleApp(QWidget):
         form_panel_layout.addWidget(self.start_datetime_input)
 
         form_panel_layout.addWidget(QLabel("終了日時:"))
-        self.end_datetime_input = QDateTimeEdit(QDateTime.currentDateTime().addSecs(3600))
+        self.end_datetime_input = QDateTimeEdit(self._default_end_datetime(QDateTime.currentDateTime()))
         self.end_datetime_input.setCalendarPopup(True)
         self.end_datetime_input.setDisplayFormat("yyyy/MM/dd HH:mm")
         # 終了日時が変更されたときに開始日時との関係をチェック
@@ -224,11 +366,16 @@ class ScheduleApp(QWidget):
         form_panel_layout.addWidget(QLabel("区分:"))
         self.category_input = QComboBox()
         self.category_input.addItems(["プライベート", "仕事", "学習", "その他"])
+        # 区分名: コンボボックスの位置（予定やテンプレートを読み込むたびに findText で探さないようにする）
+        self.category_indexes = {
+            self.category_input.itemText(i): i for i in range(self.category_input.count())
+        }
         form_panel_layout.addWidget(self.category_input)
 
         form_panel_layout.addWidget(QLabel("場所:"))
         self.location_input = QLineEdit()
         self.location_input.setPlaceholderText("例: 箱根旅館、会議室A")
+        attach_line_edit_completer(self.location_input, self.autocomplete_index, "location")
         form_panel_layout.addWidget(self.location_input)
 
         # --- ここから変更/追加 ---
@@ -241,7 +388,8 @@ class ScheduleApp(QWidget):
 
         # タスクリスト入力用フィールド
         form_panel_layout.addWidget(QLabel("タスクリスト (1行に1タスク):")) # ラベルも変更
-        self.task_input = QTextEdit() # 新しい名前
+        self.task_input = CompletingTextEdit() # 行ごとに過去のタスクを補完する
+        self.task_input.set_completer(IndexCompleter(self.autocomplete_index, "task", self.task_input))
         self.task_input.setPlaceholderText("例:\n- 旅館チェックイン前に電話\n- 温泉の予約")
         self.task_input.setFixedHeight(80) # 高さを調整
         form_panel_layout.addWidget(self.task_input)
@@ -304,6 +452,17 @@ class ScheduleApp(QWidget):
         self.sync_button.clicked.connect(self.sync_google_calendar)
         button_layout.addWidget(self.sync_button)
 
+        # バックアップ・復元はDBの大きさに比例して時間がかかるため、別スレッドで実行する
+        self.backup_button = QPushButton("バックアップ")
+        self.backup_button.clicked.connect(self.start_backup)
+        button_layout.addWidget(self.backup_button)
+        self.restore_button = QPushButton("復元")
+        self.restore_button.clicked.connect(self.restore_from_backup)
+        button_layout.addWidget(self.restore_button)
+        self.backupFinished.connect(self._on_backup_finished)
+        self.restoreFinished.connect(self._on_restore_finished)
+        self.attachmentAdded.connect(self._on_attachment_added)
+
         form_panel_layout.addLayout(button_layout)
         form_panel_layout.addStretch()
 
@@ -322,16 +481,94 @@ class ScheduleApp(QWidget):
         
         header_layout.addStretch()  # 右寄せにするためのスペーサー
         
+        # 一覧表示とカレンダー表示（日・週・月）の切り替え
+        self.view_mode_input = QComboBox()
+        self.view_mode_input.addItems(["一覧", "日", "週", "月"])
+        self.view_mode_input.currentIndexChanged.connect(self._change_view_mode)
+        header_layout.addWidget(self.view_mode_input)
+        
         schedule_list_panel_layout.addLayout(header_layout)
 
+        self.schedule_view_stack = QStackedWidget()
+
+        list_page = QWidget()
+        list_page_layout = QVBoxLayout()
+        list_page_layout.setContentsMargins(0, 0, 0, 0)
         self.schedule_list_widget = QListWidget()
+        # Ctrl/Shift+クリックで複数の予定を選択して一括操作できるようにする
+        self.schedule_list_widget.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.schedule_list_widget.itemClicked.connect(self._show_schedule_detail)
-        schedule_list_panel_layout.addWidget(self.schedule_list_widget)
+        # 矢印キーで選択を移動したときも詳細表示を切り替える
+        self.schedule_list_widget.currentItemChanged.connect(self._on_current_schedule_changed)
+        # 過去の予定表示中は末尾までスクロールしたら次のページを読み込む
+        self.schedule_list_widget.verticalScrollBar().valueChanged.connect(self._on_schedule_list_scrolled)
+        list_page_layout.addWidget(self.schedule_list_widget)
+
+        # 選択した予定の一括操作
+        bulk_layout = QHBoxLayout()
+        bulk_layout.addWidget(QLabel("選択した予定を"))
+        self.bulk_shift_spinbox = QSpinBox()
+        self.bulk_shift_spinbox.setRange(-10080, 10080)  # 前後1週間まで
+        self.bulk_shift_spinbox.setSingleStep(15)
+        self.bulk_shift_spinbox.setValue(60)
+        self.bulk_shift_spinbox.setSuffix(" 分")
+        bulk_layout.addWidget(self.bulk_shift_spinbox)
+        for label, action in (("ずらす", "shift"), ("完了", "complete"), ("ロック", "lock"),
+                              ("ロック解除", "unlock"), ("削除", "delete")):
+            button = QPushButton(label)
+            button.clicked.connect(lambda checked=False, action=action: self._bulk_update(action))
+            bulk_layout.addWidget(button)
+        bulk_layout.addStretch()
+        list_page_layout.addLayout(bulk_layout)
+        list_page.setLayout(list_page_layout)
+        self.schedule_view_stack.addWidget(list_page)
+
+        # カレンダー表示（前後の期間へはボタン・マウスホイール・左右キーで移動）
+        calendar_panel = QWidget()
+        calendar_layout = QVBoxLayout()
+        calendar_layout.setContentsMargins(0, 0, 0, 0)
+        calendar_nav_layout = QHBoxLayout()
+        calendar_prev_button = QPushButton("◀")
+        calendar_today_button = QPushButton("今日")
+        calendar_next_button = QPushButton("▶")
+        self.calendar_range_label = QLabel("")
+        self.calendar_range_label.setStyleSheet("font-size: 16px; font-weight: bold; color: #333;")
+        calendar_nav_layout.addWidget(calendar_prev_button)
+        calendar_nav_layout.addWidget(calendar_today_button)
+        calendar_nav_layout.addWidget(calendar_next_button)
+        calendar_nav_layout.addWidget(self.calendar_range_label)
+        calendar_nav_layout.addStretch()
+        calendar_layout.addLayout(calendar_nav_layout)
+
+        self.calendar_view = CalendarView(self.data_manager)
+        self.calendar_view.scheduleClicked.connect(self._show_calendar_schedule)
+        self.calendar_view.rangeChanged.connect(self.calendar_range_label.setText)
+        calendar_prev_button.clicked.connect(lambda: self.calendar_view.step(-1))
+        calendar_today_button.clicked.connect(self.calendar_view.go_today)
+        calendar_next_button.clicked.connect(lambda: self.calendar_view.step(1))
+        calendar_layout.addWidget(self.calendar_view)
+        calendar_panel.setLayout(calendar_layout)
+        self.schedule_view_stack.addWidget(calendar_panel)
+
+        schedule_list_panel_layout.addWidget(self.schedule_view_stack)
         
         # 過去の予定表示切り替えボタンを右下に配置
         past_schedule_button_layout = QHBoxLayout()
         past_schedule_button_layout.addStretch()  # 右寄せにするためのスペーサー
         
+        # 過去の予定表示中のみ、指定した日付の予定まで移動する入力欄を表示
+        self.jump_date_input = QDateEdit(QDate.currentDate())
+        self.jump_date_input.setCalendarPopup(True)
+        self.jump_date_input.setDisplayFormat("yyyy/MM/dd")
+        self.jump_date_input.hide()
+        past_schedule_button_layout.addWidget(self.jump_date_input)
+        
+        self.jump_date_button = QPushButton("日付へ移動")
+        self.jump_date_button.setStyleSheet("background-color: #6c757d; color: white; font-weight: bold; padding: 8px;")
+        self.jump_date_button.clicked.connect(self._jump_to_date)
+        self.jump_date_button.hide()
+        past_schedule_button_layout.addWidget(self.jump_date_button)
+        
         self.toggle_past_schedule_button = QPushButton("過去の予定")
         self.toggle_past_schedule_button.setStyleSheet("background-color: #6c757d; color: white; font-weight: bold; padding: 8px;")
         self.toggle_past_schedule_button.clicked.connect(self._toggle_past_schedules)
@@ -361,20 +598,45 @@ class ScheduleApp(QWidget):
         self.detail_description_label.setWordWrap(True) # 長文対応
         detail_layout.addWidget(self.detail_description_label) # レイアウトに追加
 
+        # 添付ファイル（開いたときだけ一覧を読み込む）
+        self.attachments_toggle = QPushButton("▶ 添付ファイル")
+        self.attachments_toggle.setCheckable(True)
+        self.attachments_toggle.setFlat(True)
+        self.attachments_toggle.setStyleSheet("text-align: left; font-weight: bold;")
+        self.attachments_toggle.toggled.connect(self._toggle_attachments)
+        detail_layout.addWidget(self.attachments_toggle)
+        self.attachments_area = QWidget()
+        attachments_layout = QVBoxLayout()
+        attachments_layout.setContentsMargins(0, 0, 0, 0)
+        self.attachment_list = QListWidget()
+        self.attachment_list.setMaximumHeight(100)
+        self.attachment_list.itemDoubleClicked.connect(self._open_attachment)
+        attachments_layout.addWidget(self.attachment_list)
+        attachment_button_layout = QHBoxLayout()
+        self.add_attachment_button = QPushButton("追加")
+        self.add_attachment_button.clicked.connect(self._add_attachment)
+        attachment_button_layout.addWidget(self.add_attachment_button)
+        self.delete_attachment_button = QPushButton("削除")
+        self.delete_attachment_button.clicked.connect(self._delete_attachment)
+        attachment_button_layout.addWidget(self.delete_attachment_button)
+        attachment_button_layout.addStretch()
+        attachments_layout.addLayout(attachment_button_layout)
+        self.attachments_area.setLayout(attachments_layout)
+        self.attachments_area.hide()
+        detail_layout.addWidget(self.attachments_area)
+
         # タスクリスト表示用のウィジェット
         task_list_label = QLabel("<b>タスク:</b>")
         detail_layout.addWidget(task_list_label)
 
-        self.task_list_container = QVBoxLayout()
-        self.task_scroll_area = QScrollArea()
-        self.task_scroll_area.setWidgetResizable(True)
-        self.task_scroll_area.setMinimumHeight(200)  # 最小高さを200pxに設定
-        self.task_scroll_area.setMaximumHeight(400)  # 最大高さを400pxに設定（スクロール可能）
-        self.task_scroll_content = QWidget()
-        self.task_scroll_content.setLayout(self.task_list_container)
-        self.task_scroll_area.setWidget(self.task_scroll_content)
+        # 予定を切り替えてもチェックボックスを作り直さず、見えている行だけを描画する
+        self.task_checklist_model = TaskChecklistModel(self)
+        self.task_checklist_model.taskToggled.connect(self._on_task_toggled)
+        self.task_checklist_view = TaskChecklistView(self.task_checklist_model)
+        self.task_checklist_view.setMinimumHeight(200)  # 最小高さを200pxに設定
+        self.task_checklist_view.setMaximumHeight(400)  # 最大高さを400pxに設定（スクロール可能）
         
-        detail_layout.addWidget(self.task_scroll_area)
+        detail_layout.addWidget(self.task_checklist_view)
 
         # 編集、ロック/解除、削除ボタンを追加
         action_button_layout = QHBoxLayout()
@@ -444,7 +706,7 @@ class ScheduleApp(QWidget):
             # 編集モード: 既存の予定を更新
             success = self.data_manager.update_schedule(
                 self.editing_schedule_id, title, start_dt, end_dt, category, location, detailed_description, 
-                notification_minutes, task_notification_minutes
+                notification_minutes, task_notification_minutes, self.editing_schedule_version
             )
             if success:
                 # タスクも更新（既存のタスクを削除して新しく保存）
@@ -464,10 +726,14 @@ class ScheduleApp(QWidget):
                 # タスクを保存
                 if all_tasks:
                     self.data_manager.save_tasks(self.editing_schedule_id, all_tasks)
+                self.autocomplete_index.record(title, location, user_tasks)
 
                 QMessageBox.information(self, "更新完了", f"予定 '{title}' を更新しました。")
                 self._cancel_edit_mode()  # 編集モードを終了
                 self._load_schedules_to_list()
+            elif self.data_manager.last_error == "conflict":
+                QMessageBox.warning(self, "更新失敗", "この予定は他の端末で変更されたため保存できませんでした。\n最新の内容を読み込み直してから編集してください。")
+                self._reload_keeping_selection()
             else:
                 QMessageBox.critical(self, "更新失敗", "予定の更新中にエラーが発生しました。")
         else:
@@ -493,6 +759,7 @@ class ScheduleApp(QWidget):
                 # タスクを保存
                 if all_tasks:
                     self.data_manager.save_tasks(schedule_id, all_tasks)
+                self.autocomplete_index.record(title, location, user_tasks)
 
                 QMessageBox.information(self, "保存完了", f"予定 '{title}' をデータベースに保存しました。")
                 self._clear_form()
@@ -511,8 +778,8 @@ class ScheduleApp(QWidget):
         self.start_datetime_input.setDateTime(current_datetime)
         self.start_datetime_input.blockSignals(False)
         
-        # 終了日時を1時間後に設定
-        self.end_datetime_input.setDateTime(current_datetime.addSecs(3600))
+        # 終了日時を既定の長さ（1時間）後に設定
+        self.end_datetime_input.setDateTime(self._default_end_datetime(current_datetime))
         
         self.category_input.setCurrentIndex(0)
         self.location_input.clear()
@@ -529,78 +796,169 @@ class ScheduleApp(QWidget):
         self.task_notification_minutes_spinbox.setValue(15)
         self.task_notification_minutes_spinbox.setEnabled(False)
 
-    def _load_schedules_to_list(self):
+    @timed("gui.load_schedules_to_list")
+    def _load_schedules_to_list(self, schedules=None):
+        """予定一覧を読み込み直します。schedules を渡した場合は現在の予定としてDBの代わりに使います。"""
         self.schedule_list_widget.clear()
+        self.archived_schedule_ids = set()
         
         # 表示モードに応じて予定を取得
         if self.show_past_schedules:
-            schedules = self.data_manager.get_past_schedules()
+            # 過去の予定は最新の1ページ分だけ読み込み、残りはスクロールに応じて読み込む
+            self.past_cursor = None
+            self.past_source = "main"
+            schedules = self._fetch_past_page()
             self.list_header_label.setText("🗓️ 過去の予定")
             self.toggle_past_schedule_button.setText("現在の予定")
             self.toggle_past_schedule_button.setStyleSheet("background-color: #007bff; color: white; font-weight: bold; padding: 8px;")
+            # 日付への移動は一覧表示のときだけ使う
+            is_list_view = self.schedule_view_stack.currentIndex() == 0
+            self.jump_date_input.setVisible(is_list_view)
+            self.jump_date_button.setVisible(is_list_view)
         else:
-            schedules = self.data_manager.get_current_schedules()
+            if schedules is None:
+                schedules = self.data_manager.get_current_schedules()
             self.list_header_label.setText("🗓️ 登録済みの予定")
             self.toggle_past_schedule_button.setText("過去の予定")
             self.toggle_past_schedule_button.setStyleSheet("background-color: #6c757d; color: white; font-weight: bold; padding: 8px;")
+            self.jump_date_input.hide()
+            self.jump_date_button.hide()
         
         self.schedules_data = {s[0]: s for s in schedules}
 
         for schedule in schedules:
-            schedule_id = schedule[0]
-            title = schedule[1]
-            start_dt = QDateTime.fromString(schedule[2], "yyyy-MM-dd HH:mm:ss").toString("MM/dd HH:mm")
+            self._add_schedule_item(schedule, archived=schedule[0] in self.archived_schedule_ids)
+        
+        if schedules:
+            self.schedule_list_widget.setCurrentRow(0)
+            self._show_schedule_detail(self.schedule_list_widget.currentItem())
+        else:
+            # 予定がない場合は詳細表示をクリア
+            self.detail_area.hide()
+        
+        # カレンダー表示にも変更を反映
+        self.calendar_view.refresh()
+
+    def _add_schedule_item(self, schedule, archived=False):
+        """予定1件分の項目を一覧の末尾に追加します。"""
+        schedule_id = schedule[0]
+        title = schedule[1]
+        # QDateTime.fromString は1件ごとの処理が重く件数が多いと起動が遅くなるため、
+        # "yyyy-MM-dd HH:mm:ss" 形式の文字列から直接組み立てる（アーカイブ済みの予定は年をまたぐため年も表示する）
+        start = schedule[2]
+        start_dt = f"{start[5:7]}/{start[8:10]} {start[11:16]}"
+        if archived:
+            start_dt = f"{start[:4]}/{start_dt}"
+        
+        item_text = f"{start_dt} - {title} 📦" if archived else f"{start_dt} - {title}"
+        list_item = QListWidgetItem(item_text)
+        
+        # ロックされている場合は表示を変える
+        # is_locked カラムは8番目だが、存在しない可能性もあるのでインデックスエラーを防止
+        is_locked = False
+        try:
+            is_locked = schedule[8] == 1
+        except IndexError:
+            # 古いレコードの場合はロックされていないとみなす
+            pass
             
-            item_text = f"{start_dt} - {title}"
-            list_item = QListWidgetItem(item_text)
+        # 完了状態を確認
+        is_completed = False
+        try:
+            is_completed = schedule[10] == 1  # is_completed カラムは10番目
+        except IndexError:
+            # 古いレコードの場合は完了していないとみなす
+            pass
             
-            # ロックされている場合は表示を変える
-            # is_locked カラムは8番目だが、存在しない可能性もあるのでインデックスエラーを防止
-            is_locked = False
-            try:
-                is_locked = schedule[8] == 1
-            except IndexError:
-                # 古いレコードの場合はロックされていないとみなす
-                pass
-                
-            # 完了状態を確認
-            is_completed = False
-            try:
-                is_completed = schedule[10] == 1  # is_completed カラムは10番目
-            except IndexError:
-                # 古いレコードの場合は完了していないとみなす
-                pass
-                
-            if is_locked:
-                list_item.setIcon(self.style().standardIcon(QStyle.SP_MessageBoxWarning))
-                list_item.setText(f"{item_text} 🔒")
-                
-            if is_completed:
-                # グレーアウト表示
-                list_item.setForeground(Qt.gray)
-                list_item.setText(f"{item_text} ✓")
+        if is_locked:
+            if self._lock_icon is None:
+                self._lock_icon = self.style().standardIcon(QStyle.SP_MessageBoxWarning)
+            list_item.setIcon(self._lock_icon)
+            list_item.setText(f"{item_text} 🔒")
             
-            list_item.setData(Qt.UserRole, schedule_id) 
-            self.schedule_list_widget.addItem(list_item)
+        if is_completed:
+            # グレーアウト表示
+            list_item.setForeground(Qt.gray)
+            list_item.setText(f"{item_text} ✓")
         
-        if schedules:
+        list_item.setData(Qt.UserRole, schedule_id) 
+        self.schedule_list_widget.addItem(list_item)
+
+    def _fetch_past_page(self):
+        """past_cursor より古い過去の予定を最大 PAST_PAGE_SIZE 件取得します。
+
+        本体のDBを読み切ったら、続きをアーカイブDBから取得します。
+        """
+        schedules = []
+        while self.past_source and len(schedules) < PAST_PAGE_SIZE:
+            limit = PAST_PAGE_SIZE - len(schedules)
+            if self.past_source == "main":
+                page = self.data_manager.get_past_schedules_page(self.past_cursor, limit)
+                if len(page) < limit:
+                    self.past_source = "archive"
+            else:
+                page = self.data_manager.get_archived_schedules(self.past_cursor, limit)
+                self.archived_schedule_ids.update(schedule[0] for schedule in page)
+                if len(page) < limit:
+                    self.past_source = None
+            if page:
+                self.past_cursor = (page[-1][2], page[-1][0])
+            schedules.extend(page)
+        return schedules
+
+    def _load_more_past_schedules(self):
+        """過去の予定を1ページ分、一覧の末尾に追加します。"""
+        for schedule in self._fetch_past_page():
+            self.schedules_data[schedule[0]] = schedule
+            self._add_schedule_item(schedule, archived=schedule[0] in self.archived_schedule_ids)
+
+    def _on_schedule_list_scrolled(self, value):
+        if self.show_past_schedules and self.past_source and value >= self.schedule_list_widget.verticalScrollBar().maximum():
+            self._load_more_past_schedules()
+
+    def _jump_to_date(self):
+        """指定した日付以前の過去の予定から一覧を表示し直します。"""
+        date = self.jump_date_input.date().toString("yyyy-MM-dd")
+        self.schedule_list_widget.clear()
+        self.archived_schedule_ids = set()
+        self.schedules_data = {}
+        # 指定日の終わりより前に始まった予定から読み込む
+        self.past_cursor = (f"{date} 23:59:59", sys.maxsize)
+        self.past_source = "main"
+        self._load_more_past_schedules()
+        if self.schedule_list_widget.count():
             self.schedule_list_widget.setCurrentRow(0)
             self._show_schedule_detail(self.schedule_list_widget.currentItem())
         else:
-            # 予定がない場合は詳細表示をクリア
             self.detail_area.hide()
 
     def _show_schedule_detail(self, item):
-        """リストで選択された予定の詳細を表示し、タスクをチェックボックスで表示します。"""
+        """リストで選択された予定の詳細を表示します。"""
         if not item:
             self.detail_area.hide()
             return
-            
-        schedule_id = item.data(Qt.UserRole)
+        self._show_schedule_detail_by_id(item.data(Qt.UserRole))
+
+    def _on_current_schedule_changed(self, current, previous):
+        # 一覧を作り直す途中（clear 直後など）で選択がなくなった場合は、読み込み後の選択に任せる
+        if current is not None and current.data(Qt.UserRole) != self.current_selected_schedule_id:
+            self._show_schedule_detail(current)
+
+    def _show_calendar_schedule(self, schedule):
+        """カレンダーでクリックされた予定の詳細を表示します。"""
+        self.schedules_data[schedule[0]] = schedule
+        self._show_schedule_detail_by_id(schedule[0])
+
+    @timed("gui.show_schedule_detail")
+    def _show_schedule_detail_by_id(self, schedule_id):
+        """予定の詳細を表示し、タスクをチェックボックスで表示します。"""
+        if self.data_manager is None:
+            return  # DBを開き終えたときに選択中の予定を表示する
         self.current_selected_schedule_id = schedule_id
         schedule_data = self.schedules_data.get(schedule_id)
 
         if schedule_data:
+            is_archived = schedule_id in self.archived_schedule_ids
             # is_locked カラムは8番目だが、存在しない可能性もあるのでインデックスエラーを防止
             is_locked = False
             try:
@@ -611,8 +969,8 @@ class ScheduleApp(QWidget):
             
             self.detail_title.setText(f"{schedule_data[1]}")
             self.detail_start_end.setText(f"<b>開始-終了:</b> {QDateTime.fromString(schedule_data[2], 'yyyy-MM-dd HH:mm:ss').toString('yyyy/MM/dd HH:mm')} - {QDateTime.fromString(schedule_data[3], 'yyyy-MM-dd HH:mm:ss').toString('yyyy/MM/dd HH:mm')}")
-            self.detail_location.setText(f"<b>場所:</b> {schedule_data[4] or '未設定'}")
-            self.detail_category.setText(f"<b>区分:</b> {schedule_data[5] or '未設定'}")
+            self.detail_location.setText(f"<b>場所:</b> {schedule_data[5] or '未設定'}")
+            self.detail_category.setText(f"<b>区分:</b> {schedule_data[4] or '未設定'}")
             
             # 通知設定を表示
             notification_minutes = None
@@ -651,35 +1009,23 @@ class ScheduleApp(QWidget):
             if is_completed:
                 self.detail_category.setText(f"{self.detail_category.text()} <b>✓ 完了済み</b>")
             
-            # 詳細内容を表示
-            self.detail_description_label.setText(schedule_data[6] or "なし") # descriptionカラムから詳細内容を表示
-
-            # 既存のタスクチェックボックスを全てクリア
-            for i in reversed(range(self.task_list_container.count())):
-                widget = self.task_list_container.itemAt(i).widget()
-                if widget is not None:
-                    widget.deleteLater()
-            
-            # タスク情報を取得してチェックボックスとして表示
-            tasks = self.data_manager.get_tasks_for_schedule(schedule_id)
-            if not tasks:
-                self.task_list_container.addWidget(QLabel("<i>タスクはありません</i>"))
-            else:
-                for task in tasks:
-                    task_id, task_desc, is_completed = task
-                    checkbox = QCheckBox(task_desc)
-                    checkbox.setChecked(bool(is_completed))
-                    checkbox.task_id = task_id
-                    checkbox.stateChanged.connect(self._on_task_checkbox_changed)
-                    checkbox.setEnabled(not is_locked)  # ロック中はチェックボックスを無効化
-                    self.task_list_container.addWidget(checkbox)
-            
-            # スクロールエリア内のウィジェットを更新したらレイアウトも更新
-            self.task_scroll_content.setLayout(self.task_list_container)
+            # 詳細内容を表示（一覧の読み込みでは読まないため、選択した予定の分だけ読む）
+            description = self.data_manager.get_schedule_description(schedule_id, archived=is_archived)
+            self.detail_description_label.setText(description or "なし")
+
+            # タスク情報を取得してチェックリストに表示（ロック中・アーカイブ済みはチェックできない）
+            tasks = self.data_manager.get_tasks_for_schedule(schedule_id, archived=is_archived)
+            self.task_checklist_model.set_tasks(tasks, editable=not is_locked and not is_archived)
+            self.task_checklist_view.scrollToTop()
             
-            # ロック状態に応じてボタンの状態を更新
-            self.edit_schedule_button.setEnabled(not is_locked)
-            self.delete_schedule_button.setEnabled(not is_locked)
+            # ロック状態に応じてボタンの状態を更新（アーカイブ済みの予定は閲覧のみ）
+            self.edit_schedule_button.setEnabled(not is_locked and not is_archived)
+            self.delete_schedule_button.setEnabled(not is_locked and not is_archived)
+            self.toggle_lock_button.setEnabled(not is_archived)
+            self.add_attachment_button.setEnabled(not is_locked and not is_archived)
+            self.delete_attachment_button.setEnabled(not is_locked and not is_archived)
+            if self.attachments_toggle.isChecked():
+                self._load_attachments()
             
             if is_locked:
                 self.toggle_lock_button.setText("ロック解除")
@@ -692,30 +1038,86 @@ class ScheduleApp(QWidget):
         else:
             self.detail_area.hide()
 
-    def _on_task_checkbox_changed(self, state):
-        checkbox = self.sender()
-        if checkbox:
-            task_id = getattr(checkbox, 'task_id', None)
-            if task_id:
-                is_completed = bool(state == 2)  # 2 = Qt.CheckState.Checked
-                self.data_manager.update_task_completion(task_id, is_completed)
-                print(f"タスク '{checkbox.text()}' の状態を更新: {'完了' if is_completed else '未完了'}")
-                
-                schedule_id = self.current_selected_schedule_id
-                if schedule_id:
-                    # 「スケジュールの開始」タスクのチェック状態を通知マネージャーに通知
-                    if checkbox.text() == "スケジュールの開始":
-                        self.notification_manager.update_task_check_status(schedule_id, "スケジュールの開始", is_completed)
+    def _toggle_attachments(self, expanded):
+        """添付ファイルの欄を開閉します（開いたときに現在の予定の添付ファイルを読み込む）。"""
+        self.attachments_toggle.setText(("▼" if expanded else "▶") + " 添付ファイル")
+        self.attachments_area.setVisible(expanded)
+        if expanded:
+            self._load_attachments()
+
+    def _load_attachments(self):
+        schedule_id = self.current_selected_schedule_id
+        archived = schedule_id in self.archived_schedule_ids
+        self.attachment_list.clear()
+        for attachment_id, filename, size, _ in self.data_manager.get_attachments(schedule_id, archived=archived):
+            item = QListWidgetItem(f"{filename} ({size / 1024:.1f} KB)")
+            item.setData(Qt.UserRole, (attachment_id, filename))
+            self.attachment_list.addItem(item)
+        self.attachments_toggle.setText(f"▼ 添付ファイル ({self.attachment_list.count()})")
+
+    def _add_attachment(self):
+        """選んだファイルを別スレッドで添付します（完了すると attachmentAdded が送られる）。"""
+        schedule_id = self.current_selected_schedule_id
+        file_path, _ = QFileDialog.getOpenFileName(self, "添付するファイル")
+        if not file_path or not schedule_id:
+            return
+        self.add_attachment_button.setEnabled(False)
+        self.executor.submit(
+            lambda: self.attachmentAdded.emit(schedule_id, self.data_manager.add_attachment(schedule_id, file_path))
+        )
+
+    def _on_attachment_added(self, schedule_id, attachment_id):
+        if attachment_id is None:
+            QMessageBox.warning(self, "添付失敗", "ファイルを添付できませんでした。")
+        if schedule_id == self.current_selected_schedule_id:
+            # 添付中に別の予定を選んでいた場合は、その予定の状態でボタンと一覧を更新する
+            self._show_schedule_detail_by_id(schedule_id)
+
+    def _open_attachment(self, item):
+        """添付ファイルを一時フォルダに書き出して、関連付けられたアプリで開きます。"""
+        attachment_id, filename = item.data(Qt.UserRole)
+        archived = self.current_selected_schedule_id in self.archived_schedule_ids
+        dest_dir = tempfile.mkdtemp(prefix="msm-attachment-")
+        dest_path = os.path.join(dest_dir, filename)
+        if not self.data_manager.export_attachment(attachment_id, dest_path, archived=archived):
+            QMessageBox.warning(self, "添付ファイル", "添付ファイルを開けませんでした。")
+            return
+        QDesktopServices.openUrl(QUrl.fromLocalFile(dest_path))
+
+    def _delete_attachment(self):
+        item = self.attachment_list.currentItem()
+        if item is None:
+            return
+        attachment_id, filename = item.data(Qt.UserRole)
+        reply = QMessageBox.question(
+            self, "添付ファイルの削除", f"'{filename}' を削除しますか？", QMessageBox.Yes | QMessageBox.No, QMessageBox.No,
+        )
+        if reply != QMessageBox.Yes:
+            return
+        if not self.data_manager.delete_attachment(attachment_id):
+            QMessageBox.warning(self, "添付ファイル", "添付ファイルを削除できませんでした。")
+        self._load_attachments()
+
+    def _on_task_toggled(self, task_id, task_desc, is_completed):
+        """チェックリストでタスクのチェックが切り替えられたときの処理"""
+        self.data_manager.update_task_completion(task_id, is_completed)
+        logger.debug("タスク '%s' の状態を更新: %s", task_desc, '完了' if is_completed else '未完了')
+        
+        schedule_id = self.current_selected_schedule_id
+        if schedule_id:
+            # 「スケジュールの開始」タスクのチェック状態を通知マネージャーに通知
+            if task_desc == "スケジュールの開始":
+                self.notification_manager.update_task_check_status(schedule_id, "スケジュールの開始", is_completed)
+            
+            # 「スケジュールの終了」タスクがチェックされた場合、予定を完了状態にする
+            if is_completed and task_desc == "スケジュールの終了":
+                self.data_manager.update_schedule_completion(schedule_id, True)
+                self._load_schedules_to_list()  # 一覧を更新して完了状態を反映
                     
-                    # 「スケジュールの終了」タスクがチェックされた場合、予定を完了状態にする
-                    if is_completed and checkbox.text() == "スケジュールの終了":
-                        self.data_manager.update_schedule_completion(schedule_id, True)
-                        self._load_schedules_to_list()  # 一覧を更新して完了状態を反映
-                            
-                    # 「スケジュールの終了」タスクのチェックが外された場合、予定の完了状態を解除
-                    elif not is_completed and checkbox.text() == "スケジュールの終了":
-                        self.data_manager.update_schedule_completion(schedule_id, False)
-                        self._load_schedules_to_list()  # 一覧を更新して完了状態を反映
+            # 「スケジュールの終了」タスクのチェックが外された場合、予定の完了状態を解除
+            elif not is_completed and task_desc == "スケジュールの終了":
+                self.data_manager.update_schedule_completion(schedule_id, False)
+                self._load_schedules_to_list()  # 一覧を更新して完了状態を反映
 
     def _edit_current_schedule(self):
         """選択された予定を編集モードで開く"""
@@ -729,6 +1131,13 @@ class ScheduleApp(QWidget):
         """編集対象の予定データをフォームに読み込む"""
         schedule_data = self.schedules_data.get(self.editing_schedule_id)
         if schedule_data:
+            # 保存時に他の端末で変更されていないか確認するため、読み込んだ時点の版を覚えておく
+            self.editing_schedule_version = None
+            try:
+                self.editing_schedule_version = schedule_data[13]  # version カラムは13番目
+            except IndexError:
+                pass
+            
             # フォームに既存データを設定
             self.title_input.setText(schedule_data[1])  # タイトル
             
@@ -740,12 +1149,14 @@ class ScheduleApp(QWidget):
             self.end_datetime_input.setDateTime(QDateTime.fromString(schedule_data[3], "yyyy-MM-dd HH:mm:ss"))
             
             # 区分（category）を設定
-            category_index = self.category_input.findText(schedule_data[5])
+            category_index = self.category_indexes.get(schedule_data[4], -1)
             if category_index != -1:
                 self.category_input.setCurrentIndex(category_index)
                 
-            self.location_input.setText(schedule_data[4] or "")  # 場所
-            self.details_content_input.setText(schedule_data[6] or "")  # 詳細内容
+            self.location_input.setText(schedule_data[5] or "")  # 場所
+            self.details_content_input.setText(
+                self.data_manager.get_schedule_description(self.editing_schedule_id) or ""
+            )  # 詳細内容
             
             # 通知設定を読み込む
             notification_minutes = None
@@ -821,6 +1232,157 @@ class ScheduleApp(QWidget):
         if hasattr(self, 'cancel_button'):
             self.cancel_button.hide()
 
+    def _reload_keeping_selection(self):
+        """予定リストを再読み込みし、読み込み前に選択していた予定を再選択します。"""
+        selected_id = getattr(self, 'current_selected_schedule_id', None)
+        self._load_schedules_to_list()
+        for i in range(self.schedule_list_widget.count()):
+            item = self.schedule_list_widget.item(i)
+            if item.data(Qt.UserRole) == selected_id:
+                self.schedule_list_widget.setCurrentItem(item)
+                self._show_schedule_detail(item)
+                break
+
+    def _reload_if_changed(self):
+        """他のインスタンスがDBを変更した場合だけ予定リストを読み直します（設定ファイルの更新も確認する）。"""
+        self.config_store.reload_if_changed()
+        data_version = self.data_manager.data_version()
+        if data_version != self._last_data_version:
+            self._last_data_version = data_version
+            logger.debug("他のインスタンスによる変更を検知したため予定を再読み込みします。")
+            self._reload_keeping_selection()
+
+    def _selected_schedule_ids(self):
+        """一覧で選択中の予定のIDを返します（閲覧のみのアーカイブ済みの予定は除く）。"""
+        return [
+            item.data(Qt.UserRole) for item in self.schedule_list_widget.selectedItems()
+            if item.data(Qt.UserRole) not in self.archived_schedule_ids
+        ]
+
+    def _bulk_update(self, action):
+        """選択中の予定をまとめてずらす・完了・ロック・ロック解除・削除します。"""
+        schedule_ids = self._selected_schedule_ids()
+        if not schedule_ids:
+            QMessageBox.information(self, "一括操作", "一覧で予定を選択してください（Ctrl/Shift+クリックで複数選択できます）。")
+            return
+
+        if action == "delete":
+            reply = QMessageBox.question(
+                self,
+                "削除確認",
+                f"選択した{len(schedule_ids)}件の予定を削除しますか？\nこの操作は元に戻せません。",
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.No
+            )
+            if reply != QMessageBox.Yes:
+                return
+            count = self.data_manager.delete_schedules(schedule_ids)
+        elif action == "shift":
+            count = self.data_manager.shift_schedules(schedule_ids, self.bulk_shift_spinbox.value())
+        elif action == "complete":
+            count = self.data_manager.set_schedules_completion(schedule_ids, True)
+        else:
+            # ロック/ロック解除は状態が変わらなかった予定も成功とみなす
+            self.data_manager.set_schedules_lock(schedule_ids, action == "lock")
+            count = len(schedule_ids)
+
+        if count < len(schedule_ids):
+            QMessageBox.information(
+                self, "一括操作", f"ロック中の予定など{len(schedule_ids) - count}件は変更されませんでした。"
+            )
+        self._reload_keeping_selection()
+
+    def _load_templates(self):
+        """テンプレートの選択肢を読み込み直します。"""
+        self.template_input.clear()
+        self.template_input.addItem("（テンプレートを選択）", None)
+        for template in self.data_manager.get_templates():
+            self.template_input.addItem(template[1], template)
+
+    def _apply_template(self, index):
+        """選択したテンプレートの内容をフォームに入力します（日時はそのまま）。"""
+        template = self.template_input.itemData(index)
+        if not template:
+            return
+        _, _, title, category, location, description, tasks, notification_minutes, task_notification_minutes = template
+        self.title_input.setText(title)
+        category_index = self.category_indexes.get(category, -1)
+        if category_index != -1:
+            self.category_input.setCurrentIndex(category_index)
+        self.location_input.setText(location or "")
+        self.details_content_input.setText(description or "")
+        self.task_input.setText("\n".join(tasks))
+        
+        self.notification_enabled_checkbox.setChecked(notification_minutes is not None)
+        if notification_minutes is not None:
+            self.notification_minutes_spinbox.setValue(notification_minutes)
+        self.task_notification_enabled_checkbox.setChecked(task_notification_minutes is not None)
+        if task_notification_minutes is not None:
+            self.task_notification_minutes_spinbox.setValue(task_notification_minutes)
+
+    def _save_as_template(self):
+        """フォームの内容をテンプレートとして保存します。"""
+        title = self.title_input.text().strip()
+        if not title:
+            QMessageBox.warning(self, "入力エラー", "テンプレートにするにはタイトルを入力してください。")
+            return
+        name, ok = QInputDialog.getText(self, "テンプレートの保存", "テンプレート名（同じ名前のテンプレートは上書きされます）:", text=title)
+        name = name.strip()
+        if not ok or not name:
+            return
+        
+        tasks = []
+        for line in self.task_input.toPlainText().split('\n'):
+            task_text = line.strip().lstrip('□✅- ').strip()
+            if task_text and task_text not in ["スケジュールの開始", "スケジュールの終了"]:
+                tasks.append(task_text)
+        notification_minutes = (
+            self.notification_minutes_spinbox.value() if self.notification_enabled_checkbox.isChecked() else None
+        )
+        task_notification_minutes = (
+            self.task_notification_minutes_spinbox.value() if self.task_notification_enabled_checkbox.isChecked() else None
+        )
+        template_id = self.data_manager.save_template(
+            name, title, self.category_input.currentText(), self.location_input.text().strip(),
+            self.details_content_input.toPlainText().strip(), tasks, notification_minutes, task_notification_minutes,
+        )
+        if template_id is None:
+            QMessageBox.critical(self, "保存失敗", "テンプレートの保存中にエラーが発生しました。")
+            return
+        self._load_templates()
+        self.template_input.setCurrentIndex(self.template_input.findText(name))
+
+    def _delete_template(self):
+        """選択中のテンプレートを削除します。"""
+        template = self.template_input.currentData()
+        if not template:
+            return
+        reply = QMessageBox.question(
+            self,
+            "削除確認",
+            f"テンプレート「{template[1]}」を削除しますか？",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+        if reply == QMessageBox.Yes:
+            self.data_manager.delete_template(template[0])
+            self._load_templates()
+
+    def _change_view_mode(self, index):
+        """一覧表示とカレンダー表示（日・週・月）を切り替えます。"""
+        if index == 0:
+            self.schedule_view_stack.setCurrentIndex(0)
+            self.toggle_past_schedule_button.show()
+            self._load_schedules_to_list()
+            return
+        # カレンダーは過去・現在の区別なく表示期間の予定を描画する
+        self.schedule_view_stack.setCurrentIndex(1)
+        self.toggle_past_schedule_button.hide()
+        self.jump_date_input.hide()
+        self.jump_date_button.hide()
+        self.calendar_view.set_mode(CalendarView.MODES[index - 1])
+        self.calendar_view.setFocus()
+
     def _toggle_past_schedules(self):
         """過去の予定表示と現在の予定表示を切り替えます。"""
         self.show_past_schedules = not self.show_past_schedules
@@ -831,14 +1393,8 @@ class ScheduleApp(QWidget):
         if hasattr(self, 'current_selected_schedule_id') and self.current_selected_schedule_id:
             success = self.data_manager.toggle_schedule_lock(self.current_selected_schedule_id)
             if success:
-                # 予定リストを再読み込み
-                self._load_schedules_to_list()
-                # 現在選択中の予定を再選択
-                for i in range(self.schedule_list_widget.count()):
-                    item = self.schedule_list_widget.item(i)
-                    if item.data(Qt.UserRole) == self.current_selected_schedule_id:
-                        self.schedule_list_widget.setCurrentItem(item)
-                        break
+                # 予定リストを再読み込みして、選択中の予定を再選択
+                self._reload_keeping_selection()
             else:
                 QMessageBox.warning(self, "操作失敗", "予定のロック状態を変更できませんでした。")
     
@@ -857,30 +1413,89 @@ class ScheduleApp(QWidget):
                 )
                 
                 if reply == QMessageBox.Yes:
-                    success = self.data_manager.delete_schedule(self.current_selected_schedule_id)
+                    expected_version = schedule_data[13] if len(schedule_data) > 13 else None
+                    success = self.data_manager.delete_schedule(self.current_selected_schedule_id, expected_version)
                     if success:
                         QMessageBox.information(self, "削除完了", f"予定「{title}」を削除しました。")
                         self._load_schedules_to_list()
+                    elif self.data_manager.last_error == "conflict":
+                        QMessageBox.warning(self, "削除失敗", "この予定は他の端末で変更されたため削除しませんでした。\n最新の内容を確認してください。")
+                        self._reload_keeping_selection()
                     else:
                         QMessageBox.warning(self, "削除失敗", "予定を削除できませんでした。ロックされている可能性があります。")
 
     def sync_google_calendar(self):
         QMessageBox.information(self, "同期", "Googleカレンダーとの同期機能を呼び出します。")
 
+    def _set_backup_buttons_enabled(self, enabled):
+        self.backup_button.setEnabled(enabled)
+        self.restore_button.setEnabled(enabled)
+
+    def start_backup(self):
+        """DBのバックアップを別スレッドで作成します（完了すると backupFinished が送られる）。"""
+        self._set_backup_buttons_enabled(False)
+        db_path = self.data_manager.db_path
+        self.executor.submit(lambda: self.backupFinished.emit(create_backup(db_path)))
+
+    def _on_backup_finished(self, result):
+        self._set_backup_buttons_enabled(True)
+        if result is None:
+            QMessageBox.warning(self, "バックアップ失敗", "バックアップを作成できませんでした。")
+            return
+        QMessageBox.information(
+            self, "バックアップ完了",
+            f"バックアップを作成しました。\n{result.path}\n（{result.seconds:.1f}秒, {throughput_mb_s(result):.1f} MB/秒）",
+        )
+
+    def restore_from_backup(self):
+        """選択したバックアップからDBを別スレッドで復元します（完了すると restoreFinished が送られる）。"""
+        backups = list_backups(self.data_manager.db_path)
+        if not backups:
+            QMessageBox.information(self, "復元", "バックアップがありません。")
+            return
+        labels = [f"{created_at:%Y/%m/%d %H:%M:%S}" for created_at, _ in backups]
+        label, ok = QInputDialog.getItem(self, "復元", "復元するバックアップ:", labels, 0, False)
+        if not ok:
+            return
+        reply = QMessageBox.question(
+            self, "復元の確認",
+            f"{label} の時点の内容に戻します。現在の内容はバックアップしてから置き換えます。よろしいですか？",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No,
+        )
+        if reply != QMessageBox.Yes:
+            return
+        path = backups[labels.index(label)][1]
+        self._set_backup_buttons_enabled(False)
+        self.executor.submit(lambda: self.restoreFinished.emit(restore_backup(self.data_manager, path)))
+
+    def _on_restore_finished(self, ok):
+        self._set_backup_buttons_enabled(True)
+        if not ok:
+            QMessageBox.warning(self, "復元失敗", "バックアップから復元できませんでした。")
+            return
+        self._last_data_version = self.data_manager.data_version()
+        self._reload_keeping_selection()
+        self.executor.submit(self.autocomplete_index.load, self.data_manager)
+        QMessageBox.information(self, "復元完了", "バックアップから復元しました。")
+
+    def _default_end_datetime(self, start_datetime):
+        """新しい予定の終了日時（開始日時の設定の default_duration_minutes 分後）を返します。"""
+        return start_datetime.addSecs(self.config_store.config.default_duration_minutes * 60)
+
     def _update_end_datetime(self, start_datetime):
         """開始日時が変更されたときに終了日時を自動的に1時間後に設定する"""
         # 現在の終了日時を取得
         current_end_datetime = self.end_datetime_input.dateTime()
         
-        # 新しい開始日時から1時間後の日時を計算
-        new_end_datetime = start_datetime.addSecs(3600)
+        # 新しい開始日時から既定の長さ（1時間）後の日時を計算
+        new_end_datetime = self._default_end_datetime(start_datetime)
         
         # 終了日時を更新（シグナルをブロックして無限ループを防止）
         self.end_datetime_input.setDateTime(new_end_datetime)
         
         # 終了日時が開始日時より前になっていないか確認
         if self.end_datetime_input.dateTime() <= start_datetime:
-            self.end_datetime_input.setDateTime(start_datetime.addSecs(3600))
+            self.end_datetime_input.setDateTime(self._default_end_datetime(start_datetime))
     
     def _toggle_notification_settings(self, state):
         """スケジュール通知設定の有効/無効を切り替える"""
@@ -898,22 +1513,42 @@ class ScheduleApp(QWidget):
         
         # 終了日時が開始日時より前の場合
         if end_datetime < start_datetime:
-            # 終了日時を開始日時の1時間後に設定
+            # 終了日時を開始日時の既定の長さ（1時間）後に設定
             self.end_datetime_input.blockSignals(True)  # シグナルをブロックして無限ループを防止
-            self.end_datetime_input.setDateTime(start_datetime.addSecs(3600))
+            self.end_datetime_input.setDateTime(self._default_end_datetime(start_datetime))
             self.end_datetime_input.blockSignals(False)
             
             # ユーザーに通知
             QMessageBox.warning(self, "入力エラー", "終了日時は開始日時よりも後に設定してください。\n自動的に開始時刻の1時間後に設定しました。")
     
     def closeEvent(self, event):
+        if self.stall_watchdog is not None:
+            self.heartbeat_timer.stop()
+            self.stall_watchdog.stop()
+        # 始まっていないバックグラウンド処理は取り消し、実行中の処理（バックアップなど）は終わるまで待つ
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.data_manager is None:
+            # DBを開き終える前に閉じた場合は、開き終えた DataManager を受け取って閉じる
+            if self._open_future is None or self._open_future.cancelled() or self._open_future.result() is None:
+                event.accept()
+                return
+            self.data_manager = self._open_future.result()
+        schedules = self.data_manager.get_current_schedules() if SNAPSHOT_ENABLED else None
         self.data_manager.close()
+        if schedules is not None:
+            # 接続を閉じてWALの内容がDBファイルに書き戻された後の状態を記録する
+            try:
+                write_snapshot(self.data_manager.snapshot_path, schedules, self.data_manager.db_path)
+            except OSError as e:
+                logger.warning("起動用スナップショットを書き出せませんでした: %s", e)
         event.accept()
         
 def run_gui():
     app = QApplication(sys.argv)
     window = ScheduleApp()
     window.show()
+    if WATCHDOG_ENABLED:
+        window.start_stall_watchdog()
     sys.exit(app.exec())
 
 if __name__ == "__main__":
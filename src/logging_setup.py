@@ -0,0 +1,46 @@
+# src/logging_setup.py
+
+import json
+import logging
+import os
+from datetime import datetime
+
+# LogRecord が標準で持つ属性（これ以外は extra で渡された構造化フィールドとみなす）
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """ログを1行1レコードのJSONとして出力するフォーマッタ"""
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        # extra={"schedule_id": 1} のように渡されたフィールドをそのまま含める
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(level=None, log_format=None):
+    """アプリ全体のログ設定を行います。
+
+    レベルと形式は引数、または環境変数 MSM_LOG_LEVEL / MSM_LOG_FORMAT (text|json) で指定します。
+    """
+    level = (level or os.environ.get("MSM_LOG_LEVEL", "INFO")).upper()
+    log_format = (log_format or os.environ.get("MSM_LOG_FORMAT", "text")).lower()
+
+    handler = logging.StreamHandler()
+    if log_format == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(getattr(logging, level, logging.INFO))
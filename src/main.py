@@ -1,14 +1,39 @@
 import sys
 import os
+import atexit
+import logging
 
 # プロジェクトのルートディレクトリをsys.pathに追加
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from src.config import ConfigError, get_config
+from src.logging_setup import setup_logging
+from src.metrics import metrics
 from src.gui import run_gui
 
+logger = logging.getLogger(__name__)
+
+def _export_metrics():
+    """終了時に計測結果を書き出す（MSM_METRICS_EXPORT で出力先を指定、.prom ならPrometheus形式）"""
+    export_path = os.environ.get("MSM_METRICS_EXPORT")
+    if not metrics.enabled or not export_path:
+        return
+    if export_path.endswith(".prom"):
+        metrics.export_prometheus(export_path)
+    else:
+        metrics.export_json(export_path)
+    logger.info("計測結果を書き出しました: %s", export_path)
+
 def main():
-    print("スケジュールマネージャーを起動します。")
+    setup_logging()
+    atexit.register(_export_metrics)
+    try:
+        get_config()  # 不正な設定があればウィンドウを開く前に終了する
+    except ConfigError as e:
+        logger.error("%s", e)
+        sys.exit(2)
+    logger.info("スケジュールマネージャーを起動します。")
     run_gui()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,141 @@
+# src/metrics.py
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+
+class Metrics:
+    """処理時間（タイマー）と回数（カウンター）を集計する軽量な計測クラス
+
+    無効時は各呼び出しがフラグ判定だけで戻るため、ホットパスにもそのまま埋め込めます。
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {}  # name: 値
+        self._timers = {}  # name: [回数, 合計秒, 最大秒]
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        """集計値をすべて破棄します。"""
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+
+    def increment(self, name, value=1):
+        """カウンターを加算します。"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        """タイマーに1回分の処理時間を記録します。"""
+        if not self.enabled:
+            return
+        with self._lock:
+            stat = self._timers.get(name)
+            if stat is None:
+                self._timers[name] = [1, seconds, seconds]
+            else:
+                stat[0] += 1
+                stat[1] += seconds
+                if seconds > stat[2]:
+                    stat[2] = seconds
+
+    @contextmanager
+    def timer(self, name):
+        """with ブロックの処理時間を記録するコンテキストマネージャ"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        """現在の集計値を辞書で返します。"""
+        with self._lock:
+            timers = {
+                name: {
+                    "count": count,
+                    "total_seconds": total,
+                    "avg_seconds": total / count if count else 0.0,
+                    "max_seconds": max_seconds,
+                }
+                for name, (count, total, max_seconds) in self._timers.items()
+            }
+            return {
+                "timestamp": time.time(),
+                "counters": dict(self._counters),
+                "timers": timers,
+            }
+
+    def export_json(self, path):
+        """集計値をJSONスナップショットとして書き出します。"""
+        self._write_atomically(path, json.dumps(self.snapshot(), ensure_ascii=False, indent=2))
+
+    def export_prometheus(self, path):
+        """集計値をPrometheusのテキスト形式（node_exporterのtextfile形式）で書き出します。"""
+        self._write_atomically(path, self.to_prometheus_text())
+
+    def to_prometheus_text(self):
+        """集計値をPrometheusのテキスト形式の文字列に変換します。"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = f"msm_{_sanitize(name)}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        for name, stat in sorted(snapshot["timers"].items()):
+            metric = f"msm_{_sanitize(name)}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            lines.append(f"{metric}_count {stat['count']}")
+            lines.append(f"{metric}_sum {stat['total_seconds']:.9f}")
+            lines.append(f"# TYPE {metric}_max gauge")
+            lines.append(f"{metric}_max {stat['max_seconds']:.9f}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _write_atomically(path, text):
+        # 収集側が書きかけのファイルを読まないよう、一時ファイル経由で置き換える
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+def _sanitize(name):
+    """メトリクス名をPrometheusで使える文字だけに変換します。"""
+    return "".join(c if c.isalnum() or c == "_" else "_" for c in name)
+
+
+# アプリ全体で共有する計測インスタンス（既定は無効）
+metrics = Metrics(enabled=os.environ.get("MSM_METRICS", "") not in ("", "0"))
+
+
+def timed(name):
+    """関数の処理時間と呼び出し回数を記録するデコレータ"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
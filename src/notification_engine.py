@@ -0,0 +1,267 @@
+# src/notification_engine.py
+"""通知の判定ロジック（Qtに依存しない）
+
+NotificationEngine は現在時刻を返す clock と通知の出力先 sink を差し替えられるため、
+GUIなしの常駐プロセスや、実時間より高速なシミュレーション・ベンチマークからも利用できます。
+"""
+
+import json
+import logging
+import threading
+import urllib.request
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from src.metrics import metrics, timed
+
+logger = logging.getLogger(__name__)
+
+START_TASK = "スケジュールの開始"
+START_REMINDER_MESSAGE = "スケジュールの開始時間から{minutes}分が経過しました。「スケジュールの開始」にチェックを入れてください。"
+
+# 通知1件分の情報（notification_type は "scheduled" または "start_reminder"）
+Notification = namedtuple(
+    "Notification", ["schedule_id", "title", "start_time", "notification_type", "message", "fired_at"]
+)
+
+
+class NotificationEngine:
+    """予定の通知が必要かどうかを判定し、sink に通知を渡すクラス"""
+    def __init__(self, data_manager, sink, clock=datetime.now, reminder_minutes=5, horizon_days=0):
+        self.data_manager = data_manager
+        self.sink = sink
+        # 現在時刻を返す関数（シミュレーションでは差し替える）
+        self.clock = clock
+        # 開始から何分後に「スケジュールの開始」のチェックを促し、その後何分おきに繰り返すか
+        self.reminder_minutes = reminder_minutes
+        # 開始が何日先までの予定を読み込むか（None なら制限なし）
+        self.horizon = timedelta(days=horizon_days) if horizon_days else None
+
+        # 最後に通知した時間を記録する辞書（"{schedule_id}_{種類}": last_notification_time）
+        self.last_notifications = {}
+
+        # スケジュール開始タスクのチェック状態を記録する辞書（schedule_id: is_checked）
+        self.schedule_start_checked = {}
+
+        # 通知を繰り返す予定のリスト
+        self.repeat_notification_schedules = set()
+
+        # DBに変更がない間は前回読み込んだ予定を使い回す（change_token が変わったときだけ読み直す）
+        self._schedules_cache = None
+        self._schedules_cache_token = None
+        self._schedules_cache_until = None  # キャッシュに含まれる予定の開始日時の上限（None なら制限なし）
+
+    def apply_config(self, config, changed=None):
+        """設定（src.config.Config）の通知の間隔と読み込む範囲を反映します。"""
+        self.reminder_minutes = config.reminder_repeat_minutes
+        horizon = timedelta(days=config.notification_horizon_days) if config.notification_horizon_days else None
+        if horizon != self.horizon:
+            self.horizon = horizon
+            self._schedules_cache = None  # 範囲が変わったので次のチェックで読み直す
+
+    @timed("notification_engine.check_notifications")
+    def check_notifications(self):
+        """通知が必要な予定をチェックし、通知した内容のリストを返す"""
+        current_time = self.clock()
+        fired = []
+
+        # 現在および未来の予定を取得
+        schedules = self._get_current_schedules(current_time)
+        self._prune_notification_state({schedule[0] for schedule in schedules})
+
+        for schedule in schedules:
+            schedule_id = schedule[0]
+            title = schedule[1]
+            start_time_str = schedule[2]
+
+            # 開始時間をdatetimeオブジェクトに変換
+            start_time = datetime.strptime(start_time_str, "%Y-%m-%d %H:%M:%S")
+
+            # 1. 通知設定による通知
+            notification_minutes = None
+            try:
+                notification_minutes = schedule[9]  # notification_minutes カラムは9番目
+            except IndexError:
+                pass
+
+            if notification_minutes is not None:
+                # 通知時間を計算（開始時間の何分前に通知するか）
+                notification_time = start_time - timedelta(minutes=notification_minutes)
+
+                # 現在時刻が通知時間を過ぎているかつ、まだ通知していないか、前回の通知から24時間以上経過している場合
+                last_notified = self.last_notifications.get(f"{schedule_id}_scheduled")
+                if (current_time >= notification_time and
+                    (last_notified is None or (current_time - last_notified).total_seconds() > 86400)):
+
+                    fired.append(self._notify(schedule_id, title, start_time_str, "scheduled", current_time))
+
+                    # 最後に通知した時間を記録
+                    self.last_notifications[f"{schedule_id}_scheduled"] = current_time
+
+            # 2. 開始時間から reminder_minutes 分後（既定は5分後）の強制通知
+            reminder_time = start_time + timedelta(minutes=self.reminder_minutes)
+
+            # 「スケジュールの開始」タスクのチェック状態を取得
+            start_task_checked = self.schedule_start_checked.get(schedule_id, False)
+
+            # 現在時刻が開始時間から reminder_minutes 分後を過ぎていて、まだ通知していない場合
+            last_notified = self.last_notifications.get(f"{schedule_id}_5min")
+            if (current_time >= reminder_time and not start_task_checked and
+                (last_notified is None or (current_time - last_notified).total_seconds() > self.reminder_minutes * 60)):  # reminder_minutes 分ごとに繰り返し
+
+                # 「スケジュールの開始」タスクのチェック状態を確認
+                tasks = self.data_manager.get_tasks_for_schedule(schedule_id)
+                for task in tasks:
+                    task_id, task_desc, is_completed = task
+                    if task_desc == START_TASK:
+                        if is_completed:
+                            start_task_checked = True
+                            self.schedule_start_checked[schedule_id] = True
+                            # チェックされていれば繰り返し通知リストから削除
+                            self.repeat_notification_schedules.discard(schedule_id)
+                        else:
+                            # チェックされていなければ繰り返し通知リストに追加
+                            self.repeat_notification_schedules.add(schedule_id)
+                        break
+
+                # チェックされていなければ通知
+                if not start_task_checked:
+                    fired.append(self._notify(
+                        schedule_id, title, start_time_str, "start_reminder", current_time,
+                        START_REMINDER_MESSAGE.format(minutes=self.reminder_minutes)
+                    ))
+
+                    # 最後に通知した時間を記録
+                    self.last_notifications[f"{schedule_id}_5min"] = current_time
+
+        return fired
+
+    def _get_current_schedules(self, current_time):
+        """現在および未来の予定を返す。DBが変わっていなければキャッシュから終了済みの予定を除くだけにする
+
+        horizon がある場合は開始が horizon の2倍先までの予定を読み込み、horizon 先がその範囲を超えたら読み直す。
+        """
+        change_token = getattr(self.data_manager, "change_token", None)
+        token = change_token() if change_token else None
+        until = self._schedules_cache_until
+        if (token is None or token != self._schedules_cache_token or self._schedules_cache is None or
+                (self.horizon is not None and (until is None or current_time + self.horizon > until))):
+            until = current_time + 2 * self.horizon if self.horizon is not None else None
+            self._schedules_cache = self.data_manager.get_current_schedules(current_time, until)
+            self._schedules_cache_token = token
+            self._schedules_cache_until = until
+        else:
+            current_datetime = current_time.strftime("%Y-%m-%d %H:%M:%S")
+            self._schedules_cache = [s for s in self._schedules_cache if s[3] >= current_datetime]
+        return self._schedules_cache
+
+    def seed_schedules(self, schedules):
+        """DBと同じ内容だと分かっている予定（起動用スナップショットなど）で最初のDB読み込みを省きます。"""
+        change_token = getattr(self.data_manager, "change_token", None)
+        self._schedules_cache = list(schedules)
+        self._schedules_cache_token = change_token() if change_token else None
+        self._schedules_cache_until = None
+
+    def _notify(self, schedule_id, title, start_time, notification_type, fired_at, custom_message=None):
+        """通知内容を組み立てて sink に渡す"""
+        if custom_message:
+            message = custom_message
+        else:
+            # 開始時間を読みやすい形式に変換
+            readable_time = datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S").strftime("%Y/%m/%d %H:%M")
+            message = f"予定「{title}」が {readable_time} から始まります。"
+
+        notification = Notification(schedule_id, title, start_time, notification_type, message, fired_at)
+        metrics.increment(f"notifications.{notification_type}")
+        logger.info("通知を送信します: 予定ID %s (%s)", schedule_id, notification_type)
+        self.sink.notify(notification)
+        return notification
+
+    def _prune_notification_state(self, active_schedule_ids):
+        """終了・削除された予定の通知記録を破棄する（長時間稼働で辞書が増え続けないように）"""
+        for key in list(self.last_notifications):
+            if int(key.split("_", 1)[0]) not in active_schedule_ids:
+                del self.last_notifications[key]
+        for schedule_id in list(self.schedule_start_checked):
+            if schedule_id not in active_schedule_ids:
+                del self.schedule_start_checked[schedule_id]
+        self.repeat_notification_schedules &= active_schedule_ids
+
+    def update_task_check_status(self, schedule_id, task_desc, is_checked):
+        """タスクのチェック状態を更新する"""
+        if task_desc == START_TASK:
+            self.schedule_start_checked[schedule_id] = is_checked
+            # チェックされていれば繰り返し通知リストから削除
+            if is_checked:
+                self.repeat_notification_schedules.discard(schedule_id)
+
+
+class CompositeSink:
+    """複数の sink に同じ通知を配る"""
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    def notify(self, notification):
+        for sink in self.sinks:
+            try:
+                sink.notify(notification)
+            except Exception:
+                # 1つの出力先の失敗で他の出力先への通知を止めない
+                logger.exception("通知の出力に失敗しました: %s", type(sink).__name__)
+
+
+class RecordingSink:
+    """通知をメモリに記録するだけの sink（テスト・シミュレーション用）"""
+    def __init__(self):
+        self.notifications = []
+
+    def notify(self, notification):
+        self.notifications.append(notification)
+
+
+class LogSink:
+    """通知をログに出力する sink"""
+    def __init__(self, level=logging.INFO):
+        self.level = level
+
+    def notify(self, notification):
+        logger.log(self.level, "[通知] %s", notification.message)
+
+
+class LogFileSink:
+    """通知を1行1件のJSONとしてファイルに追記する sink"""
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def notify(self, notification):
+        line = json.dumps(notification_to_dict(notification), ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class WebhookSink:
+    """通知をJSONとして指定URLにPOSTする sink（外部サービス連携の代替）"""
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def notify(self, notification):
+        body = json.dumps(notification_to_dict(notification), ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(
+            self.url, data=body, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+def notification_to_dict(notification):
+    """通知をJSONに変換できる辞書にします。"""
+    data = notification._asdict()
+    data["fired_at"] = notification.fired_at.isoformat()
+    return data
+
+
+def notification_from_dict(data):
+    """notification_to_dict で作った辞書から通知を復元します。"""
+    return Notification(**dict(data, fired_at=datetime.fromisoformat(data["fired_at"])))
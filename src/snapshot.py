@@ -0,0 +1,213 @@
+# src/snapshot.py
+"""起動を速くするための現在の予定のスナップショット
+
+終了時に現在および未来の予定の一覧表示と通知判定に使う項目だけを配列形式のバイナリファイルに書き出し、
+次回起動時は mmap で読み込んで、DBへの問い合わせより先に一覧表示と通知の判定を始められるようにします。
+書き出した時点のDBファイル（とWALファイル）のサイズ・更新日時を記録しておき、起動時にそれが一致しない場合や
+チェックサムが合わない場合はスナップショットを使わずにDBから読み込みます。
+"""
+
+import array
+import logging
+import mmap
+import os
+import struct
+import sys
+import zlib
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MSMSNAP1"
+FORMAT_VERSION = 1
+# magic, 形式のバージョン, バイト順, 件数, 文字列領域のサイズ, チェックサム, DBファイルの署名（4つ）
+HEADER = struct.Struct("<8sI1sxxxIIIqqqq")
+BYTE_ORDER = b"<" if sys.byteorder == "little" else b">"
+
+EPOCH = datetime(1970, 1, 1)  # 日時はタイムゾーンなしのままこの日時からの秒数で保存する
+STRING_FIELDS = (1, 4, 5)  # 文字列領域に保存するカラム（title, category, location）
+NONE_VALUE = -1  # 通知設定なし（NULL）を表す値
+
+FLAG_LOCKED = 1
+FLAG_COMPLETED = 2
+
+# 配列の並び（名前, array の型コード）。文字列領域はこの後に置く
+ARRAYS = (
+    ("ids", "q"),
+    ("starts", "q"),
+    ("ends", "q"),
+    ("versions", "q"),
+    ("notification_minutes", "i"),
+    ("task_notification_minutes", "i"),
+    ("string_offsets", "I"),  # 文字列領域をデコードした文字列での位置（件数 × len(STRING_FIELDS) + 1 個）
+    ("flags", "B"),
+)
+
+
+def db_file_signature(db_path):
+    """DBファイルとWALファイルの (サイズ, 更新日時) を返します。どちらかが変わればDBの内容も変わった可能性があります。"""
+    signature = []
+    for path in (db_path, db_path + "-wal"):
+        try:
+            stat = os.stat(path)
+            signature += [stat.st_size, stat.st_mtime_ns]
+        except FileNotFoundError:
+            signature += [0, 0]
+    return tuple(signature)
+
+
+def _to_seconds(value):
+    return int((value - EPOCH).total_seconds())
+
+
+def _padding(size):
+    return b"\0" * (-size % 8)
+
+
+def write_snapshot(path, schedules, db_path):
+    """予定のリストをスナップショットとして書き出します。
+
+    DBへの変更がすべてDBファイルに書き戻された後（接続を閉じた後）に呼び出してください。
+    一時ファイルに書いてから置き換えるため、書き出し中に終了しても壊れたファイルは残りません。
+    """
+    columns = {name: array.array(typecode) for name, typecode in ARRAYS}
+    strings = []
+    string_length = 0
+    columns["string_offsets"].append(0)
+    for schedule in schedules:
+        columns["ids"].append(schedule[0])
+        # strptime より速い fromisoformat で "YYYY-MM-DD HH:MM:SS" を読む
+        columns["starts"].append(_to_seconds(datetime.fromisoformat(schedule[2])))
+        columns["ends"].append(_to_seconds(datetime.fromisoformat(schedule[3])))
+        columns["versions"].append(schedule[13] or 1)
+        columns["notification_minutes"].append(NONE_VALUE if schedule[9] is None else schedule[9])
+        columns["task_notification_minutes"].append(NONE_VALUE if schedule[12] is None else schedule[12])
+        columns["flags"].append((FLAG_LOCKED if schedule[8] == 1 else 0) | (FLAG_COMPLETED if schedule[10] == 1 else 0))
+        for index in STRING_FIELDS:
+            value = schedule[index] or ""
+            strings.append(value)
+            string_length += len(value)
+            columns["string_offsets"].append(string_length)
+
+    body = bytearray()
+    for name, _ in ARRAYS:
+        data = columns[name].tobytes()
+        body += data + _padding(len(data))
+    strings = "".join(strings).encode("utf-8")
+    body += strings
+
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, BYTE_ORDER, len(schedules), len(strings), zlib.crc32(body),
+        *db_file_signature(db_path),
+    )
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(body)
+    os.replace(tmp_path, path)
+    logger.info("起動用スナップショットを書き出しました: %s (%s件)", path, len(schedules))
+
+
+def load_snapshot(path, db_path):
+    """スナップショットを読み込みます。存在しない・DBと一致しない・壊れている場合は None を返します。
+
+    DBを開くとWALファイルが作られて署名が変わるため、DataManager を作成する前に呼び出してください。
+    """
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                return None
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        logger.warning("起動用スナップショットを読み込めませんでした: %s", e)
+        return None
+
+    magic, version, byte_order, count, strings_size, checksum, *signature = HEADER.unpack_from(mapped)
+    if magic != MAGIC or version != FORMAT_VERSION or byte_order != BYTE_ORDER:
+        logger.info("起動用スナップショットの形式が異なるため使用しません: %s", path)
+    elif tuple(signature) != db_file_signature(db_path):
+        logger.info("スナップショットの書き出し後にデータベースが変更されたため使用しません。")
+    else:
+        body = memoryview(mapped)[HEADER.size:]
+        valid = zlib.crc32(body) == checksum
+        body.release()
+        if valid:
+            return ScheduleSnapshot(mapped, count, strings_size)
+        logger.warning("起動用スナップショットが壊れているため使用しません: %s", path)
+    mapped.close()
+    return None
+
+
+class ScheduleSnapshot:
+    """mmap したスナップショットをコピーせずに配列として参照するクラス"""
+    def __init__(self, mapped, count, strings_size):
+        self._mapped = mapped
+        self._views = []
+        self.count = count
+        offset = HEADER.size
+        for name, typecode in ARRAYS:
+            length = count * len(STRING_FIELDS) + 1 if name == "string_offsets" else count
+            size = length * array.array(typecode).itemsize
+            view = memoryview(mapped)[offset:offset + size].cast(typecode)
+            self._views.append(view)
+            setattr(self, name, view)
+            offset += size + len(_padding(size))
+        self._strings = memoryview(mapped)[offset:offset + strings_size]
+        self._views.append(self._strings)
+
+    def __len__(self):
+        return self.count
+
+    def current_schedules(self, now=None):
+        """now の時点で終了していない予定を、get_current_schedules と同じ並びのタプルのリストで返します。
+
+        保存していない詳細内容・作成日時・完了日時は None になります。
+        配列はまとめてリストに変換し、日付部分の文字列は日ごとに使い回して、1件ずつの変換を軽くしています。
+        """
+        now_seconds = _to_seconds(now or datetime.now().replace(microsecond=0))
+        text = bytes(self._strings).decode("utf-8")
+        offsets = self.string_offsets.tolist()
+        day_strings = {}
+
+        def format_seconds(seconds):
+            day, rest = divmod(seconds, 86400)
+            day_string = day_strings.get(day)
+            if day_string is None:
+                day_string = day_strings[day] = (EPOCH + timedelta(days=day)).strftime("%Y-%m-%d ")
+            hours, rest = divmod(rest, 3600)
+            return f"{day_string}{hours:02d}:{rest // 60:02d}:{rest % 60:02d}"
+
+        schedules = []
+        fields = len(STRING_FIELDS)
+        for index, (schedule_id, start, end, version, notification_minutes, task_notification_minutes, flags) in enumerate(zip(
+            self.ids.tolist(), self.starts.tolist(), self.ends.tolist(), self.versions.tolist(),
+            self.notification_minutes.tolist(), self.task_notification_minutes.tolist(), self.flags.tolist(),
+        )):
+            if end < now_seconds:
+                continue
+            base = index * fields
+            schedules.append((
+                schedule_id,
+                text[offsets[base]:offsets[base + 1]],
+                format_seconds(start),
+                format_seconds(end),
+                text[offsets[base + 1]:offsets[base + 2]],
+                text[offsets[base + 2]:offsets[base + 3]],
+                None,
+                None,
+                1 if flags & FLAG_LOCKED else 0,
+                None if notification_minutes == NONE_VALUE else notification_minutes,
+                1 if flags & FLAG_COMPLETED else 0,
+                None,
+                None if task_notification_minutes == NONE_VALUE else task_notification_minutes,
+                version,
+            ))
+        return schedules
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._views = []
+        self._mapped.close()
@@ -0,0 +1,248 @@
+# src/soak_test.py
+"""通知機能のソークテスト（長期間稼働のシミュレーション）
+
+シミュレーション用の時計で NotificationEngine を実時間より高速に動かし、
+数ヶ月分の合成予定に対する通知の発火精度、取りこぼし・重複、メモリ使用量の推移を計測します。
+通知の出力先は記録用の RecordingSink に差し替えるため、Qtなしで実行できます。
+
+使い方（リポジトリのルートで実行）:
+    python -m src.soak_test --days 90 --schedules-per-day 20 --output soak.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from src.data_manager import DataManager
+from src.notification_engine import START_TASK, NotificationEngine, RecordingSink
+
+logger = logging.getLogger(__name__)
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+NOTIFICATION_MINUTES_CHOICES = [None, 0, 5, 15, 30, 60, 1440]
+
+
+class SimulatedClock:
+    """手動で進めるシミュレーション用の時計"""
+    def __init__(self, start):
+        self.current = start
+
+    def now(self):
+        return self.current
+
+    def advance(self, delta):
+        self.current += delta
+
+
+def generate_schedules(dm, start, days, schedules_per_day, delete_ratio, seed):
+    """合成予定をDBに登録し、予定ごとの期待値とユーザー操作の一覧を返します。"""
+    rng = random.Random(seed)
+    plans = {}
+    actions = []  # (時刻, 操作, schedule_id)
+    for _ in range(days * schedules_per_day):
+        # 通知時刻がシミュレーション開始より前にならないよう、開始日時は1日目以降に置く
+        schedule_start = start + timedelta(days=1, minutes=rng.randrange((days - 1) * 24 * 60))
+        schedule_end = schedule_start + timedelta(minutes=rng.choice([30, 60, 120, 180]))
+        notification_minutes = rng.choice(NOTIFICATION_MINUTES_CHOICES)
+        schedule_id = dm.save_schedule(
+            "ソークテスト", schedule_start.strftime(DATETIME_FORMAT), schedule_end.strftime(DATETIME_FORMAT),
+            "仕事", "", "", 0, notification_minutes,
+        )
+        dm.save_tasks(schedule_id, ["スケジュールの開始", "スケジュールの終了"])
+
+        # 利用者が「スケジュールの開始」にチェックを入れるまでの時間（None はチェックしない）
+        check_delay = rng.choice([None, 0, 3, 7, 12, 20])
+        check_at = schedule_start + timedelta(minutes=check_delay) if check_delay is not None else None
+        if check_at is not None:
+            actions.append((check_at, "check", schedule_id))
+
+        delete_at = None
+        if rng.random() < delete_ratio:
+            delete_at = schedule_start - timedelta(minutes=rng.randrange(1, 3 * 24 * 60))
+            actions.append((delete_at, "delete", schedule_id))
+
+        plans[schedule_id] = {
+            "start": schedule_start,
+            "end": schedule_end,
+            "notification_minutes": notification_minutes,
+            "check_at": check_at,
+            "delete_at": delete_at,
+        }
+    actions.sort(key=lambda action: action[0])
+    return plans, actions
+
+
+def run_soak(days=30, schedules_per_day=20, tick_seconds=60, delete_ratio=0.05, seed=0,
+             sample_every=timedelta(days=1), start=datetime(2030, 1, 1)):
+    """ソークテストを実行し、結果を辞書で返します。"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dm = DataManager(os.path.join(tmp_dir, "soak.db"))
+        plans, actions = generate_schedules(dm, start, days, schedules_per_day, delete_ratio, seed)
+
+        clock = SimulatedClock(start)
+        sink = RecordingSink()
+        engine = NotificationEngine(dm, sink, clock=clock.now)
+
+        tracemalloc.start()
+        memory_samples = []
+        next_sample = start
+        action_index = 0
+        ticks = 0
+        end = start + timedelta(days=days)
+        tick = timedelta(seconds=tick_seconds)
+        wall_start = time.perf_counter()
+
+        while clock.now() < end:
+            # この時刻までに発生したユーザー操作を反映する
+            while action_index < len(actions) and actions[action_index][0] <= clock.now():
+                _, action, schedule_id = actions[action_index]
+                if action == "check" and plans[schedule_id]["delete_at"] is None:
+                    for task_id, task_desc, _ in dm.get_tasks_for_schedule(schedule_id):
+                        if task_desc == START_TASK:
+                            dm.update_task_completion(task_id, True)
+                            engine.update_task_check_status(schedule_id, task_desc, True)
+                elif action == "delete":
+                    dm.delete_schedule(schedule_id)
+                action_index += 1
+
+            engine.check_notifications()
+            ticks += 1
+
+            if clock.now() >= next_sample:
+                current, peak = tracemalloc.get_traced_memory()
+                memory_samples.append({
+                    "sim_time": clock.now().isoformat(),
+                    "traced_bytes": current,
+                    "peak_bytes": peak,
+                    "last_notifications": len(engine.last_notifications),
+                    "schedule_start_checked": len(engine.schedule_start_checked),
+                    "repeat_notification_schedules": len(engine.repeat_notification_schedules),
+                })
+                next_sample += sample_every
+            clock.advance(tick)
+
+        wall_seconds = time.perf_counter() - wall_start
+        tracemalloc.stop()
+        dm.close()
+
+    events = [(n.fired_at, n.schedule_id, n.notification_type) for n in sink.notifications]
+    report = evaluate(plans, events, start, end, tick_seconds)
+    report.update({
+        "parameters": {
+            "days": days,
+            "schedules_per_day": schedules_per_day,
+            "tick_seconds": tick_seconds,
+            "delete_ratio": delete_ratio,
+            "seed": seed,
+            "start": start.isoformat(),
+        },
+        "ticks": ticks,
+        "wall_seconds": wall_seconds,
+        "speedup": (end - start).total_seconds() / wall_seconds if wall_seconds else None,
+        "memory": memory_samples,
+    })
+    return report
+
+
+def evaluate(plans, events, start, end, tick_seconds):
+    """記録された通知を予定ごとの期待値と突き合わせます。"""
+    fired = defaultdict(list)
+    for fired_at, schedule_id, notification_type in events:
+        fired[(schedule_id, notification_type)].append(fired_at)
+
+    scheduled = {"expected": 0, "fired": 0, "missed": 0, "duplicates": 0, "delays_seconds": []}
+    reminders = {"expected": 0, "fired": 0, "missed": 0, "after_check": 0, "after_delete": 0,
+                 "first_delays_seconds": [], "repeat_intervals_seconds": []}
+
+    for schedule_id, plan in plans.items():
+        deleted_at = plan["delete_at"]
+
+        # 1. 通知設定による通知: 通知時刻以降に1回だけ発火するはず
+        if plan["notification_minutes"] is not None:
+            expected_at = plan["start"] - timedelta(minutes=plan["notification_minutes"])
+            times = fired[(schedule_id, "scheduled")]
+            if expected_at < end and (deleted_at is None or deleted_at > expected_at):
+                scheduled["expected"] += 1
+                if times:
+                    scheduled["fired"] += 1
+                    scheduled["delays_seconds"].append((times[0] - expected_at).total_seconds())
+                    scheduled["duplicates"] += len(times) - 1
+                else:
+                    scheduled["missed"] += 1
+
+        # 2. 開始5分後の催促: チェックされるか予定が終わるまで繰り返し発火するはず
+        first_due = plan["start"] + timedelta(minutes=5)
+        times = fired[(schedule_id, "start_reminder")]
+        reminders["fired"] += len(times)
+        if deleted_at is not None:
+            reminders["after_delete"] += sum(1 for t in times if t >= deleted_at)
+            continue
+        if plan["check_at"] is not None:
+            reminders["after_check"] += sum(1 for t in times if t >= plan["check_at"])
+        checked_before_due = plan["check_at"] is not None and plan["check_at"] <= first_due
+        if first_due < min(end, plan["end"]) and not checked_before_due:
+            reminders["expected"] += 1
+            if times:
+                reminders["first_delays_seconds"].append((times[0] - first_due).total_seconds())
+                reminders["repeat_intervals_seconds"].extend(
+                    (later - earlier).total_seconds() for earlier, later in zip(times, times[1:])
+                )
+            else:
+                reminders["missed"] += 1
+
+    for stats, key in ((scheduled, "delays_seconds"), (reminders, "first_delays_seconds"),
+                       (reminders, "repeat_intervals_seconds")):
+        values = stats.pop(key)
+        stats[key.replace("_seconds", "")] = _summarize(values)
+
+    return {
+        "scheduled_notifications": scheduled,
+        "start_reminders": reminders,
+        "accuracy_limit_seconds": tick_seconds,
+    }
+
+
+def _summarize(values):
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "min_seconds": values[0],
+        "mean_seconds": sum(values) / len(values),
+        "max_seconds": values[-1],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="通知機能のソークテスト")
+    parser.add_argument("--days", type=int, default=30, help="シミュレーションする日数")
+    parser.add_argument("--schedules-per-day", type=int, default=20, help="1日あたりの合成予定数")
+    parser.add_argument("--tick-seconds", type=int, default=60, help="通知チェックの間隔（秒）")
+    parser.add_argument("--delete-ratio", type=float, default=0.05, help="開始前に削除される予定の割合")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    parser.add_argument("--output", help="結果を書き出すJSONファイル")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    report = run_soak(args.days, args.schedules_per_day, args.tick_seconds, args.delete_ratio, args.seed)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
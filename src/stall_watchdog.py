@@ -0,0 +1,175 @@
+# src/stall_watchdog.py
+"""GUIのイベントループの停止（フリーズ）を検出するウォッチドッグ（Qtに依存しない）
+
+GUIのスレッドはタイマーで一定間隔ごとに beat() を呼び、予定の時刻からの遅れをイベントループの遅延として
+ヒストグラムに記録します。監視スレッドは最後の beat() から threshold 秒以上経つと停止とみなし、
+sys._current_frames で取得したGUIのスレッドのスタックと、そのスレッドが最後に実行を始めたDataManagerのクエリを記録します。
+直近の停止とヒストグラムは JSON のレポートファイルに書き出します（停止を検出するたびと終了時に更新）。
+"""
+
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 遅延のヒストグラムの区切り（ミリ秒、各区間の上限。最後の区間は上限なし）
+LATENCY_BUCKETS_MS = (5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+MAX_STACK_FRAMES = 40  # レポートに残すスタックの深さ
+MAX_QUERY_LENGTH = 500  # レポートに残すSQLの長さ
+
+
+class LatencyHistogram:
+    """遅延（ミリ秒）を LATENCY_BUCKETS_MS の区間ごとに数えるヒストグラム"""
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0
+        self.max_ms = 0.0
+
+    def add(self, value_ms):
+        self.counts[bisect.bisect_left(self.buckets, value_ms)] += 1
+        self.total += 1
+        if value_ms > self.max_ms:
+            self.max_ms = value_ms
+
+    def percentile(self, ratio):
+        """ratio（0〜1）の位置の値が含まれる区間の上限を返します（最後の区間なら記録した最大値）。"""
+        if not self.total:
+            return 0.0
+        rank = ratio * self.total
+        seen = 0
+        for bucket, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return float(bucket)
+        return self.max_ms
+
+    def to_dict(self):
+        labels = [f"<={bucket}ms" for bucket in self.buckets] + [f">{self.buckets[-1]}ms"]
+        return {
+            "count": self.total,
+            "max_ms": round(self.max_ms, 1),
+            "p50_ms": self.percentile(0.5),
+            "p99_ms": self.percentile(0.99),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class StallWatchdog:
+    """GUIのスレッドの beat() が途絶えたときにスタックと実行中のクエリを記録するクラス"""
+    def __init__(self, report_path, data_manager=None, threshold=0.5, heartbeat_interval=0.1,
+                 max_stalls=50, thread_id=None):
+        self.report_path = report_path
+        self.data_manager = data_manager  # 最後に実行を始めたクエリを取得する（None なら記録しない）
+        self.threshold = threshold  # この秒数以上 beat() が呼ばれなければ停止とみなす
+        self.heartbeat_interval = heartbeat_interval  # beat() を呼ぶ間隔（秒）
+        self.thread_id = thread_id or threading.get_ident()  # 監視するスレッド（既定は作成したスレッド）
+        self.histogram = LatencyHistogram()
+        self.stalls = deque(maxlen=max_stalls)  # 直近の停止の記録（古いものから捨てる）
+        self.stall_count = 0
+        self._lock = threading.Lock()
+        self._last_beat = time.monotonic()
+        self._current_stall = None  # 検出中の停止の記録（beat() で終了時刻を書き込む）
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """監視スレッドを開始します。"""
+        self._last_beat = time.monotonic()
+        if self.data_manager is not None:
+            self.data_manager.enable_query_tracking()
+        self._thread = threading.Thread(target=self._run, name="stall-watchdog", daemon=True)
+        self._thread.start()
+        logger.info("イベントループの監視を開始しました（%s秒以上の停止を記録）: %s", self.threshold, self.report_path)
+
+    def stop(self):
+        """監視スレッドを止めて、最後のレポートを書き出します。"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.write_report()
+
+    def beat(self):
+        """監視するスレッドから heartbeat_interval ごとに呼び出します。"""
+        now = time.monotonic()
+        with self._lock:
+            interval = now - self._last_beat
+            latency = max(0.0, interval - self.heartbeat_interval)
+            self._last_beat = now
+            self.histogram.add(latency * 1000)
+            stall = self._current_stall
+            self._current_stall = None
+            if stall is not None:
+                stall["duration_ms"] = round(interval * 1000)
+        metrics.observe("gui.event_loop_latency", latency)
+        if stall is not None:
+            logger.warning("イベントループが%sミリ秒停止していました（%s）。", stall["duration_ms"], stall["location"])
+
+    def _run(self):
+        # 停止を検出する遅れが threshold の1/4以内になる間隔で確認する
+        while not self._stop_event.wait(self.threshold / 4):
+            with self._lock:
+                stalled_for = time.monotonic() - self._last_beat - self.heartbeat_interval
+                if stalled_for < self.threshold or self._current_stall is not None:
+                    continue
+                stall = self._capture(stalled_for)
+                self._current_stall = stall
+                self.stalls.append(stall)
+                self.stall_count += 1
+            metrics.increment("gui.stalls")
+            logger.warning("イベントループが%.1f秒以上停止しています: %s", stalled_for, stall["location"])
+            self.write_report()
+
+    def _capture(self, stalled_for):
+        """監視するスレッドの現在のスタックと、最後に実行を始めたクエリを記録します。"""
+        frame = sys._current_frames().get(self.thread_id)
+        stack = traceback.format_stack(frame, limit=MAX_STACK_FRAMES) if frame is not None else []
+        location = "不明"
+        if frame is not None:
+            location = f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})"
+        query = self.data_manager.current_query(self.thread_id) if self.data_manager is not None else None
+        if query is not None:
+            sql, started = query
+            # スタックの先頭が DataManager のメソッドなら、このクエリの実行中に止まっている
+            query = {"sql": " ".join(sql.split())[:MAX_QUERY_LENGTH], "started_ms_ago": round((time.monotonic() - started) * 1000)}
+        return {
+            "detected_at": datetime.now().isoformat(timespec="milliseconds"),
+            "stalled_ms_at_detection": round(stalled_for * 1000),
+            "duration_ms": None,  # 停止が終わった時点で記録する
+            "location": location,
+            "query": query,
+            "stack": [line.rstrip() for line in stack],
+        }
+
+    def report(self):
+        """レポートの内容を辞書で返します。"""
+        with self._lock:
+            return {
+                "generated_at": datetime.now().isoformat(timespec="seconds"),
+                "threshold_ms": round(self.threshold * 1000),
+                "heartbeat_interval_ms": round(self.heartbeat_interval * 1000),
+                "stall_count": self.stall_count,
+                "event_loop_latency": self.histogram.to_dict(),
+                "stalls": [dict(stall) for stall in self.stalls],
+            }
+
+    def write_report(self):
+        """レポートを一時ファイル経由で書き出します（書きかけのファイルを読まれないようにする）。"""
+        tmp_path = f"{self.report_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.report(), f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.report_path)
+        except OSError as e:
+            logger.warning("停止レポートを書き出せませんでした: %s", e)
@@ -0,0 +1,107 @@
+# src/task_checklist.py
+"""詳細表示のタスクのチェックリスト
+
+タスクごとに QCheckBox を作る代わりに、タスクの一覧をモデルに持たせて QListView で表示します。
+ビューは画面に見えている行だけを描画するため、タスクが数百件ある予定でもウィジェットの生成・破棄が発生せず、
+別の予定を選んだときは件数が同じならモデルの中身を書き換えるだけで済みます。
+"""
+
+from PySide6.QtCore import QAbstractListModel, QEvent, QModelIndex, Qt, Signal
+from PySide6.QtGui import QFont, QPainter
+from PySide6.QtWidgets import QAbstractItemView, QListView, QStyledItemDelegate
+
+
+class TaskChecklistModel(QAbstractListModel):
+    """1つの予定のタスク（task_id, task_description, is_completed）を保持するモデル"""
+    taskToggled = Signal(int, str, bool)  # ユーザーがチェックを切り替えたタスクの id, 内容, 完了状態
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._tasks = []  # [task_id, task_description, is_completed] のリスト
+        self._editable = True
+
+    def set_tasks(self, tasks, editable=True):
+        """表示するタスクを入れ替えます。件数が同じならモデルをリセットせずに内容だけ更新します。"""
+        tasks = [[task_id, description, bool(is_completed)] for task_id, description, is_completed in tasks]
+        if len(tasks) == len(self._tasks):
+            self._tasks = tasks
+            self._editable = editable
+            if tasks:
+                self.dataChanged.emit(self.index(0), self.index(len(tasks) - 1))
+        else:
+            self.beginResetModel()
+            self._tasks = tasks
+            self._editable = editable
+            self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._tasks)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        task_id, description, is_completed = self._tasks[index.row()]
+        if role == Qt.DisplayRole:
+            return description
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if is_completed else Qt.Unchecked
+        if role == Qt.UserRole:
+            return task_id
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        # ロック中・アーカイブ済みの予定ではチェックできないようにする（無効表示になる）
+        if self._editable:
+            return Qt.ItemIsEnabled | Qt.ItemIsUserCheckable
+        return Qt.ItemIsUserCheckable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or not index.isValid() or not self._editable:
+            return False
+        task = self._tasks[index.row()]
+        is_completed = Qt.CheckState(value) == Qt.Checked
+        if task[2] == is_completed:
+            return False
+        task[2] = is_completed
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        self.taskToggled.emit(task[0], task[1], is_completed)
+        return True
+
+
+class _ChecklistDelegate(QStyledItemDelegate):
+    """チェックボックスの部分だけでなく、行のどこをクリックしてもチェックを切り替える"""
+    def editorEvent(self, event, model, option, index):
+        if event.type() in (QEvent.MouseButtonPress, QEvent.MouseButtonDblClick):
+            return bool(index.flags() & Qt.ItemIsEnabled) and event.button() == Qt.LeftButton
+        if event.type() == QEvent.MouseButtonRelease:
+            if not index.flags() & Qt.ItemIsEnabled or event.button() != Qt.LeftButton:
+                return False
+            checked = index.data(Qt.CheckStateRole) == Qt.Checked
+            return model.setData(index, Qt.Unchecked if checked else Qt.Checked, Qt.CheckStateRole)
+        return super().editorEvent(event, model, option, index)
+
+
+class TaskChecklistView(QListView):
+    """TaskChecklistModel を表示するビュー（タスクがないときは案内文を表示）"""
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.placeholder_text = "タスクはありません"
+        self.setModel(model)
+        self.setItemDelegate(_ChecklistDelegate(self))
+        # 行の高さをすべて同じとみなし、行ごとのサイズ計算を省く
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setStyleSheet("QListView { background: transparent; border: none; }")
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.model().rowCount() == 0:
+            painter = QPainter(self.viewport())
+            font = QFont(self.font())
+            font.setItalic(True)
+            painter.setFont(font)
+            painter.drawText(self.viewport().rect().adjusted(4, 4, -4, -4), Qt.AlignLeft | Qt.AlignTop, self.placeholder_text)
+            painter.end()
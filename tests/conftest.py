@@ -0,0 +1,15 @@
+# tests/conftest.py
+"""テスト共通のフィクスチャ"""
+
+import pytest
+
+from src.config import DEFAULT_CONFIG
+from src.data_manager import DataManager
+
+
+@pytest.fixture
+def data_manager(tmp_path):
+    """一時ディレクトリの空のDBを開いた DataManager"""
+    dm = DataManager(str(tmp_path / "schedule.db"), DEFAULT_CONFIG)
+    yield dm
+    dm.close()
@@ -0,0 +1,72 @@
+# tests/test_auto_scheduler.py
+from datetime import datetime, timedelta
+
+from src.auto_scheduler import MAX_SEARCH_REQUESTS, AutoScheduler, FreeIntervals, SlotRequest
+
+
+def test_free_intervals_subtracts_busy():
+    free = FreeIntervals(0, 100, [(10, 20), (15, 30), (50, 60), (200, 300)])
+    assert list(zip(free.starts, free.ends)) == [(0, 10), (30, 50), (60, 100)]
+
+
+def test_find_respects_granularity_and_latest():
+    free = FreeIntervals(0, 100, [(10, 32)])
+    assert free.find(10, 0, 100, granularity=15, limit=3) == [0, 45]
+    assert free.find(5, 0, 100, granularity=5, limit=3) == [0, 35]
+    assert free.find(20, 0, 50) == []
+
+
+def test_reserve_and_release():
+    free = FreeIntervals(0, 100, [])
+    token = free.reserve(30, 40)
+    assert list(zip(free.starts, free.ends)) == [(0, 30), (40, 100)]
+    free.release(token)
+    assert list(zip(free.starts, free.ends)) == [(0, 100)]
+
+
+def _request(title, earliest, latest, duration=60, priority=0):
+    return SlotRequest(title, duration, "仕事", earliest, latest, priority)
+
+
+def test_plan_avoids_existing_schedules(data_manager):
+    data_manager.save_schedule("既存", "2030-01-07 09:00:00", "2030-01-07 10:00:00", "仕事", "", None)
+    day = datetime(2030, 1, 7)
+    plan = AutoScheduler(data_manager).plan([_request("新規", day, day + timedelta(days=1))])
+    assert plan.unplaced == []
+    assert [(p.start, p.end) for p in plan.placements] == [(day.replace(hour=10), day.replace(hour=11))]
+
+
+def test_plan_backtracks_to_place_all(data_manager):
+    data_manager.save_schedule("既存", "2030-01-07 10:00:00", "2030-01-07 10:30:00", "仕事", "", None)
+    day = datetime(2030, 1, 7)
+    # 貪欲法だと優先度の高い要求が 9:00 を取り、狭い要求が置けなくなる並び
+    wide = _request("広い", day.replace(hour=9), day.replace(hour=12), priority=1)
+    narrow = _request("狭い", day.replace(hour=9), day.replace(hour=10))
+    plan = AutoScheduler(data_manager).plan([wide, narrow])
+    assert plan.unplaced == []
+    assert plan.search_steps > 0
+    assert {p.request.title: p.start for p in plan.placements} == {
+        "狭い": day.replace(hour=9), "広い": day.replace(hour=10, minute=30),
+    }
+
+
+def test_plan_reports_infeasible_requests(data_manager):
+    day = datetime(2030, 1, 7, 9)
+    request = _request("長すぎる", day, day + timedelta(minutes=30))
+    plan = AutoScheduler(data_manager).plan([request])
+    assert plan.placements == [] and plan.unplaced == [request]
+
+
+def test_plan_large_batch_does_not_recurse(data_manager):
+    start = datetime(2030, 1, 7)
+    count = MAX_SEARCH_REQUESTS * 3
+    requests = [
+        _request(f"予定{i}", start, start + timedelta(days=200), duration=30)
+        for i in range(count)
+    ]
+    plan = AutoScheduler(data_manager).plan(requests)
+    assert len(plan.placements) == count
+    assert plan.unplaced == []
+    for previous, current in zip(plan.placements, plan.placements[1:]):
+        assert previous.end <= current.start
+    assert all(9 <= p.start.hour and p.end.hour <= 18 for p in plan.placements)
@@ -0,0 +1,60 @@
+# tests/test_autocomplete.py
+import threading
+
+from src.autocomplete import CACHE_MIN_RANGE, AutocompleteIndex, PrefixIndex
+
+
+def test_complete_orders_by_count_then_key():
+    index = PrefixIndex()
+    index.build([("会議", 3), ("会食", 5), ("会合", 3), ("打ち合わせ", 10)])
+    assert index.complete("会") == ["会食", "会合", "会議"]
+
+
+def test_complete_is_case_insensitive_and_respects_limit():
+    index = PrefixIndex(limit=2)
+    index.build([("Meeting", 1), ("memo", 2), ("MEMBER", 3)])
+    assert index.complete("me") == ["MEMBER", "memo"]
+    assert index.complete("ME", limit=1) == ["MEMBER"]
+    assert index.complete("") == []
+
+
+def test_add_reorders_results():
+    index = PrefixIndex()
+    index.build([("会議", 2), ("会食", 1)])
+    index.add("会食")
+    index.add("会食")
+    index.add("会合")
+    assert index.complete("会") == ["会食", "会議", "会合"]
+    index.add("  ")
+    assert len(index) == 3
+
+
+def test_add_updates_cached_prefix():
+    index = PrefixIndex(limit=3)
+    index.build([(f"a{i:04d}", 1) for i in range(CACHE_MIN_RANGE)])
+    assert index.complete("a") == ["a0000", "a0001", "a0002"]
+    index.add("a0500", count=5)
+    index.add("azzz", count=2)
+    assert index.complete("a") == ["a0500", "azzz", "a0000"]
+
+
+def test_record_during_load_is_kept():
+    started = threading.Event()
+    resume = threading.Event()
+
+    class SlowDataManager:
+        def get_completion_frequencies(self):
+            started.set()
+            resume.wait(5)
+            return {"title": [("会議", 3)]}
+
+    index = AutocompleteIndex()
+    loader = threading.Thread(target=index.load, args=(SlowDataManager(),))
+    loader.start()
+    assert started.wait(5)
+    index.record("会食", "本社", ["資料の準備"])
+    resume.set()
+    loader.join(5)
+    assert index["title"].complete("会") == ["会議", "会食"]
+    assert index["location"].complete("本") == ["本社"]
+    assert index["task"].complete("資") == ["資料の準備"]
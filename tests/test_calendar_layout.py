@@ -0,0 +1,61 @@
+# tests/test_calendar_layout.py
+from datetime import date
+
+from src.calendar_layout import assign_columns, layout_week
+
+
+def _schedule(schedule_id, start, end):
+    return (schedule_id, f"予定{schedule_id}", start, end, "仕事", "")
+
+
+def test_assign_columns_reuses_freed_columns():
+    columns = assign_columns([(0, 60, "a"), (30, 90, "b"), (60, 120, "c")])
+    # a と c は重ならないので同じ列を使い、まとまり全体は2列になる
+    assert columns == {"a": (0, 2), "b": (1, 2), "c": (0, 2)}
+
+
+def test_assign_columns_counts_columns_per_cluster():
+    columns = assign_columns([(0, 60, "a"), (0, 60, "b"), (0, 60, "c"), (120, 180, "d")])
+    assert [columns[key] for key in "abc"] == [(0, 3), (1, 3), (2, 3)]
+    assert columns["d"] == (0, 1)
+
+
+def test_assign_columns_empty():
+    assert assign_columns([]) == {}
+
+
+def test_layout_week_splits_schedule_across_midnight():
+    monday = date(2024, 1, 1)
+    schedule = _schedule(1, "2024-01-02 22:00:00", "2024-01-03 02:00:00")
+    days = layout_week([schedule], monday)
+    assert len(days) == 7
+    assert [(s.start_minute, s.end_minute) for s in days[1]] == [(22 * 60, 24 * 60)]
+    assert [(s.start_minute, s.end_minute) for s in days[2]] == [(0, 2 * 60)]
+    assert all(not day for i, day in enumerate(days) if i not in (1, 2))
+
+
+def test_layout_week_does_not_show_midnight_end_on_next_day():
+    monday = date(2024, 1, 1)
+    days = layout_week([_schedule(1, "2024-01-01 23:00:00", "2024-01-02 00:00:00")], monday)
+    assert len(days[0]) == 1
+    assert days[1] == []
+
+
+def test_layout_week_assigns_columns_per_day():
+    monday = date(2024, 1, 1)
+    schedules = [
+        _schedule(1, "2024-01-01 09:00:00", "2024-01-01 10:00:00"),
+        _schedule(2, "2024-01-01 09:30:00", "2024-01-01 11:00:00"),
+        _schedule(3, "2024-01-02 09:00:00", "2024-01-02 10:00:00"),
+    ]
+    days = layout_week(schedules, monday)
+    assert [(s.schedule[0], s.column, s.columns) for s in days[0]] == [(1, 0, 2), (2, 1, 2)]
+    assert [(s.schedule[0], s.column, s.columns) for s in days[1]] == [(3, 0, 1)]
+
+
+def test_layout_week_clips_to_week():
+    monday = date(2024, 1, 8)
+    days = layout_week([_schedule(1, "2024-01-05 09:00:00", "2024-01-09 12:00:00")], monday)
+    assert [(s.start_minute, s.end_minute) for s in days[0]] == [(0, 24 * 60)]
+    assert [(s.start_minute, s.end_minute) for s in days[1]] == [(0, 12 * 60)]
+    assert days[2] == []
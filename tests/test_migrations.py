@@ -0,0 +1,89 @@
+# tests/test_migrations.py
+import sqlite3
+
+from src.config import DEFAULT_CONFIG
+from src.data_manager import DataManager
+
+
+def _create_legacy_db(path):
+    """カラムの追加や値の移行をする前の形式のDBを作ります。"""
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE schedules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            start_datatime TEXT NOT NULL,
+            end_datatime TEXT NOT NULL,
+            category TEXT,
+            location TEXT,
+            description TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            schedule_id INTEGER NOT NULL,
+            task_description TEXT NOT NULL,
+            is_completed INTEGER DEFAULT 0,
+            completed_at TEXT
+        );
+        INSERT INTO schedules (title, start_datatime, end_datatime, category, location, description)
+        VALUES ('会議', '2030-01-07 09:00:00', '2030-01-07 10:00:00', '仕事', '本社', '議題の確認'),
+               ('通院', '2030-01-08 09:00:00', '2030-01-08 10:00:00', '私用', NULL, NULL);
+        INSERT INTO tasks (schedule_id, task_description) VALUES (1, '資料の準備'), (99, '削除済みの予定のタスク');
+    ''')
+    conn.commit()
+    conn.close()
+
+
+def _user_version(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_legacy_database_is_migrated(tmp_path):
+    path = str(tmp_path / "schedule.db")
+    _create_legacy_db(path)
+    dm = DataManager(path, DEFAULT_CONFIG)
+    try:
+        assert dm.conn.execute("PRAGMA user_version").fetchone()[0] == 3
+        # 孤立したタスクだけが削除される
+        assert dm.conn.execute("SELECT schedule_id FROM tasks").fetchall() == [(1,)]
+        # 区分・場所は参照テーブルのIDに置き換わり、読み取り時は名前に戻る
+        assert dm.conn.execute("SELECT COUNT(*) FROM schedules WHERE category IS NOT NULL").fetchone()[0] == 0
+        schedules = dm.get_schedules_in_range("2030-01-01 00:00:00", "2030-02-01 00:00:00")
+        assert [(s[1], s[4], s[5]) for s in schedules] == [("会議", "仕事", "本社"), ("通院", "私用", None)]
+        # 詳細内容は schedule_texts に移る
+        assert dm.conn.execute("SELECT COUNT(*) FROM schedules WHERE description IS NOT NULL").fetchone()[0] == 0
+        assert dm.get_schedule_description(1) == "議題の確認"
+        assert dm.get_schedule_description(2) is None
+    finally:
+        dm.close()
+
+
+def test_new_database_starts_at_latest_version(data_manager):
+    assert data_manager.conn.execute("PRAGMA user_version").fetchone()[0] == 3
+
+
+def test_failed_step_is_retried_on_next_open(tmp_path, monkeypatch):
+    path = str(tmp_path / "schedule.db")
+    _create_legacy_db(path)
+
+    def failing_move(self):
+        self.last_error = "error"
+        return 0
+
+    with monkeypatch.context() as patch:
+        patch.setattr(DataManager, "move_descriptions", failing_move)
+        DataManager(path, DEFAULT_CONFIG).close()
+    # 失敗した段階は実施済みとして記録しない
+    assert _user_version(path) == 2
+
+    dm = DataManager(path, DEFAULT_CONFIG)
+    try:
+        assert dm.conn.execute("PRAGMA user_version").fetchone()[0] == 3
+        assert dm.get_schedule_description(1) == "議題の確認"
+    finally:
+        dm.close()
@@ -0,0 +1,80 @@
+# tests/test_notification_engine.py
+from datetime import datetime, timedelta
+
+from src.notification_engine import START_TASK, NotificationEngine, RecordingSink
+
+
+class FakeClock:
+    """呼び出すと now を返す、進められる時計"""
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, minutes):
+        self.now += timedelta(minutes=minutes)
+
+
+def _engine(data_manager, clock):
+    sink = RecordingSink()
+    return NotificationEngine(data_manager, sink, clock=clock, reminder_minutes=5), sink
+
+
+def _add_schedule(data_manager, start, notification_minutes=None):
+    schedule_id = data_manager.save_schedule(
+        "会議", start.strftime("%Y-%m-%d %H:%M:%S"), (start + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S"),
+        "仕事", "", None, notification_minutes=notification_minutes,
+    )
+    data_manager.save_tasks(schedule_id, [START_TASK])
+    return schedule_id
+
+
+def test_scheduled_notification_fires_once(data_manager):
+    start = datetime(2030, 1, 7, 10, 0)
+    schedule_id = _add_schedule(data_manager, start, notification_minutes=10)
+    clock = FakeClock(start - timedelta(minutes=11))
+    engine, sink = _engine(data_manager, clock)
+
+    assert engine.check_notifications() == []
+    clock.advance(1)
+    fired = engine.check_notifications()
+    assert [(n.schedule_id, n.notification_type) for n in fired] == [(schedule_id, "scheduled")]
+    assert sink.notifications == fired
+    clock.advance(1)
+    assert engine.check_notifications() == []
+
+
+def test_start_reminder_repeats_until_checked(data_manager):
+    start = datetime(2030, 1, 7, 10, 0)
+    schedule_id = _add_schedule(data_manager, start)
+    clock = FakeClock(start + timedelta(minutes=4))
+    engine, sink = _engine(data_manager, clock)
+
+    assert engine.check_notifications() == []
+    clock.advance(1)
+    assert [n.notification_type for n in engine.check_notifications()] == ["start_reminder"]
+    clock.advance(3)
+    assert engine.check_notifications() == []
+    clock.advance(3)
+    assert [n.notification_type for n in engine.check_notifications()] == ["start_reminder"]
+
+    # 「スケジュールの開始」にチェックを入れると繰り返さない
+    task_id = data_manager.get_tasks_for_schedule(schedule_id)[0][0]
+    data_manager.update_task_completion(task_id, True)
+    clock.advance(6)
+    assert engine.check_notifications() == []
+    assert len(sink.notifications) == 2
+
+
+def test_finished_schedules_are_pruned(data_manager):
+    start = datetime(2030, 1, 7, 10, 0)
+    _add_schedule(data_manager, start, notification_minutes=0)
+    clock = FakeClock(start)
+    engine, _ = _engine(data_manager, clock)
+
+    assert len(engine.check_notifications()) == 1
+    assert engine.last_notifications
+    clock.advance(120)
+    assert engine.check_notifications() == []
+    assert engine.last_notifications == {}